@@ -1,33 +1,100 @@
 import csv
 import sys
 import requests
-import concurrent.futures
 from django_query_tools.client import F
 
+# Media type of the Arrow IPC stream format
+ARROW_STREAM = "application/vnd.apache.arrow.stream"
+
+
+def page_params(params, page_size=None):
+    """
+    Add the `page_size` (if set) to the query `params` of a paginated request.
+    """
+    if page_size is None:
+        return params
+
+    return {**params, "page_size": page_size}
+
+
+def projection_params(params, columns=None, exclude=None):
+    """
+    Add the `columns` and/or `exclude` lists (if set) to the query `params`, restricting the fields of each result.
+    """
+    if columns:
+        params = {**params, "fields": ",".join(columns)}
+
+    if exclude:
+        params = {**params, "exclude": ",".join(exclude)}
+
+    return params
+
+
+def read_dataframe(response):
+    """
+    Read the Arrow IPC stream of a `response` into a Pandas DataFrame, as it arrives.
+
+    Raises an `HTTPError` if the request failed.
+    """
+    # pyarrow is only needed for DataFrames, so the rest of the client can be used without it
+    import pyarrow as pa
+
+    response.raise_for_status()
+    response.raw.decode_content = True
+
+    with pa.ipc.open_stream(response.raw) as reader:
+        return reader.read_pandas()
+
 
 class Client:
     def __init__(self, host="localhost", port=8000):
         self.url = f"http://{host}:{port}"
         self.endpoints = {
             "generate": lambda project: f"{self.url}/data/generate/{project}/",
+            "batch_generate": lambda project: f"{self.url}/data/generate/{project}/batch/",
             "filter": lambda project: f"{self.url}/data/filter/{project}/",
             "query": lambda project: f"{self.url}/data/query/{project}/",
+            "summary": lambda project: f"{self.url}/data/summary/{project}/",
+            "status": lambda project, task_id: f"{self.url}/data/status/{project}/{task_id}/",
+            "batch_status": lambda project, batch_id: f"{self.url}/data/status/{project}/batch/{batch_id}/",
+            "filter_status": lambda project: f"{self.url}/data/status/{project}/filters/",
             "delete": lambda project, sample_id: f"{self.url}/data/delete/{project}/{sample_id}/",
+            "bulk_delete": lambda project: f"{self.url}/data/delete/{project}/",
         }
 
-    def generate(self, project, fields):
+    def generate(self, project, fields, force=False):
         """
         Generate VAFs from metadata.
+
+        If `force` is set, the sample is regenerated even if it has already been stored from the same BAM.
         """
         response = requests.post(
             url=self.endpoints["generate"](project),
             json=fields,
+            params={"force": "true"} if force else None,
+        )
+        return response
+
+    def batch_generate(self, project, records, force=False):
+        """
+        Generate VAFs from a batch of metadata records.
+
+        If `force` is set, samples are regenerated even if they have already been stored from the same BAM.
+        """
+        response = requests.post(
+            url=self.endpoints["batch_generate"](project),
+            json=records,
+            params={"force": "true"} if force else None,
         )
         return response
 
-    def csv_generate(self, project, csv_path, delimiter=None, multithreaded=True):
+    def csv_generate(
+        self, project, csv_path, delimiter=None, batch_size=500, force=False
+    ):
         """
         "Generate VAFs from metadata provided via CSV/TSV."
+
+        Records are sent in batches of `batch_size`, yielding one response per batch.
         """
         if csv_path == "-":
             csv_file = sys.stdin
@@ -39,48 +106,34 @@ class Client:
             else:
                 reader = csv.DictReader(csv_file, delimiter=delimiter)
 
-            record = next(reader, None)
+            batch = []
+            for record in reader:
+                batch.append(record)
 
-            if record:
-                response = requests.post(
-                    url=self.endpoints["generate"](project),
-                    json=record,
-                )
-                yield response
+                if len(batch) == batch_size:
+                    yield self.batch_generate(project, batch, force=force)
+                    batch = []
 
-                if multithreaded:
-                    with concurrent.futures.ThreadPoolExecutor() as executor:
-                        futures = [
-                            executor.submit(
-                                requests.post,
-                                url=self.endpoints["generate"](project),
-                                json=record,
-                            )
-                            for record in reader
-                        ]
-                        for future in concurrent.futures.as_completed(futures):
-                            yield future.result()
-                else:
-                    for record in reader:
-                        response = requests.post(
-                            url=self.endpoints["generate"](project),
-                            json=record,
-                        )
-                        yield response
+            if batch:
+                yield self.batch_generate(project, batch, force=force)
         finally:
             if csv_file is not sys.stdin:
                 csv_file.close()
 
-    def filter(self, project, fields=None):
+    def filter(self, project, fields=None, page_size=None, columns=None, exclude=None):
         """
         Filter VAFs and their metadata.
+
+        If `page_size` is set, each response holds (at most) that many VAFs, up to the server's maximum.
+
+        If `columns` is set, results only have those fields. Any fields in `exclude` are left out.
         """
         if fields is None:
             fields = {}
 
         response = requests.get(
             url=self.endpoints["filter"](project),
-            params=fields,
+            params=projection_params(page_params(fields, page_size), columns, exclude),
         )
         yield response
 
@@ -100,9 +153,13 @@ class Client:
             else:
                 _next = None
 
-    def query(self, project, query=None):
+    def query(self, project, query=None, page_size=None, columns=None, exclude=None):
         """
         Query VAFs and their metadata.
+
+        If `page_size` is set, each response holds (at most) that many VAFs, up to the server's maximum.
+
+        If `columns` is set, results only have those fields. Any fields in `exclude` are left out.
         """
         if query:
             if not isinstance(query, F):
@@ -113,6 +170,7 @@ class Client:
         response = requests.post(
             url=self.endpoints["query"](project),
             json=query,
+            params=projection_params(page_params({}, page_size), columns, exclude),
         )
         yield response
 
@@ -133,6 +191,152 @@ class Client:
             else:
                 _next = None
 
+    def export_filter(
+        self, project, fields=None, export="tsv", columns=None, exclude=None
+    ):
+        """
+        Filter VAFs and their metadata, exporting every result in one streamed response.
+
+        The `export` format is either 'tsv' or 'ndjson', with one line per VAF. The response content is not downloaded
+        until it is read, so it can be written out as it arrives with `iter_lines()` or `iter_content()`.
+
+        If `columns` is set, results only have those fields. Any fields in `exclude` are left out.
+        """
+        if fields is None:
+            fields = {}
+
+        response = requests.get(
+            url=self.endpoints["filter"](project),
+            params=projection_params({**fields, "export": export}, columns, exclude),
+            stream=True,
+        )
+        return response
+
+    def export_query(
+        self, project, query=None, export="tsv", columns=None, exclude=None
+    ):
+        """
+        Query VAFs and their metadata, exporting every result in one streamed response.
+
+        The `export` format is either 'tsv' or 'ndjson', with one line per VAF. The response content is not downloaded
+        until it is read, so it can be written out as it arrives with `iter_lines()` or `iter_content()`.
+
+        If `columns` is set, results only have those fields. Any fields in `exclude` are left out.
+        """
+        if query:
+            if not isinstance(query, F):
+                raise Exception("Query must be an F object")
+            else:
+                query = query.query
+
+        response = requests.post(
+            url=self.endpoints["query"](project),
+            json=query,
+            params=projection_params({"export": export}, columns, exclude),
+            stream=True,
+        )
+        return response
+
+    def filter_dataframe(self, project, fields=None, columns=None, exclude=None):
+        """
+        Filter VAFs and their metadata, returning every result as a Pandas DataFrame.
+
+        Results are sent as a stream of Arrow record batches, so the columns keep their types and no JSON is parsed.
+
+        If `columns` is set, results only have those fields. Any fields in `exclude` are left out.
+        """
+        if fields is None:
+            fields = {}
+
+        response = requests.get(
+            url=self.endpoints["filter"](project),
+            params=projection_params(fields, columns, exclude),
+            headers={"Accept": ARROW_STREAM},
+            stream=True,
+        )
+        return read_dataframe(response)
+
+    def query_dataframe(self, project, query=None, columns=None, exclude=None):
+        """
+        Query VAFs and their metadata, returning every result as a Pandas DataFrame.
+
+        Results are sent as a stream of Arrow record batches, so the columns keep their types and no JSON is parsed.
+
+        If `columns` is set, results only have those fields. Any fields in `exclude` are left out.
+        """
+        if query:
+            if not isinstance(query, F):
+                raise Exception("Query must be an F object")
+            else:
+                query = query.query
+
+        response = requests.post(
+            url=self.endpoints["query"](project),
+            json=query,
+            params=projection_params({}, columns, exclude),
+            headers={"Accept": ARROW_STREAM},
+            stream=True,
+        )
+        return read_dataframe(response)
+
+    def summary(self, project, fields=None, page_size=None):
+        """
+        Get the per-position summaries of a project's VAFs.
+
+        If `page_size` is set, each response holds (at most) that many summaries, up to the server's maximum.
+        """
+        if fields is None:
+            fields = {}
+
+        response = requests.get(
+            url=self.endpoints["summary"](project),
+            params=page_params(fields, page_size),
+        )
+        yield response
+
+        if response.ok:
+            _next = response.json()["next"]
+        else:
+            _next = None
+
+        while _next is not None:
+            response = requests.get(
+                url=_next,
+            )
+            yield response
+
+            if response.ok:
+                _next = response.json()["next"]
+            else:
+                _next = None
+
+    def status(self, project, task_id):
+        """
+        Get the state and stage timings of a task.
+        """
+        response = requests.get(
+            url=self.endpoints["status"](project, task_id),
+        )
+        return response
+
+    def batch_status(self, project, batch_id):
+        """
+        Get the state and stage timings of each task in a batch.
+        """
+        response = requests.get(
+            url=self.endpoints["batch_status"](project, batch_id),
+        )
+        return response
+
+    def filter_status(self, project):
+        """
+        Get the number of positions removed by each of a project's filters.
+        """
+        response = requests.get(
+            url=self.endpoints["filter_status"](project),
+        )
+        return response
+
     def delete(self, project, sample_id):
         """
         "Delete VAFs and their metadata."
@@ -142,6 +346,21 @@ class Client:
         )
         return response
 
+    def bulk_delete(self, project, sample_ids=None, fields=None):
+        """
+        Delete the VAFs and metadata of a list of `sample_ids`, or of all samples whose metadata matches the `fields`.
+        """
+        if sample_ids is not None:
+            data = {"sample_ids": sample_ids}
+        else:
+            data = {"filter": fields}
+
+        response = requests.post(
+            url=self.endpoints["bulk_delete"](project),
+            json=data,
+        )
+        return response
+
     def csv_delete(self, project, csv_path, delimiter=None):
         """
         Delete VAFS from metadata provided via CSV/TSV."
@@ -1,3 +1,4 @@
+import sys
 import argparse
 import pandas as pd
 from vafdb import version, utils
@@ -8,60 +9,103 @@ class CLI:
     def __init__(self, host="localhost", port=8000):
         self.client = Client(host=host, port=port)
 
-    def generate(self, project, fields):
+    def generate(self, project, fields, force=False):
         fields = utils.construct_unique_fields_dict(fields)
-        result = self.client.generate(project, fields)
+        result = self.client.generate(project, fields, force=force)
         utils.print_response(result)
 
-    def csv_generate(self, project, csv_path, delimiter=None):
-        results = self.client.csv_generate(project, csv_path, delimiter=delimiter)
-        utils.execute_uploads(results)
+    def csv_generate(
+        self, project, csv_path, delimiter=None, batch_size=500, force=False
+    ):
+        results = self.client.csv_generate(
+            project, csv_path, delimiter=delimiter, batch_size=batch_size, force=force
+        )
+        utils.execute_batch_uploads(results)
 
-    def filter(self, project, fields):
+    def filter(self, project, fields, page_size=None, columns=None, exclude=None):
         fields = utils.construct_fields_dict(fields)
 
-        results = self.client.filter(project, fields)
+        results = self.client.filter(
+            project, fields, page_size=page_size, columns=columns, exclude=exclude
+        )
 
-        result = next(results)
         meta_fields = None
-        columns = None
+        table_columns = None
 
-        if result.ok:
-            if result.json()["results"]:
+        for result in results:
+            if not result.ok:
+                utils.print_response(result)
+                continue
+
+            # Pages can be empty (e.g. once the VAF table runs out, before any cold VAFs)
+            # So the columns are taken from the first page with results
+            if not result.json()["results"]:
+                continue
+
+            header = table_columns is None
+            if header:
                 meta_fields = list(result.json()["results"][0].keys())
                 meta_fields.pop(meta_fields.index("vaf"))
 
             table = pd.json_normalize(
                 result.json()["results"], record_path=["vaf"], meta=meta_fields
             )
-            if meta_fields is not None:
-                columns = (
+            if header:
+                num_vaf_fields = len(table.columns) - len(meta_fields)
+                table_columns = (
                     [meta_fields[0]]
-                    + table.columns.tolist()[: -len(meta_fields)]
-                    + table.columns.tolist()[-len(meta_fields) + 1 :]
+                    + table.columns.tolist()[:num_vaf_fields]
+                    + table.columns.tolist()[num_vaf_fields + 1 :]
                 )
-                table = table[columns]
+            table = table[table_columns]
+
+            print(table.to_csv(index=False, sep="\t", header=header), end="")
 
-            print(table.to_csv(index=False, sep="\t"), end="")
+    def export_filter(self, project, fields, columns=None, exclude=None):
+        fields = utils.construct_fields_dict(fields)
+
+        result = self.client.export_filter(
+            project, fields, export="tsv", columns=columns, exclude=exclude
+        )
+        if result.ok:
+            for chunk in result.iter_content(chunk_size=None):
+                sys.stdout.buffer.write(chunk)
         else:
             utils.print_response(result)
 
-        for result in results:
-            if result.ok:
-                table = pd.json_normalize(
-                    result.json()["results"], record_path=["vaf"], meta=meta_fields
-                )
-                if (meta_fields is not None) and (columns is not None):
-                    table = table[columns]
+    def summary(self, project, fields, page_size=None):
+        fields = utils.construct_unique_fields_dict(fields)
 
-                print(table.to_csv(index=False, sep="\t", header=False), end="")
+        header = True
+        for result in self.client.summary(project, fields, page_size=page_size):
+            if result.ok:
+                table = pd.DataFrame(result.json()["results"])
+                print(table.to_csv(index=False, sep="\t", header=header), end="")
+                header = False
             else:
                 utils.print_response(result)
 
+    def status(self, project, task_id):
+        result = self.client.status(project, task_id)
+        utils.print_response(result)
+
+    def batch_status(self, project, batch_id):
+        result = self.client.batch_status(project, batch_id)
+        utils.print_response(result)
+
+    def filter_status(self, project):
+        result = self.client.filter_status(project)
+        utils.print_response(result)
+
     def delete(self, project, sample_id):
         result = self.client.delete(project, sample_id)
         utils.print_response(result)
 
+    def bulk_delete(self, project, fields):
+        fields = utils.construct_unique_fields_dict(fields)
+        result = self.client.bulk_delete(project, fields=fields)
+        utils.print_response(result)
+
     def csv_delete(self, project, csv_path, delimiter=None):
         results = self.client.csv_delete(project, csv_path, delimiter=delimiter)
         utils.execute_uploads(results)
@@ -72,18 +116,50 @@ def run(args):
 
     if args.command == "generate":
         if args.field:
-            cli.generate(args.project, args.field)
+            cli.generate(args.project, args.field, force=args.force)
         elif args.csv:
-            cli.csv_generate(args.project, args.csv)
+            cli.csv_generate(
+                args.project, args.csv, batch_size=args.batch_size, force=args.force
+            )
         elif args.tsv:
-            cli.csv_generate(args.project, args.tsv, delimiter="\t")
+            cli.csv_generate(
+                args.project,
+                args.tsv,
+                delimiter="\t",
+                batch_size=args.batch_size,
+                force=args.force,
+            )
 
     elif args.command == "filter":
-        cli.filter(args.project, args.field)
+        if args.export:
+            cli.export_filter(
+                args.project, args.field, columns=args.columns, exclude=args.exclude
+            )
+        else:
+            cli.filter(
+                args.project,
+                args.field,
+                page_size=args.page_size,
+                columns=args.columns,
+                exclude=args.exclude,
+            )
+
+    elif args.command == "summary":
+        cli.summary(args.project, args.field, page_size=args.page_size)
+
+    elif args.command == "status":
+        if args.task_id:
+            cli.status(args.project, args.task_id)
+        elif args.batch:
+            cli.batch_status(args.project, args.batch)
+        elif args.filters:
+            cli.filter_status(args.project)
 
     elif args.command == "delete":
         if args.sample_id:
             cli.delete(args.project, args.sample_id)
+        elif args.field:
+            cli.bulk_delete(args.project, args.field)
         elif args.csv:
             cli.csv_delete(args.project, args.csv)
         elif args.tsv:
@@ -123,11 +199,72 @@ def get_args():
     generate_exclusive_parser.add_argument(
         "--tsv", help="Generate VAFs from metadata provided via TSV."
     )
+    generate_parser.add_argument(
+        "--batch-size",
+        type=int,
+        default=500,
+        help="[optional] Number of CSV/TSV records sent per request. Default: 500",
+    )
+    generate_parser.add_argument(
+        "--force",
+        action="store_true",
+        help="[optional] Regenerate samples that have already been stored from the same BAM, replacing their VAFs.",
+    )
     filter_parser = command.add_parser("filter", help="Filter VAFs and their metadata.")
     filter_parser.add_argument("project")
     filter_parser.add_argument(
         "-f", "--field", nargs=2, action="append", metavar=("FIELD", "VALUE")
     )
+    filter_parser.add_argument(
+        "--page-size",
+        type=int,
+        help="[optional] Number of VAFs requested in each page. Default: The server's page size",
+    )
+    filter_parser.add_argument(
+        "--export",
+        action="store_true",
+        help="[optional] Stream every result from the server in one response, rather than requesting it page by page.",
+    )
+    filter_parser.add_argument(
+        "--columns",
+        type=lambda value: value.split(","),
+        help="[optional] Comma-separated fields to return for each VAF. Default: All fields",
+    )
+    filter_parser.add_argument(
+        "--exclude",
+        type=lambda value: value.split(","),
+        help="[optional] Comma-separated fields to leave out of each VAF.",
+    )
+    summary_parser = command.add_parser(
+        "summary", help="Get the per-position summaries of VAFs."
+    )
+    summary_parser.add_argument("project")
+    summary_parser.add_argument(
+        "-f", "--field", nargs=2, action="append", metavar=("FIELD", "VALUE")
+    )
+    summary_parser.add_argument(
+        "--page-size",
+        type=int,
+        help="[optional] Number of summaries requested in each page. Default: The server's page size",
+    )
+    status_parser = command.add_parser(
+        "status", help="Get the state and stage timings of generate tasks."
+    )
+    status_parser.add_argument("project")
+    status_exclusive_parser = status_parser.add_mutually_exclusive_group(required=True)
+    status_exclusive_parser.add_argument(
+        "task_id",
+        nargs="?",
+        help="[optional] Get the status of the provided task_id.",
+    )
+    status_exclusive_parser.add_argument(
+        "--batch", help="Get the status of all tasks in the provided batch_id."
+    )
+    status_exclusive_parser.add_argument(
+        "--filters",
+        action="store_true",
+        help="Get the number of positions removed by each of the project's filters.",
+    )
     delete_parser = command.add_parser("delete", help="Delete VAFs and their metadata.")
     delete_parser.add_argument("project")
     delete_exclusive_parser = delete_parser.add_mutually_exclusive_group(required=True)
@@ -136,6 +273,14 @@ def get_args():
         nargs="?",
         help="[optional] Delete all VAFs for the provided sample_id.",
     )
+    delete_exclusive_parser.add_argument(
+        "-f",
+        "--field",
+        nargs=2,
+        action="append",
+        metavar=("FIELD", "VALUE"),
+        help="Delete all VAFs for the samples whose metadata matches the provided fields.",
+    )
     delete_exclusive_parser.add_argument(
         "--csv", help="Delete VAFS from metadata provided via CSV."
     )
@@ -8,43 +8,38 @@ def pandafy(responses):
     """
     Takes a response generator and TURNS IT INTO A PANDA
     """
-    response = next(responses)
-
-    if not response.ok:
-        print_response(response)
-        response.raise_for_status()
-
     meta_fields = None
     columns = None
     tables = []
 
-    if response.json()["results"]:
-        meta_fields = list(response.json()["results"][0].keys())
-        meta_fields.pop(meta_fields.index("vaf"))
-
-    table = pd.json_normalize(
-        response.json()["results"], record_path=["vaf"], meta=meta_fields
-    )
-    if meta_fields is not None:
-        columns = (
-            [meta_fields[0]]
-            + table.columns.tolist()[: -len(meta_fields)]
-            + table.columns.tolist()[-len(meta_fields) + 1 :]
-        )
-        table = table[columns]
-    tables.append(table)
-
     for response in responses:
         if not response.ok:
             print_response(response)
             response.raise_for_status()
 
+        # Pages can be empty (e.g. once the VAF table runs out, before any cold VAFs)
+        # So the columns are taken from the first page with results
+        if not response.json()["results"]:
+            continue
+
+        if columns is None:
+            meta_fields = list(response.json()["results"][0].keys())
+            meta_fields.pop(meta_fields.index("vaf"))
+
         table = pd.json_normalize(
             response.json()["results"], record_path=["vaf"], meta=meta_fields
         )
-        if (meta_fields is not None) and (columns is not None):
-            table = table[columns]
-        tables.append(table)
+        if columns is None:
+            num_vaf_fields = len(table.columns) - len(meta_fields)
+            columns = (
+                [meta_fields[0]]
+                + table.columns.tolist()[:num_vaf_fields]
+                + table.columns.tolist()[num_vaf_fields + 1 :]
+            )
+        tables.append(table[columns])
+
+    if not tables:
+        return pd.DataFrame()
 
     return pd.concat(tables)
 
@@ -136,3 +131,43 @@ def execute_uploads(uploads):
         print(f"Attempted: {attempted}")
         print(f"Successes: {successes}")
         print(f"Failures: {failures}")
+
+
+def execute_batch_uploads(uploads):
+    attempted = 0
+    successes = 0
+    skipped = 0
+    failures = 0
+
+    try:
+        for upload in uploads:
+            print_response(upload)
+
+            try:
+                results = upload.json()["results"]
+            except (json.decoder.JSONDecodeError, KeyError, TypeError):
+                results = None
+
+            # Count each record in the batch, or the whole upload if it was rejected outright
+            if results is None:
+                attempted += 1
+                failures += 1
+            else:
+                for result in results:
+                    attempted += 1
+                    if result.get("state") == "SKIPPED":
+                        skipped += 1
+                    elif "task_id" in result:
+                        successes += 1
+                    else:
+                        failures += 1
+
+    except KeyboardInterrupt:
+        print("")
+
+    finally:
+        print("[UPLOADS]")
+        print(f"Attempted: {attempted}")
+        print(f"Successes: {successes}")
+        print(f"Skipped: {skipped}")
+        print(f"Failures: {failures}")
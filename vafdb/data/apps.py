@@ -10,6 +10,15 @@ class DataConfig(AppConfig):
     def ready(self):
         from .models import NotEqual, NotEqualRelated, IsNull, IsNullRelated
 
+        # Connect the signals that invalidate the project and reference caches
+        from . import cache
+
+        # Connect the signals that partition the VAF table by project (on PostgreSQL)
+        from . import partitions
+
+        # Connect the signal that applies the SQLite connection profile
+        from . import sqlite
+
         Field.register_lookup(NotEqual)
         ForeignKey.register_lookup(NotEqualRelated)
         Field.register_lookup(IsNull)
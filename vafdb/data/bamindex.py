@@ -0,0 +1,84 @@
+import struct
+import gzip
+import os
+
+# Bin of a BAI reference that holds its numbers of mapped and unmapped reads, rather than chunks of reads
+PSEUDO_BIN = 37450
+
+
+def reference_names(bam_path):
+    """
+    Names of the references in the header of the BAM at `bam_path`, in the order the BAM index refers to them.
+    """
+    with gzip.open(bam_path, "rb") as bam:
+        magic, l_text = struct.unpack("<4si", bam.read(8))
+        if magic != b"BAM\x01":
+            raise ValueError(f"'{bam_path}' is not a BAM file")
+
+        bam.seek(l_text, 1)
+        (n_ref,) = struct.unpack("<i", bam.read(4))
+
+        names = []
+        for _ in range(n_ref):
+            (l_name,) = struct.unpack("<i", bam.read(4))
+            names.append(bam.read(l_name).rstrip(b"\x00").decode())
+            bam.seek(4, 1)
+
+    return names
+
+
+def read_struct(f, fmt):
+    """
+    Read and unpack the struct of format `fmt` from the file `f`. Raises a `struct.error` if the file ends before it.
+    """
+    return struct.unpack(fmt, f.read(struct.calcsize(fmt)))
+
+
+def mapped_reads(bam_path, bai_path=None):
+    """
+    Number of mapped reads on each reference of the BAM at `bam_path`, as recorded in its index (by default, the BAM path with '.bai' appended).
+
+    Only the BAM header and index are read, and the index is read one bin at a time, seeking past the chunks
+    of every bin but the pseudo-bin, and past the linear index of each reference.
+    Returns `None` if they cannot be read, or the index does not record the numbers.
+    """
+    try:
+        names = reference_names(bam_path)
+
+        with open(bai_path or f"{bam_path}.bai", "rb") as f:
+            magic, n_ref = read_struct(f, "<4si")
+            if magic != b"BAI\x01" or n_ref != len(names):
+                return None
+
+            counts = {}
+            for name in names:
+                (n_bin,) = read_struct(f, "<i")
+
+                for _ in range(n_bin):
+                    bin, n_chunk = read_struct(f, "<Ii")
+                    if bin == PSEUDO_BIN and n_chunk >= 2:
+                        # The first 'chunk' of the pseudo-bin holds the virtual offsets of the reference's reads,
+                        # and the second holds the numbers of mapped and unmapped reads
+                        f.seek(16, 1)
+                        counts[name], _ = read_struct(f, "<QQ")
+                        f.seek(16 * (n_chunk - 2), 1)
+                    else:
+                        f.seek(16 * n_chunk, 1)
+
+                (n_intv,) = read_struct(f, "<i")
+                f.seek(8 * n_intv, 1)
+
+                # References without any reads have no pseudo-bin
+                counts.setdefault(name, 0 if n_bin == 0 else None)
+
+            # Seeking past the end of the file does not fail, so check the index was not cut short
+            if f.tell() > os.fstat(f.fileno()).st_size:
+                return None
+
+    except (OSError, EOFError, TypeError, ValueError, struct.error):
+        return None
+
+    if any(count is None for count in counts.values()):
+        return None
+
+    return counts
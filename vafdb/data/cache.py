@@ -0,0 +1,110 @@
+from collections import OrderedDict
+from django.conf import settings
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+from .models import Project, Reference
+import numpy as np
+
+
+class LRUCache:
+    """
+    Dictionary that holds at most `maxsize` items, discarding the least recently used item when full.
+    """
+
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self.items = OrderedDict()
+
+    def get(self, key, default=None):
+        if key not in self.items:
+            return default
+
+        self.items.move_to_end(key)
+        return self.items[key]
+
+    def set(self, key, value):
+        self.items[key] = value
+        self.items.move_to_end(key)
+
+        while len(self.items) > self.maxsize:
+            self.items.popitem(last=False)
+
+    def discard(self, predicate):
+        """
+        Remove all items whose key satisfies the `predicate`.
+        """
+        for key in [key for key in self.items if predicate(key)]:
+            del self.items[key]
+
+
+# Process-level caches, keyed by project code and by (project id, project version, reference name)
+projects = LRUCache(settings.PROJECT_CACHE_SIZE)
+sequences = LRUCache(settings.REFERENCE_CACHE_SIZE)
+
+
+def get_project(code):
+    """
+    Get the project with the provided `code`, from the cache if it is still current.
+
+    The cached project is checked against the database's project id and version, which is a
+    single indexed lookup rather than a fetch of the whole project.
+    Raises `Project.DoesNotExist` if the project does not exist.
+    """
+    try:
+        key = Project.objects.values_list("id", "version").get(code=code)
+    except Project.DoesNotExist:
+        invalidate(code)
+        raise
+
+    project = projects.get(code)
+    if project is None or (project.id, project.version) != key:
+        project = Project.objects.get(code=code)
+        projects.set(code, project)
+
+    return project
+
+
+def get_sequence(project, name):
+    """
+    Get the sequence of the reference `name` for the `project`, from the cache if present.
+
+    The sequence is returned as an array of single-byte characters, so that the reference bases
+    for a whole chunk of positions can be looked up at once by indexing.
+    Raises `Reference.DoesNotExist` if the reference does not exist.
+    """
+    key = (project.id, project.version, name)
+    sequence = sequences.get(key)
+
+    if sequence is None:
+        sequence = Reference.objects.values_list("sequence", flat=True).get(
+            project=project, name=name
+        )
+        sequence = np.frombuffer(sequence.encode(), dtype="S1")
+        sequences.set(key, sequence)
+
+    return sequence
+
+
+def invalidate(code):
+    """
+    Remove the project with the provided `code`, and its reference sequences, from this process's caches.
+    """
+    project = projects.get(code)
+    projects.discard(lambda key: key == code)
+
+    if project is not None:
+        sequences.discard(lambda key: key[0] == project.id)
+
+
+@receiver(post_save, sender=Project)
+@receiver(post_delete, sender=Project)
+def project_changed(sender, instance, **kwargs):
+    invalidate(instance.code)
+
+
+@receiver(post_save, sender=Reference)
+@receiver(post_delete, sender=Reference)
+def reference_changed(sender, instance, **kwargs):
+    sequences.discard(
+        lambda key: key[0] == instance.project_id and key[2] == instance.name
+    )
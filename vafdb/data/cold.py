@@ -0,0 +1,396 @@
+from django.conf import settings
+from django.core.exceptions import FieldError
+from decimal import Decimal
+from .models import Metadata, VAF
+from .packed import VAF_FIELDS
+from .serializers import MetadataSerializer, derive
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+import functools
+import operator
+import base64
+import shutil
+import fcntl
+import uuid
+import os
+
+# Columns of a cold file, in the order they are written
+SCHEMA = pa.schema(
+    [
+        ("id", pa.int64()),
+        ("metadata_id", pa.int64()),
+        ("reference", pa.string()),
+        ("position", pa.int64()),
+        ("insertion", pa.int64()),
+        ("ptype", pa.string()),
+        ("coverage", pa.int64()),
+        ("ref_base", pa.string()),
+        ("base", pa.string()),
+        ("confidence", pa.float64()),
+        ("diff", pa.bool_()),
+        ("a", pa.int64()),
+        ("c", pa.int64()),
+        ("g", pa.int64()),
+        ("t", pa.int64()),
+        ("ds", pa.int64()),
+        ("pc_a", pa.float64()),
+        ("pc_c", pa.float64()),
+        ("pc_g", pa.float64()),
+        ("pc_t", pa.float64()),
+        ("pc_ds", pa.float64()),
+        ("entropy", pa.float64()),
+        ("secondary_entropy", pa.float64()),
+    ]
+)
+
+# Comparison lookups, and the compute functions they are pushed down to the Parquet scan as
+COMPARISONS = {
+    "exact": pc.equal,
+    "ne": pc.not_equal,
+    "lt": pc.less,
+    "lte": pc.less_equal,
+    "gt": pc.greater,
+    "gte": pc.greater_equal,
+}
+
+# Prefix of the pagination cursors of cold VAFs, which distinguishes them from the cursors of the VAF table
+CURSOR_PREFIX = "cold"
+
+# Position of the first cold VAF of a project, as a `(file, id)`: before the first file, with no VAFs read from it
+START = ("", 0)
+
+
+def project_dir(project):
+    """
+    Directory of the cold files of the `project`.
+    """
+    return os.path.join(settings.COLD_STORAGE_DIR, str(project.id))
+
+
+def cold_files(project):
+    """
+    Names of the cold files of the `project`, in the order they were written.
+    """
+    try:
+        names = os.listdir(project_dir(project))
+    except FileNotFoundError:
+        return []
+
+    return sorted(name for name in names if name.endswith(".parquet"))
+
+
+def write_file(project, batches):
+    """
+    Write the `batches` of VAFs (each a list of dicts, keyed by column) to a new cold file of the `project`.
+
+    Each batch is written as its own row group. The file is written under a temporary name and then moved into place,
+    so a cold file is never partially written. Returns the name of the file.
+    """
+    directory = project_dir(project)
+    os.makedirs(directory, exist_ok=True)
+
+    # Names start with the time they were written, so they sort in that order
+    name = f"{uuid.uuid1().time:020d}-{uuid.uuid4().hex[:8]}.parquet"
+    path = os.path.join(directory, name)
+
+    with pq.ParquetWriter(path + ".tmp", SCHEMA) as writer:
+        for batch in batches:
+            writer.write_table(pa.Table.from_pylist(batch, schema=SCHEMA))
+    os.replace(path + ".tmp", path)
+
+    return name
+
+
+def sample_rows(metadata):
+    """
+    The VAFs of the sample with the `metadata` in the VAF table, as a list of dicts keyed by column.
+
+    Derived fields are calculated, so the cold file holds every field of each VAF.
+    """
+    sequences = {}
+    rows = []
+
+    for vaf in (
+        VAF.objects.filter(project=metadata.project_id, metadata=metadata)
+        .order_by("id")
+        .values(
+            "reference__name",
+            *[
+                name
+                for name in SCHEMA.names
+                if name not in {"reference", "metadata_id"}
+            ],
+        )
+    ):
+        name = vaf.pop("reference__name")
+        if name not in sequences:
+            sequences[name] = metadata.project.reference_set.values_list(
+                "sequence", flat=True
+            ).get(name=name)
+
+        vaf["reference"] = name
+        vaf["metadata_id"] = metadata.id
+        rows.append(derive(vaf, sequences[name]))
+
+    return rows
+
+
+def read_sample(metadata, columns=None):
+    """
+    The VAFs of the cold sample with the `metadata`, as a pyarrow Table.
+    """
+    return ds.dataset(
+        os.path.join(project_dir(metadata.project), metadata.cold_file)
+    ).to_table(columns=columns, filter=pc.field("metadata_id") == metadata.id)
+
+
+def remove_sample(metadata):
+    """
+    Rewrite the cold file of the deleted sample with the `metadata`, without the sample's VAFs.
+
+    The file is removed if no other samples are left in it.
+    """
+    path = os.path.join(project_dir(metadata.project), metadata.cold_file)
+    if not os.path.exists(path):
+        return
+
+    # Files are rewritten one at a time, so that concurrent deletions do not undo each other
+    with open(os.path.join(project_dir(metadata.project), ".lock"), "a") as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        try:
+            if not os.path.exists(path):
+                return
+
+            table = ds.dataset(path).to_table(
+                filter=pc.field("metadata_id") != metadata.id
+            )
+            if table.num_rows:
+                pq.write_table(table, path + ".tmp")
+                os.replace(path + ".tmp", path)
+            else:
+                os.remove(path)
+        finally:
+            fcntl.flock(lock, fcntl.LOCK_UN)
+
+
+def remove_project(project):
+    """
+    Remove all of the cold files of the `project`.
+    """
+    shutil.rmtree(project_dir(project), ignore_errors=True)
+
+
+def coerce(column, value):
+    """
+    Convert a query `value` to the type of the `column`, as the database would.
+    """
+    if isinstance(value, (list, tuple)):
+        return [coerce(column, x) for x in value]
+
+    kind = SCHEMA.field(column).type
+    if pa.types.is_boolean(kind):
+        return bool(value)
+    elif pa.types.is_integer(kind) and isinstance(value, Decimal):
+        return int(value) if value == int(value) else float(value)
+    elif isinstance(value, Decimal):
+        return float(value)
+    else:
+        return value
+
+
+def lookup_expression(column, lookup, value):
+    """
+    Expression for the `lookup` of the `column` against `value`, which can be pushed down to the Parquet scan.
+    """
+    field = pc.field(column)
+
+    # As in the database, an exact match against None is a null check
+    if lookup == "exact" and value is None:
+        lookup, value = "isnull", True
+
+    if lookup == "isnull":
+        return pc.is_null(field) if value else pc.is_valid(field)
+
+    value = coerce(column, value)
+    if lookup in COMPARISONS:
+        return COMPARISONS[lookup](field, value)
+    elif lookup == "in":
+        return pc.is_in(
+            field, value_set=pa.array(value, type=SCHEMA.field(column).type)
+        )
+    elif lookup == "range":
+        return (field >= value[0]) & (field <= value[1])
+    elif lookup == "iexact":
+        return pc.equal(pc.utf8_lower(field), str(value).lower())
+    elif lookup in {"contains", "icontains"}:
+        return pc.match_substring(field, str(value), ignore_case=lookup.startswith("i"))
+    elif lookup in {"startswith", "istartswith"}:
+        return pc.starts_with(field, str(value), ignore_case=lookup.startswith("i"))
+    elif lookup in {"endswith", "iendswith"}:
+        return pc.ends_with(field, str(value), ignore_case=lookup.startswith("i"))
+    elif lookup in {"regex", "iregex"}:
+        return pc.match_substring_regex(
+            field, str(value), ignore_case=lookup.startswith("i")
+        )
+    else:
+        raise FieldError(f"Unsupported lookup '{lookup}'.")
+
+
+def get_expression(data, samples):
+    """
+    Traverses the provided `data` (in the same format as for `get_query`) and forms the corresponding pyarrow expression.
+
+    Metadata fields are looked up on the `samples` (a queryset of Metadata) in the database,
+    and become a filter on the ids of the samples that match. Returns `None` if there is nothing to filter on.
+    """
+    key, value = next(iter(data.items()))
+
+    if key in {"&", "|", "^"}:
+        expressions = [get_expression(k_v, samples) for k_v in value]
+        expressions = [x for x in expressions if x is not None]
+        if not expressions:
+            return None
+
+        if key == "&":
+            return functools.reduce(operator.and_, expressions)
+        elif key == "|":
+            return functools.reduce(operator.or_, expressions)
+        else:
+            return functools.reduce(lambda x, y: (x & ~y) | (~x & y), expressions)
+
+    # NOT of a single keyvalue
+    elif key == "~":
+        expression = get_expression(value[0], samples)
+        return None if expression is None else ~expression
+
+    # Base case: a keyvalue to filter on
+    else:
+        key, value = value.key, value.value
+
+        if key.startswith("metadata__"):
+            ids = samples.filter(**{key.removeprefix("metadata__"): value})
+            return pc.field("metadata_id").isin(list(ids.values_list("id", flat=True)))
+
+        column, _, lookup = key.partition("__")
+        if column not in SCHEMA.names:
+            raise FieldError(f"Cannot resolve keyword '{column}' into field.")
+
+        # As in the database, a null value never matches, and so matches a negated lookup
+        return pc.coalesce(
+            lookup_expression(column, lookup or "exact", value), pa.scalar(False)
+        )
+
+
+def encode_cursor(file, last_id):
+    return base64.urlsafe_b64encode(
+        f"{CURSOR_PREFIX}:{file}:{last_id}".encode()
+    ).decode()
+
+
+def decode_cursor(cursor):
+    """
+    Returns the `(file, id)` of a cold cursor, or `None` if it is not a cold cursor.
+    """
+    try:
+        prefix, file, last_id = (
+            base64.urlsafe_b64decode(cursor.encode()).decode().split(":")
+        )
+        if prefix != CURSOR_PREFIX:
+            return None
+        return file, int(last_id)
+    except Exception:
+        return None
+
+
+def filter_cold(project, query, start=START, page_size=None):
+    """
+    Filter the cold VAFs of the `project` with the `query` (in the same format as for `get_query`, or `None` for all VAFs).
+
+    Cold files are scanned in the order they were written, and the VAFs of each file in order of id,
+    continuing after the `(file, id)` of the last VAF read (given by `start`).
+    Returns a page of (at most) `page_size` VAFs, grouped by sample in the same format as the `VAFSerializer`,
+    and the cursor for the next page (or `None` if there are no more VAFs).
+
+    As the cursor holds the name of a file rather than its position, files that are removed between pages
+    do not shift the VAFs that are left to read.
+    """
+    if page_size is None:
+        page_size = settings.CURSOR_PAGINATION_PAGE_SIZE
+
+    samples = Metadata.objects.filter(project=project, cold_file__isnull=False)
+    expression = get_expression(query, samples) if query else None
+
+    file, last_id = start
+    tables = []
+    remaining = page_size
+
+    for name in cold_files(project):
+        if name < file:
+            continue
+
+        # Only the samples that are still stored in the file are read from it
+        ids = list(samples.filter(cold_file=name).values_list("id", flat=True))
+        if not ids:
+            continue
+
+        scan = pc.field("metadata_id").isin(ids)
+        if expression is not None:
+            scan = scan & expression
+
+        # Within the file of the cursor, only the VAFs after the last one read are scanned
+        if name == file:
+            scan = scan & (pc.field("id") > last_id)
+
+        table = ds.dataset(os.path.join(project_dir(project), name)).to_table(
+            filter=scan
+        )
+
+        # If the file has more VAFs than the page needs, only the first of these (by id) are sorted
+        if table.num_rows > remaining:
+            page = table.take(
+                pc.select_k_unstable(
+                    table, k=remaining, sort_keys=[("id", "ascending")]
+                )
+            ).sort_by("id")
+            tables.append(page)
+            return group(tables), encode_cursor(name, page.column("id")[-1].as_py())
+
+        if table.num_rows:
+            tables.append(table.sort_by("id"))
+            remaining -= table.num_rows
+
+        if remaining == 0:
+            return group(tables), encode_cursor(
+                name, tables[-1].column("id")[-1].as_py()
+            )
+
+    return group(tables), None
+
+
+def group(tables):
+    """
+    Group the VAFs in the `tables` by sample, in the same format as the `VAFSerializer`.
+    """
+    results = {}
+    metadata = {}
+
+    for table in tables:
+        ids = table.column("metadata_id").to_pylist()
+        columns = [table.column(field).to_pylist() for field in VAF_FIELDS]
+
+        missing = set(ids) - set(metadata)
+        metadata.update(Metadata.objects.in_bulk(missing))
+
+        for metadata_id, row in zip(ids, zip(*columns)):
+            if metadata_id not in results:
+                md = dict(MetadataSerializer(metadata[metadata_id]).data)
+                md.pop("id")
+                md.pop("project")
+                md["vaf"] = []
+                results[metadata_id] = md
+
+            results[metadata_id]["vaf"].append(dict(zip(VAF_FIELDS, row)))
+
+    return list(results.values())
@@ -0,0 +1,108 @@
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Sum
+from .models import Metadata, Reference, VAF, PackedVAF, PositionSummary, Job
+from .partitions import is_partitioned, drop_partition
+from .sqlite import write_lane
+from .summaries import remove_sample
+from . import cold
+
+
+def delete_batch(queryset, batch_size=None):
+    """
+    Delete (at most) `batch_size` rows of the `queryset` with a single `DELETE` statement.
+
+    Rows that nothing else depends on are deleted without being loaded. Returns the number of rows deleted.
+    """
+    batch_size = batch_size or settings.DELETE_BATCH_SIZE
+    deleted, _ = queryset.filter(pk__in=queryset.values("pk")[:batch_size]).delete()
+    return deleted
+
+
+def delete_sample(metadata, batch_size=None):
+    """
+    Delete the sample with the `metadata`, subtracting its VAFs from the project's summaries.
+
+    The VAFs are deleted in batches of (at most) `batch_size`, in one transaction with the rest of the sample,
+    so the write lane is only held for the one sample.
+
+    Returns the number of VAFs deleted, or `None` if the sample was already deleted.
+    """
+    with write_lane(), transaction.atomic():
+        # Lock the sample, so that it is only subtracted from the summaries once
+        metadata = (
+            Metadata.objects.select_for_update(of=("self",))
+            .select_related("project")
+            .filter(pk=metadata.pk)
+            .first()
+        )
+        if metadata is None:
+            return None
+
+        remove_sample(metadata)
+
+        vafs = VAF.objects.filter(project=metadata.project_id, metadata=metadata)
+        num_vafs = 0
+        while deleted := delete_batch(vafs, batch_size):
+            num_vafs += deleted
+
+        packed = PackedVAF.objects.filter(metadata=metadata)
+        num_vafs += packed.aggregate(num_vafs=Sum("num_vafs"))["num_vafs"] or 0
+        packed.delete()
+
+        # The VAFs of a cold sample are in its cold file
+        if metadata.cold_file:
+            num_vafs += metadata.num_vafs or 0
+
+        Metadata.objects.filter(pk=metadata.pk).delete()
+
+    # Once the sample is deleted, its VAFs are no longer read from its cold file, and can be removed from it
+    # If this is part of an outer transaction (e.g. replacing a sample), the file is only rewritten once that commits,
+    # so a rollback leaves the sample with its VAFs still in the file
+    if metadata.cold_file:
+        transaction.on_commit(lambda: cold.remove_sample(metadata))
+
+    return num_vafs
+
+
+def delete_project(project, batch_size=None, progress=None):
+    """
+    Delete the `project`, with all of its samples, VAFs and summaries.
+
+    Rows are deleted in batches of (at most) `batch_size`, each in its own transaction, so the write lane is
+    never held for long and other projects can be written to in between.
+    After each batch, `progress` (if provided) is called with the name of the rows, and the number deleted out of the total.
+    """
+    # A partitioned project's VAFs are dropped with its partition, rather than deleted in batches
+    if is_partitioned():
+        with write_lane():
+            drop_partition(project.id)
+
+    steps = [
+        ("VAFs", VAF.objects.filter(project=project)),
+        ("packed VAFs", PackedVAF.objects.filter(metadata__project=project)),
+        ("summaries", PositionSummary.objects.filter(project=project)),
+        ("samples", Metadata.objects.filter(project=project)),
+        ("jobs", Job.objects.filter(project=project)),
+        ("references", Reference.objects.filter(project=project)),
+    ]
+
+    for name, queryset in steps:
+        total = queryset.count()
+        deleted = 0
+
+        while deleted < total:
+            with write_lane(), transaction.atomic():
+                batch = delete_batch(queryset, batch_size)
+            if not batch:
+                break
+
+            deleted += batch
+            if progress:
+                progress(name, deleted, total)
+
+    # With its samples deleted, none of the project's cold files are read from any more
+    cold.remove_project(project)
+
+    with write_lane():
+        project.delete()
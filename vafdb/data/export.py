@@ -0,0 +1,410 @@
+from django.conf import settings
+from django.db import models
+from django.http import StreamingHttpResponse
+from rest_framework.renderers import BaseRenderer, JSONRenderer
+from rest_framework.utils.encoders import JSONEncoder
+from .models import Metadata
+from .serializers import VAFValuesSerializer, DERIVED_FROM
+from .projection import get_columns
+from .packed import VAF_FIELDS, filter_packed, decode_cursor as decode_packed_cursor
+from .cold import (
+    filter_cold,
+    cold_files,
+    get_expression,
+    decode_cursor as decode_cold_cursor,
+    SCHEMA as COLD_SCHEMA,
+    START as COLD_START,
+)
+import pyarrow as pa
+import pyarrow.parquet as pq
+import itertools
+import csv
+
+# Content type and file extension of each export format
+FORMATS = {
+    "ndjson": ("application/x-ndjson", "ndjson"),
+    "tsv": ("text/tab-separated-values", "tsv"),
+    "arrow": ("application/vnd.apache.arrow.stream", "arrow"),
+    "parquet": ("application/vnd.apache.parquet", "parquet"),
+}
+
+# Arrow types of the metadata fields, by the type of their model field
+METADATA_TYPES = {
+    models.TextField: pa.string(),
+    models.BigIntegerField: pa.int64(),
+    models.IntegerField: pa.int64(),
+    models.FloatField: pa.float64(),
+    models.DateField: pa.date32(),
+}
+
+
+def get_schema(columns):
+    """
+    Arrow schema of the `columns` of an exported VAF.
+
+    The VAF fields have the same types as in a cold file.
+    """
+    types = {name: COLD_SCHEMA.field(name).type for name in VAF_FIELDS}
+    for field in Metadata._meta.fields:
+        types.setdefault(field.name, METADATA_TYPES.get(type(field)))
+
+    return pa.schema([(column, types[column]) for column in columns])
+
+
+def flatten(results):
+    """
+    Flatten `results` grouped by sample (in the same format as the `VAFSerializer`) into one dict per VAF.
+    """
+    for md in results:
+        md = dict(md)
+        vafs = md.pop("vaf")
+
+        for vaf in vafs:
+            yield {**md, **vaf}
+
+
+def table_pages(vafs, columns, chunk_size=None):
+    """
+    Results of the `vafs` in the VAF table with the `columns`, in chunks of `chunk_size` grouped by sample.
+
+    Rows are read through a server-side cursor where the database supports it, so only one chunk is held at a time.
+    """
+    chunk_size = chunk_size or settings.EXPORT_CHUNK_SIZE
+
+    # Reference sequences are fetched once for the whole export, rather than once per chunk
+    context = {"columns": columns}
+    chunk = []
+
+    for row in (
+        vafs.order_by("id")
+        .values_list(*VAFValuesSerializer.get_paths(columns))
+        .iterator(chunk_size=chunk_size)
+    ):
+        chunk.append(row)
+
+        if len(chunk) == chunk_size:
+            yield VAFValuesSerializer(chunk, context=context).data
+            chunk = []
+
+    if chunk:
+        yield VAFValuesSerializer(chunk, context=context).data
+
+
+def paginate(filter, decode_cursor, start, project, query, chunk_size):
+    """
+    Pages of (at most) `chunk_size` VAFs returned by `filter` (`filter_packed` or `filter_cold`) for the `project` and `query`,
+    from the `start` and following the cursor of each page with `decode_cursor` until the last.
+    """
+    while start is not None:
+        results, cursor = filter(project, query, start=start, page_size=chunk_size)
+        yield results
+        start = decode_cursor(cursor) if cursor else None
+
+
+def packed_pages(project, query, chunk_size=None):
+    """
+    Results of the VAFs of the packed `project` that match the `query`, in pages of `chunk_size` grouped by sample.
+    """
+    return paginate(
+        filter_packed,
+        decode_packed_cursor,
+        (0, 0),
+        project,
+        query,
+        chunk_size or settings.EXPORT_CHUNK_SIZE,
+    )
+
+
+def cold_pages(project, query, chunk_size=None):
+    """
+    Results of the cold VAFs of the `project` that match the `query`, in pages of `chunk_size` grouped by sample.
+
+    The `query` is checked before any pages are read, raising a `FieldError` if it cannot be applied to the cold files.
+    """
+    if query and cold_files(project):
+        get_expression(query, Metadata.objects.none())
+
+    return paginate(
+        filter_cold,
+        decode_cold_cursor,
+        COLD_START,
+        project,
+        query,
+        chunk_size or settings.EXPORT_CHUNK_SIZE,
+    )
+
+
+def table_batches(project, vafs, schema, chunk_size=None):
+    """
+    Arrow record batches of the `vafs` in the VAF table with the columns of the `schema`, in chunks of `chunk_size`.
+
+    Each batch is built column by column from the values of the rows, without serializing them.
+    """
+    chunk_size = chunk_size or settings.EXPORT_CHUNK_SIZE
+
+    # Only the VAF fields of the columns are read, along with those that derived fields are calculated from
+    fields = ["sample_id"] + [field for field in VAF_FIELDS if field in schema.names]
+    for field in list(fields):
+        if field in DERIVED_FROM:
+            fields += DERIVED_FROM[field] + ["reference"]
+    fields = list(dict.fromkeys(fields))
+
+    paths = [
+        {"sample_id": "metadata__sample_id", "reference": "reference__name"}.get(
+            field, field
+        )
+        for field in fields
+    ]
+
+    metadata = {}
+    sequences = {}
+    chunk = []
+
+    for row in vafs.order_by("id").values_list(*paths).iterator(chunk_size=chunk_size):
+        chunk.append(row)
+
+        if len(chunk) == chunk_size:
+            yield record_batch(
+                project,
+                dict(zip(fields, map(list, zip(*chunk)))),
+                schema,
+                metadata,
+                sequences,
+            )
+            chunk = []
+
+    if chunk:
+        yield record_batch(
+            project,
+            dict(zip(fields, map(list, zip(*chunk)))),
+            schema,
+            metadata,
+            sequences,
+        )
+
+
+def page_batches(project, pages, schema):
+    """
+    Arrow record batches of the VAFs in the `pages` (each grouped by sample, in the same format as the `VAFSerializer`),
+    with the columns of the `schema`.
+    """
+    fields = [field for field in ["sample_id"] + VAF_FIELDS if field in schema.names]
+    metadata = {}
+
+    for page in pages:
+        rows = list(flatten(page))
+        if rows:
+            yield record_batch(
+                project,
+                {field: [row[field] for row in rows] for field in fields},
+                schema,
+                metadata,
+            )
+
+
+def record_batch(project, columns, schema, metadata, sequences=None):
+    """
+    Arrow record batch with the `schema`, of the VAFs in `columns` (a dict of lists, keyed by the sample_id and VAF fields),
+    with their sample's metadata added.
+
+    Derived fields that are `None` are calculated from the `sequences` of the project's references.
+    Both the `metadata` and `sequences` are caches, keyed by sample_id and reference name, that are filled in as they are needed.
+    """
+    # Derived fields are calculated exactly as in `derive`, but a column at a time
+    if sequences is not None and None in columns.get("ref_base", []):
+        for name in set(columns["reference"]) - sequences.keys():
+            sequences[name] = project.reference_set.values_list(
+                "sequence", flat=True
+            ).get(name=name)
+
+        columns["ref_base"] = [
+            sequences[reference][position - 1] if ref_base is None else ref_base
+            for ref_base, reference, position in zip(
+                columns["ref_base"], columns["reference"], columns["position"]
+            )
+        ]
+
+    for base in ["a", "c", "g", "t", "ds"]:
+        if None in columns.get("pc_" + base, []):
+            columns["pc_" + base] = [
+                (
+                    (
+                        round(
+                            100 * (count / coverage), settings.FLOATFIELD_DECIMAL_PLACES
+                        )
+                        if coverage > 0
+                        else 0.0
+                    )
+                    if pc is None
+                    else pc
+                )
+                for pc, count, coverage in zip(
+                    columns["pc_" + base], columns[base], columns["coverage"]
+                )
+            ]
+
+    metadata_fields = [name for name in schema.names if name not in columns]
+
+    missing = set(columns["sample_id"]) - metadata.keys()
+    if missing:
+        for values in Metadata.objects.filter(
+            project=project, sample_id__in=missing
+        ).values("sample_id", *metadata_fields):
+            metadata[values["sample_id"]] = values
+
+    for field in metadata_fields:
+        columns[field] = [
+            metadata[sample_id][field] for sample_id in columns["sample_id"]
+        ]
+
+    return pa.RecordBatch.from_pydict(
+        {name: columns[name] for name in schema.names}, schema=schema
+    )
+
+
+class Buffer:
+    """
+    File-like object that holds what is written to it, until it is taken with `read`.
+    """
+
+    def __init__(self):
+        self.chunks = []
+        self.position = 0
+        self.closed = False
+
+    def write(self, value):
+        self.chunks.append(bytes(value))
+        self.position += len(value)
+        return len(value)
+
+    def tell(self):
+        return self.position
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def read(self):
+        value = b"".join(self.chunks)
+        self.chunks = []
+        return value
+
+
+def render_arrow(batches, schema):
+    buffer = Buffer()
+
+    # Buffers are compressed, which readers of the stream undo transparently
+    options = pa.ipc.IpcWriteOptions(compression="zstd")
+
+    with pa.ipc.new_stream(buffer, schema, options=options) as writer:
+        for batch in batches:
+            writer.write_batch(batch)
+            yield buffer.read()
+
+    yield buffer.read()
+
+
+def render_parquet(batches, schema):
+    buffer = Buffer()
+
+    # Each batch is written as a row group, so it can be sent before the next batch is read
+    with pq.ParquetWriter(buffer, schema) as writer:
+        for batch in batches:
+            writer.write_batch(batch)
+            yield buffer.read()
+
+    yield buffer.read()
+
+
+def render_ndjson(rows, columns):
+    encoder = JSONEncoder()
+
+    for row in rows:
+        yield encoder.encode({column: row[column] for column in columns}) + "\n"
+
+
+class Line:
+    """
+    File-like object that returns what is written to it, so that the `csv` module can format one line at a time.
+    """
+
+    def write(self, value):
+        return value
+
+
+def render_tsv(rows, columns):
+    writer = csv.writer(Line(), delimiter="\t", lineterminator="\n")
+
+    yield writer.writerow(columns)
+    for row in rows:
+        yield writer.writerow([row[column] for column in columns])
+
+
+def export_response(project, export, vafs=None, pages=(), columns=None):
+    """
+    Streaming response of the `vafs` in the VAF table (if any), followed by the VAFs in the `pages`
+    (each grouped by sample, in the same format as the `VAFSerializer`), in the `export` format.
+
+    Only the `columns` (by default, all of them) of each VAF are exported. Text formats have one line per VAF.
+    The Arrow and Parquet formats are written in batches, with typed columns.
+    """
+    content_type, extension = FORMATS[export]
+    columns = columns or get_columns()
+
+    if export in {"arrow", "parquet"}:
+        schema = get_schema(columns)
+        batches = page_batches(project, pages, schema)
+        if vafs is not None:
+            batches = itertools.chain(table_batches(project, vafs, schema), batches)
+
+        if export == "arrow":
+            content = render_arrow(batches, schema)
+        else:
+            content = render_parquet(batches, schema)
+    else:
+        if vafs is not None:
+            pages = itertools.chain(table_pages(vafs, columns), pages)
+
+        rows = (row for page in pages for row in flatten(page))
+
+        if export == "ndjson":
+            content = render_ndjson(rows, columns)
+        else:
+            content = render_tsv(rows, columns)
+
+    response = StreamingHttpResponse(content, content_type=content_type)
+    response["Content-Disposition"] = (
+        f'attachment; filename="{project.code}.{extension}"'
+    )
+    return response
+
+
+class ExportRenderer(BaseRenderer):
+    """
+    Renderer of a binary export format, so that it can be requested through the Accept header.
+
+    The results themselves are streamed by `export_response`. Only the error responses of a request are rendered,
+    and these are returned as JSON.
+    """
+
+    charset = None
+    render_style = "binary"
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        response = (renderer_context or {}).get("response")
+        if response is not None:
+            response["Content-Type"] = JSONRenderer.media_type
+
+        return JSONRenderer().render(data)
+
+
+class ArrowRenderer(ExportRenderer):
+    media_type = FORMATS["arrow"][0]
+    format = "arrow"
+
+
+class ParquetRenderer(ExportRenderer):
+    media_type = FORMATS["parquet"][0]
+    format = "parquet"
@@ -12,7 +12,8 @@ from utils.filters import (
     TypedChoiceInFilter,
     TypedChoiceRangeFilter,
 )
-from .models import VAF
+from .models import VAF, PositionSummary
+import copy
 
 
 # Lookups shared by all fields
@@ -60,18 +61,18 @@ fields = {
     "metadata__references": "text",
     "reference": "text",
     "position": "number",
-    "insert_position": "number",
-    "position_type": "choice",
+    "insertion": "number",
+    "ptype": "choice",
     "coverage": "number",
     "ref_base": "choice",
     "base": "choice",
     "confidence": "number",
     "diff": "bool",
-    "num_a": "number",
-    "num_c": "number",
-    "num_g": "number",
-    "num_t": "number",
-    "num_ds": "number",
+    "a": "number",
+    "c": "number",
+    "g": "number",
+    "t": "number",
+    "ds": "number",
     "pc_a": "number",
     "pc_c": "number",
     "pc_g": "number",
@@ -81,198 +82,281 @@ fields = {
     "secondary_entropy": "number",
 }
 
+# Fields whose value is stored on a related model, and the path to that value
+related_fields = {
+    "reference": "reference__name",
+}
+
+
+def build_filters(field, field_type):
+    """
+    Build the filters for each lookup of a `field` of the `field_type`, keyed by filter name.
+
+    Returns the filters, and the names of those that are choice filters.
+    """
+    # Filter name is the user-facing name for the field
+    # Don't want metadata fields to require this prefix so its removed in the filter name
+    filter_name = field.removeprefix("metadata__")
+
+    field_filters = {}
+    choice_filters = []
+
+    # Path that the field is filtered on
+    field_path = related_fields.get(field, field)
+
+    # If field is a choice type, construct choice filters for it
+    if field_type == "choice":
+        choices = VAF._meta.get_field(field).choices
+
+        field_filters[filter_name] = filters.ChoiceFilter(
+            field_name=field_path, choices=choices
+        )
+        choice_filters.append(filter_name)
+
+        field_filters[filter_name + "__in"] = ChoiceInFilter(
+            field_name=field_path, choices=choices, lookup_expr="in"
+        )
+        choice_filters.append(filter_name + "__in")
+
+        field_filters[filter_name + "__range"] = ChoiceRangeFilter(
+            field_name=field_path, choices=choices, lookup_expr="range"
+        )
+        choice_filters.append(filter_name + "__range")
+
+        field_filters[filter_name + "__isnull"] = filters.TypedChoiceFilter(
+            field_name=field_path,
+            choices=BOOLEAN_CHOICES,
+            coerce=strtobool,
+            lookup_expr="isnull",
+        )
+
+        for lookup in BASE_LOOKUPS:
+            field_filters[filter_name + "__" + lookup] = filters.ChoiceFilter(
+                field_name=field_path, choices=choices, lookup_expr=lookup
+            )
+            choice_filters.append(filter_name + "__" + lookup)
+
+        for lookup in CHAR_LOOKUPS:
+            field_filters[filter_name + "__" + lookup] = filters.CharFilter(
+                field_name=field_path, lookup_expr=lookup
+            )
+            choice_filters.append(filter_name + "__" + lookup)
+
+    # If field is text, construct text filters for it
+    elif field_type == "text":
+        field_filters[filter_name] = filters.CharFilter(field_name=field_path)
+        field_filters[filter_name + "__in"] = CharInFilter(
+            field_name=field_path, lookup_expr="in"
+        )
+        field_filters[filter_name + "__range"] = CharRangeFilter(
+            field_name=field_path, lookup_expr="range"
+        )
+        field_filters[filter_name + "__isnull"] = filters.TypedChoiceFilter(
+            field_name=field_path,
+            choices=BOOLEAN_CHOICES,
+            coerce=strtobool,
+            lookup_expr="isnull",
+        )
+
+        for lookup in BASE_LOOKUPS:
+            field_filters[filter_name + "__" + lookup] = filters.CharFilter(
+                field_name=field_path, lookup_expr=lookup
+            )
+
+        for lookup in CHAR_LOOKUPS:
+            field_filters[filter_name + "__" + lookup] = filters.CharFilter(
+                field_name=field_path, lookup_expr=lookup
+            )
+
+    # If field is a number, construct number filters for it
+    elif field_type == "number":
+        field_filters[filter_name] = filters.NumberFilter(field_name=field_path)
+
+        field_filters[filter_name + "__in"] = NumberInFilter(
+            field_name=field_path, lookup_expr="in"
+        )
+        field_filters[filter_name + "__range"] = NumberRangeFilter(
+            field_name=field_path, lookup_expr="range"
+        )
+        field_filters[filter_name + "__isnull"] = filters.TypedChoiceFilter(
+            field_name=field_path,
+            choices=BOOLEAN_CHOICES,
+            coerce=strtobool,
+            lookup_expr="isnull",
+        )
+
+        for lookup in BASE_LOOKUPS:
+            field_filters[filter_name + "__" + lookup] = filters.NumberFilter(
+                field_name=field_path, lookup_expr=lookup
+            )
+
+    # If field is a date, construct date filters for it
+    elif field_type == "date":
+        field_filters[filter_name] = filters.DateFilter(
+            field_name=field_path, input_formats=["%Y-%m-%d"]
+        )
+        field_filters[filter_name + "__in"] = DateInFilter(
+            field_name=field_path, input_formats=["%Y-%m-%d"], lookup_expr="in"
+        )
+        field_filters[filter_name + "__range"] = DateRangeFilter(
+            field_name=field_path,
+            input_formats=["%Y-%m-%d"],
+            lookup_expr="range",
+        )
+        field_filters[filter_name + "__isnull"] = filters.TypedChoiceFilter(
+            field_name=field_path,
+            choices=BOOLEAN_CHOICES,
+            coerce=strtobool,
+            lookup_expr="isnull",
+        )
+        field_filters[filter_name + "__iso_year"] = filters.NumberFilter(
+            field_name=field_path, lookup_expr="iso_year"
+        )
+        field_filters[filter_name + "__iso_year__in"] = NumberInFilter(
+            field_name=field_path,
+            lookup_expr="iso_year__in",
+        )
+        field_filters[filter_name + "__iso_year__range"] = NumberRangeFilter(
+            field_name=field_path,
+            lookup_expr="iso_year__range",
+        )
+        field_filters[filter_name + "__week"] = filters.NumberFilter(
+            field_name=field_path, lookup_expr="week"
+        )
+        field_filters[filter_name + "__week__in"] = NumberInFilter(
+            field_name=field_path,
+            lookup_expr="week__in",
+        )
+        field_filters[filter_name + "__week__range"] = NumberRangeFilter(
+            field_name=field_path,
+            lookup_expr="week__range",
+        )
+
+        for lookup in BASE_LOOKUPS:
+            field_filters[filter_name + "__" + lookup] = filters.DateFilter(
+                field_name=field_path,
+                input_formats=["%Y-%m-%d"],
+                lookup_expr=lookup,
+            )
+
+    # If field is a bool, construct bool filters for it
+    elif field_type == "bool":
+        field_filters[filter_name] = filters.TypedChoiceFilter(
+            field_name=field_path, choices=BOOLEAN_CHOICES, coerce=strtobool
+        )
+        field_filters[filter_name + "__in"] = TypedChoiceInFilter(
+            field_name=field_path,
+            choices=BOOLEAN_CHOICES,
+            coerce=strtobool,
+            lookup_expr="in",
+        )
+        field_filters[filter_name + "__range"] = TypedChoiceRangeFilter(
+            field_name=field_path,
+            choices=BOOLEAN_CHOICES,
+            coerce=strtobool,
+            lookup_expr="range",
+        )
+        field_filters[filter_name + "__isnull"] = filters.TypedChoiceFilter(
+            field_name=field_path,
+            choices=BOOLEAN_CHOICES,
+            coerce=strtobool,
+            lookup_expr="isnull",
+        )
+
+        for lookup in BASE_LOOKUPS:
+            field_filters[filter_name + "__" + lookup] = filters.TypedChoiceFilter(
+                field_name=field_path,
+                choices=BOOLEAN_CHOICES,
+                coerce=strtobool,
+                lookup_expr=lookup,
+            )
+
+    # The model of the filters is set as it would be by a filterset, for their labels,
+    # and their form fields are built now, so that every copy of a filter shares its form field
+    for f in field_filters.values():
+        f.model = VAF
+        f.field
+
+    return field_filters, choice_filters
+
+
+# Filters for every field and lookup, keyed by filter name
+# These are built once, and shared by every VAFFilter, which only needs to look up the filters in its data
+VAF_FILTERS = {}
+
+# List of metadata fields (not including the prefix required for VAF filter)
+METADATA_FIELDS = []
+
+# List of all choice filters
+# This is needed for finding and setting any user input choice values to uppercase
+CHOICE_FILTERS = set()
+
+for field, field_type in fields.items():
+    field_filters, choice_filters = build_filters(field, field_type)
+    VAF_FILTERS.update(field_filters)
+    CHOICE_FILTERS.update(choice_filters)
+
+    # If field is a metadata field, add it to the list of metadata fields
+    if field.startswith("metadata__"):
+        METADATA_FIELDS.append(field.removeprefix("metadata__"))
+
+# Position of each filter in `VAF_FILTERS`
+FILTER_ORDER = {name: i for i, name in enumerate(VAF_FILTERS)}
+
 
 class VAFFilter(filters.FilterSet):
+    metadata_fields = METADATA_FIELDS
+
+    @classmethod
+    def get_filters(cls):
+        # The filters are taken from VAF_FILTERS for each filterset's data, so the filterset has no
+        # base filters, and there is nothing for super().__init__ to deep copy
+        return {}
+
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
 
-        # List of metadata fields (not including the prefix required for VAF filter)
-        self.metadata_fields = []
-
-        # List of all choice filters
-        # This is needed for finding and setting any user input choice values to uppercase
-        # Want choice fields to be case-insensitive, so this needs doing before the filterset form validates the user data
-        self.choice_filters = []
-
-        for field, field_type in fields.items():
-            # Filter name is the user-facing name for the field
-            # Don't want metadata fields to require this prefix so its removed in the filter name
-            filter_name = field.removeprefix("metadata__")
-
-            # If none of the user supplied fields even start with the filter name, it can be assumed we dont need to build this filter
-            if not any(x.startswith(filter_name) for x in self.data):
-                continue
-
-            # If field is a metadata field, add it to the list of metadata fields
-            if field.startswith("metadata__"):
-                self.metadata_fields.append(filter_name)
-
-            # If field is a choice type, construct choice filters for it
-            if field_type == "choice":
-                choices = VAF._meta.get_field(field).choices
-
-                self.filters[filter_name] = filters.ChoiceFilter(
-                    field_name=field, choices=choices
-                )
-                self.choice_filters.append(filter_name)
-
-                self.filters[filter_name + "__in"] = ChoiceInFilter(
-                    field_name=field, choices=choices, lookup_expr="in"
-                )
-                self.choice_filters.append(filter_name + "__in")
-
-                self.filters[filter_name + "__range"] = ChoiceRangeFilter(
-                    field_name=field, choices=choices, lookup_expr="range"
-                )
-                self.choice_filters.append(filter_name + "__range")
-
-                self.filters[filter_name + "__isnull"] = filters.TypedChoiceFilter(
-                    field_name=field,
-                    choices=BOOLEAN_CHOICES,
-                    coerce=strtobool,
-                    lookup_expr="isnull",
-                )
-
-                for lookup in BASE_LOOKUPS:
-                    self.filters[filter_name + "__" + lookup] = filters.ChoiceFilter(
-                        field_name=field, choices=choices, lookup_expr=lookup
-                    )
-                    self.choice_filters.append(filter_name + "__" + lookup)
-
-                for lookup in CHAR_LOOKUPS:
-                    self.filters[filter_name + "__" + lookup] = filters.CharFilter(
-                        field_name=field, lookup_expr=lookup
-                    )
-                    self.choice_filters.append(filter_name + "__" + lookup)
-
-            # If field is text, construct text filters for it
-            elif field_type == "text":
-                self.filters[filter_name] = filters.CharFilter(field_name=field)
-                self.filters[filter_name + "__in"] = CharInFilter(
-                    field_name=field, lookup_expr="in"
-                )
-                self.filters[filter_name + "__range"] = CharRangeFilter(
-                    field_name=field, lookup_expr="range"
-                )
-                self.filters[filter_name + "__isnull"] = filters.TypedChoiceFilter(
-                    field_name=field,
-                    choices=BOOLEAN_CHOICES,
-                    coerce=strtobool,
-                    lookup_expr="isnull",
-                )
-
-                for lookup in BASE_LOOKUPS:
-                    self.filters[filter_name + "__" + lookup] = filters.CharFilter(
-                        field_name=field, lookup_expr=lookup
-                    )
-
-                for lookup in CHAR_LOOKUPS:
-                    self.filters[filter_name + "__" + lookup] = filters.CharFilter(
-                        field_name=field, lookup_expr=lookup
-                    )
-
-            # If field is a number, construct number filters for it
-            elif field_type == "number":
-                self.filters[filter_name] = filters.NumberFilter(field_name=field)
-
-                self.filters[filter_name + "__in"] = NumberInFilter(
-                    field_name=field, lookup_expr="in"
-                )
-                self.filters[filter_name + "__range"] = NumberRangeFilter(
-                    field_name=field, lookup_expr="range"
-                )
-                self.filters[filter_name + "__isnull"] = filters.TypedChoiceFilter(
-                    field_name=field,
-                    choices=BOOLEAN_CHOICES,
-                    coerce=strtobool,
-                    lookup_expr="isnull",
-                )
-
-                for lookup in BASE_LOOKUPS:
-                    self.filters[filter_name + "__" + lookup] = filters.NumberFilter(
-                        field_name=field, lookup_expr=lookup
-                    )
-
-            # If field is a date, construct date filters for it
-            elif field_type == "date":
-                self.filters[filter_name] = filters.DateFilter(
-                    field_name=field, input_formats=["%Y-%m-%d"]
-                )
-                self.filters[filter_name + "__in"] = DateInFilter(
-                    field_name=field, input_formats=["%Y-%m-%d"], lookup_expr="in"
-                )
-                self.filters[filter_name + "__range"] = DateRangeFilter(
-                    field_name=field, input_formats=["%Y-%m-%d"], lookup_expr="range"
-                )
-                self.filters[filter_name + "__isnull"] = filters.TypedChoiceFilter(
-                    field_name=field,
-                    choices=BOOLEAN_CHOICES,
-                    coerce=strtobool,
-                    lookup_expr="isnull",
-                )
-                self.filters[filter_name + "__iso_year"] = filters.NumberFilter(
-                    field_name=field, lookup_expr="iso_year"
-                )
-                self.filters[filter_name + "__iso_year__in"] = NumberInFilter(
-                    field_name=field,
-                    lookup_expr="iso_year__in",
-                )
-                self.filters[filter_name + "__iso_year__range"] = NumberRangeFilter(
-                    field_name=field,
-                    lookup_expr="iso_year__range",
-                )
-                self.filters[filter_name + "__week"] = filters.NumberFilter(
-                    field_name=field, lookup_expr="week"
-                )
-                self.filters[filter_name + "__week__in"] = NumberInFilter(
-                    field_name=field,
-                    lookup_expr="week__in",
-                )
-                self.filters[filter_name + "__week__range"] = NumberRangeFilter(
-                    field_name=field,
-                    lookup_expr="week__range",
-                )
-
-                for lookup in BASE_LOOKUPS:
-                    self.filters[filter_name + "__" + lookup] = filters.DateFilter(
-                        field_name=field, input_formats=["%Y-%m-%d"], lookup_expr=lookup
-                    )
-
-            # If field is a bool, construct bool filters for it
-            elif field_type == "bool":
-                self.filters[filter_name] = filters.TypedChoiceFilter(
-                    field_name=field, choices=BOOLEAN_CHOICES, coerce=strtobool
-                )
-                self.filters[filter_name + "__in"] = TypedChoiceInFilter(
-                    field_name=field,
-                    choices=BOOLEAN_CHOICES,
-                    coerce=strtobool,
-                    lookup_expr="in",
-                )
-                self.filters[filter_name + "__range"] = TypedChoiceRangeFilter(
-                    field_name=field,
-                    choices=BOOLEAN_CHOICES,
-                    coerce=strtobool,
-                    lookup_expr="range",
-                )
-                self.filters[filter_name + "__isnull"] = filters.TypedChoiceFilter(
-                    field_name=field,
-                    choices=BOOLEAN_CHOICES,
-                    coerce=strtobool,
-                    lookup_expr="isnull",
-                )
-
-                for lookup in BASE_LOOKUPS:
-                    self.filters[
-                        filter_name + "__" + lookup
-                    ] = filters.TypedChoiceFilter(
-                        field_name=field,
-                        choices=BOOLEAN_CHOICES,
-                        coerce=strtobool,
-                        lookup_expr=lookup,
-                    )
+        # Only the filters for the user supplied fields are needed, and unknown fields have no filter
+        # These are kept in the order they were built, so they are validated (and applied) in the same order for any data
+        self.filters = {}
+        for field in sorted(
+            (field for field in self.data if field in VAF_FILTERS),
+            key=FILTER_ORDER.__getitem__,
+        ):
+            # Each filterset has its own (shallow) copy of a filter, with its model and parent set as in super().__init__
+            f = copy.copy(VAF_FILTERS[field])
+            f.model = self.queryset.model
+            f.parent = self
+            self.filters[field] = f
 
         # Check user data for any choice fields, and set their values to uppercase
+        # Want choice fields to be case-insensitive, so this needs doing before the filterset form validates the user data
         for field, value in self.data.items():
-            if field in self.choice_filters and isinstance(value, str):
+            if field in CHOICE_FILTERS and isinstance(value, str):
                 self.data[field] = value.upper()
+
+
+class PositionSummaryFilter(filters.FilterSet):
+    """
+    Filters for the per-position summaries of a project.
+    """
+
+    reference = filters.CharFilter(field_name="reference__name")
+    reference__in = CharInFilter(field_name="reference__name", lookup_expr="in")
+
+    class Meta:
+        model = PositionSummary
+        fields = {
+            field: BASE_LOOKUPS + ["in", "range"]
+            for field in [
+                "position",
+                "insertion",
+                "num_samples",
+                "num_diff",
+                "num_base_a",
+                "num_base_c",
+                "num_base_g",
+                "num_base_t",
+                "num_base_ds",
+            ]
+        }
@@ -0,0 +1,52 @@
+from django.conf import settings
+import hashlib
+import os
+
+
+# Number of bytes read from each end of a BAM for its fast hash
+HASH_BLOCK_SIZE = 1024 * 1024
+
+# Metadata fields that hold the fingerprint of a sample's BAM
+FIELDS = ["bam_size", "bam_mtime", "bam_hash"]
+
+
+def fingerprint(path):
+    """
+    Fingerprint the file at `path` by its size, modification time (in nanoseconds) and, if `BAM_FINGERPRINT_HASH`
+    is set, a fast hash of its first and last `HASH_BLOCK_SIZE` bytes.
+
+    Returns a dict keyed by the Metadata fingerprint fields, or `None` if the file cannot be read.
+    """
+    try:
+        stat = os.stat(path)
+        bam_hash = None
+
+        if settings.BAM_FINGERPRINT_HASH:
+            blake2b = hashlib.blake2b()
+            with open(path, "rb") as f:
+                blake2b.update(f.read(HASH_BLOCK_SIZE))
+                f.seek(max(stat.st_size - HASH_BLOCK_SIZE, 0))
+                blake2b.update(f.read(HASH_BLOCK_SIZE))
+            bam_hash = blake2b.hexdigest()
+
+    except (OSError, TypeError, ValueError):
+        return None
+
+    return {
+        "bam_size": stat.st_size,
+        "bam_mtime": stat.st_mtime_ns,
+        "bam_hash": bam_hash,
+    }
+
+
+def matches(metadata, fp):
+    """
+    Returns `True` if the stored `metadata` (a Metadata instance or dict) was generated from a BAM with fingerprint `fp`.
+    """
+    if fp is None:
+        return False
+
+    if not isinstance(metadata, dict):
+        metadata = {field: getattr(metadata, field) for field in FIELDS}
+
+    return all(metadata.get(field) == fp[field] for field in FIELDS)
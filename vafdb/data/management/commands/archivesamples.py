@@ -0,0 +1,60 @@
+from django.core.management import base
+from django.db import transaction
+from datetime import date
+from ...models import Project, Metadata, VAF
+from ...cold import sample_rows, write_file
+from ...deletion import delete_batch
+from ...sqlite import write_lane
+
+
+class Command(base.BaseCommand):
+    help = "Move the VAFs of a project's samples out of the VAF table and into cold Parquet files."
+
+    def add_arguments(self, parser):
+        parser.add_argument("code")
+        parser.add_argument(
+            "--published-before",
+            type=date.fromisoformat,
+            help="[optional] Only move samples published before this date (YYYY-MM-DD). Default: All samples",
+        )
+        parser.add_argument(
+            "--samples-per-file",
+            type=int,
+            default=100,
+            help="[optional] Maximum number of samples written to each cold file. Default: 100",
+        )
+
+    def handle(self, *args, **options):
+        project = Project.objects.get(code=options["code"])
+        if project.packed:
+            raise base.CommandError("The VAFs of a packed project cannot be moved.")
+
+        samples = Metadata.objects.filter(project=project, cold_file__isnull=True)
+        if options["published_before"]:
+            samples = samples.filter(published_date__lt=options["published_before"])
+        ids = list(samples.order_by("id").values_list("id", flat=True))
+
+        size = options["samples_per_file"]
+        for i in range(0, len(ids), size):
+            group = list(
+                Metadata.objects.select_related("project")
+                .filter(id__in=ids[i : i + size])
+                .order_by("id")
+            )
+
+            # Write the samples to a cold file first, with one row group per sample
+            # Until a sample is marked as cold, its VAFs are still read from the VAF table
+            name = write_file(project, (sample_rows(metadata) for metadata in group))
+
+            # Then mark each sample as cold and delete its rows, one sample at a time
+            # A sample deleted in the meantime is not marked, and its VAFs in the file are never read
+            for metadata in group:
+                with write_lane(), transaction.atomic():
+                    if Metadata.objects.filter(
+                        pk=metadata.pk, cold_file__isnull=True
+                    ).update(cold_file=name):
+                        vafs = VAF.objects.filter(project=project, metadata=metadata)
+                        while delete_batch(vafs):
+                            pass
+
+            print(f"Moved {i + len(group)}/{len(ids)} samples to {name}")
@@ -0,0 +1,149 @@
+from django.core.management import base
+from django.db import connection, DatabaseError
+from ...models import Project, Metadata, Reference, VAF, PackedVAF
+from ...packed import pack, unpack, VAF_FIELDS
+from ...serializers import derive
+import numpy as np
+import time
+
+
+def table_size(model):
+    """
+    Total bytes on disk of the table for the `model` and its indexes, or `None` if the database cannot report it.
+    """
+    table = model._meta.db_table
+
+    try:
+        with connection.cursor() as cursor:
+            if connection.vendor == "postgresql":
+                # A partitioned table has no storage of its own, so the sizes of its partitions are included
+                cursor.execute(
+                    "SELECT pg_total_relation_size(%s::regclass) + COALESCE((SELECT SUM(pg_total_relation_size(inhrelid)) "
+                    "FROM pg_inherits WHERE inhparent = %s::regclass), 0)",
+                    [table, table],
+                )
+            elif connection.vendor == "sqlite":
+                cursor.execute(
+                    "SELECT SUM(pgsize) FROM dbstat WHERE name = %s OR name IN "
+                    "(SELECT name FROM sqlite_master WHERE type = 'index' AND tbl_name = %s)",
+                    [table, table],
+                )
+            else:
+                return None
+
+            return cursor.fetchone()[0]
+
+    except DatabaseError:
+        return None
+
+
+class Command(base.BaseCommand):
+    help = "Benchmark the packed VAF storage format against the row layout, for a sample stored as rows."
+
+    def add_arguments(self, parser):
+        parser.add_argument("code")
+        parser.add_argument("sample_id")
+        parser.add_argument(
+            "--repeats",
+            type=int,
+            default=5,
+            help="[optional] Number of times each scan is run. Default: 5",
+        )
+
+    def handle(self, *args, **options):
+        project = Project.objects.get(code=options["code"])
+        if project.packed:
+            raise base.CommandError(
+                f"Project '{project.code}' is packed, so its samples are not stored as rows"
+            )
+
+        metadata = Metadata.objects.get(project=project, sample_id=options["sample_id"])
+        vafs = VAF.objects.filter(metadata=metadata).order_by("id")
+        sequences = dict(
+            Reference.objects.filter(project=project).values_list("name", "sequence")
+        )
+
+        def scan_rows():
+            # Derived fields that the project does not store are calculated, as they are when serialized
+            rows = []
+            for row in vafs.values_list(
+                *(
+                    "reference__name" if field == "reference" else field
+                    for field in VAF_FIELDS
+                )
+            ):
+                vaf = dict(zip(VAF_FIELDS, row))
+                if vaf["ref_base"] is None:
+                    derive(vaf, sequences[vaf["reference"]])
+                rows.append(tuple(vaf.values()))
+            return rows
+
+        # Pack the sample's VAFs in memory, one set of arrays per reference
+        rows = scan_rows()
+        num_vafs = len(rows)
+        if not num_vafs:
+            raise base.CommandError(f"Sample '{metadata.sample_id}' has no VAFs")
+
+        columns = {
+            field: np.array(values) for field, values in zip(VAF_FIELDS, zip(*rows))
+        }
+        blocks = [
+            PackedVAF(
+                metadata=metadata,
+                **pack(
+                    reference,
+                    {
+                        field: values[columns["reference"] == reference]
+                        for field, values in columns.items()
+                    },
+                ),
+            )
+            for reference in dict.fromkeys(columns["reference"].tolist())
+        ]
+
+        def scan_packed():
+            unpacked = unpack(blocks)
+            unpacked["base"] = np.where(unpacked["base"] == "", None, unpacked["base"])
+            return list(zip(*(unpacked[field].tolist() for field in VAF_FIELDS)))
+
+        # Bytes per VAF of the rows is averaged over the whole table, including its indexes
+        row_bytes = table_size(VAF)
+        num_rows = VAF.objects.count()
+        packed_bytes = sum(
+            len(block.positions)
+            + len(block.insertions)
+            + len(block.counts)
+            + len(block.ref_bases)
+            for block in blocks
+        )
+
+        results = {}
+        timings = {}
+        for name, scan in [("rows", scan_rows), ("packed", scan_packed)]:
+            times = []
+            for _ in range(options["repeats"]):
+                start = time.perf_counter()
+                results[name] = scan()
+                times.append(time.perf_counter() - start)
+            timings[name] = min(times)
+
+        print(f"VAFs: {num_vafs}")
+        if row_bytes is None:
+            print("rows: size unavailable for this database")
+        else:
+            print(
+                f"rows: {round(row_bytes / num_rows, 1)} bytes/VAF (table and indexes)"
+            )
+        print(f"packed: {round(packed_bytes / num_vafs, 1)} bytes/VAF (arrays)")
+
+        for name, seconds in timings.items():
+            print(
+                f"{name} scan: {round(seconds, 3)} s ({round(num_vafs / seconds)} VAFs/s)"
+            )
+        print(f"Speedup: {round(timings['rows'] / timings['packed'], 1)}x")
+
+        if results["rows"] == results["packed"]:
+            print("Outputs: identical")
+        else:
+            mismatches = sum(a != b for a, b in zip(results["rows"], results["packed"]))
+            raise base.CommandError(f"Outputs differ at {mismatches} VAFs")
@@ -0,0 +1,103 @@
+from django.core.management import base
+from django.conf import settings
+from rest_framework.request import Request
+from ...models import Project, VAF
+from ...pagination import KeysetPagination
+from ...querylog import request_factory
+import time
+
+
+class Command(base.BaseCommand):
+    help = "Benchmark fetching pages of a project's VAFs, from the first page to the last, with keyset and offset pagination."
+
+    def add_arguments(self, parser):
+        parser.add_argument("code")
+        parser.add_argument(
+            "--page-size",
+            type=int,
+            help="[optional] Number of VAFs in each page. Default: The CURSOR_PAGINATION_PAGE_SIZE setting",
+        )
+        parser.add_argument(
+            "--samples",
+            type=int,
+            default=5,
+            help="[optional] Number of pages (evenly spaced from the first to the last) that are fetched. Default: 5",
+        )
+        parser.add_argument(
+            "--repeats",
+            type=int,
+            default=5,
+            help="[optional] Number of times each page is fetched. Default: 5",
+        )
+
+    def handle(self, *args, **options):
+        project = Project.objects.get(code=options["code"])
+        if project.packed:
+            raise base.CommandError(
+                f"Project '{project.code}' is packed, so its VAFs are not paginated from the VAF table"
+            )
+
+        page_size = options["page_size"] or settings.CURSOR_PAGINATION_PAGE_SIZE
+        vafs = (
+            VAF.objects.select_related("metadata", "reference")
+            .defer("reference__sequence")
+            .filter(project=project)
+        )
+
+        # The cursor of each page is the id of the last VAF on the page before it
+        ids = list(vafs.order_by("id").values_list("id", flat=True))
+        num_pages = -(-len(ids) // page_size)
+        if not num_pages:
+            raise base.CommandError(f"Project '{project.code}' has no VAFs")
+
+        samples = max(min(options["samples"], num_pages), 1)
+        pages = sorted(
+            {round(i * (num_pages - 1) / max(samples - 1, 1)) for i in range(samples)}
+        )
+
+        factory = request_factory()
+        paginator = KeysetPagination()
+        paginator.page_size = page_size
+
+        def keyset(page):
+            params = {}
+            if page:
+                params[paginator.cursor_query_param] = paginator.encode_cursor(
+                    [ids[page * page_size - 1]]
+                )
+            request = Request(factory.get(f"/data/filter/{project.code}/", params))
+            return paginator.paginate_queryset(vafs, request)
+
+        def offset(page):
+            return list(vafs.order_by("id")[page * page_size : (page + 1) * page_size])
+
+        print(f"VAFs: {len(ids)}")
+        print(f"Page size: {page_size} ({num_pages} pages)")
+        print(f"{'page':<10}{'keyset (s)':<14}{'offset (s)':<14}")
+
+        timings = {}
+        for page in pages:
+            for name, fetch in [("keyset", keyset), ("offset", offset)]:
+                times = []
+                for _ in range(options["repeats"]):
+                    start = time.perf_counter()
+                    result = fetch(page)
+                    times.append(time.perf_counter() - start)
+                timings[page, name] = min(times)
+
+                if [vaf.id for vaf in result] != ids[
+                    page * page_size : (page + 1) * page_size
+                ]:
+                    raise base.CommandError(
+                        f"Page {page + 1} differs from the expected VAFs with {name} pagination"
+                    )
+
+            print(
+                f"{page + 1:<10}{round(timings[page, 'keyset'], 4):<14}{round(timings[page, 'offset'], 4):<14}"
+            )
+
+        first, last = pages[0], pages[-1]
+        for name in ["keyset", "offset"]:
+            print(
+                f"{name}: page {last + 1} costs {round(timings[last, name] / timings[first, name], 2)}x page 1"
+            )
@@ -0,0 +1,77 @@
+from django.core.management import base
+from rest_framework.renderers import JSONRenderer
+from ...models import Project, VAF
+from ...serializers import VAFSerializer, VAFValuesSerializer
+import time
+
+
+class Command(base.BaseCommand):
+    help = "Benchmark serializing a page of a project's VAFs, with the VAFSerializer and the VAFValuesSerializer."
+
+    def add_arguments(self, parser):
+        parser.add_argument("code")
+        parser.add_argument(
+            "--page-size",
+            type=int,
+            default=5000,
+            help="[optional] Number of VAFs in the page. Default: 5000",
+        )
+        parser.add_argument(
+            "--repeats",
+            type=int,
+            default=5,
+            help="[optional] Number of times the page is serialized. Default: 5",
+        )
+
+    def handle(self, *args, **options):
+        project = Project.objects.get(code=options["code"])
+        if project.packed:
+            raise base.CommandError(
+                f"Project '{project.code}' is packed, so its VAFs are not serialized from the VAF table"
+            )
+
+        page_size = options["page_size"]
+        vafs = VAF.objects.filter(project=project).order_by("id")
+        if not vafs.exists():
+            raise base.CommandError(f"Project '{project.code}' has no VAFs")
+
+        # Both read the page from the database, as the views do, so the timings include fetching the rows
+        def instances():
+            page = list(
+                vafs.select_related("metadata", "reference").defer(
+                    "reference__sequence"
+                )[:page_size]
+            )
+            return VAFSerializer(page, many=True).data
+
+        def values():
+            page = list(vafs.values_list(*VAFValuesSerializer.get_paths())[:page_size])
+            return VAFValuesSerializer(page).data
+
+        timings = {}
+        results = {}
+        for name, serialize in [
+            ("VAFSerializer", instances),
+            ("VAFValuesSerializer", values),
+        ]:
+            times = []
+            for _ in range(options["repeats"]):
+                start = time.perf_counter()
+                results[name] = serialize()
+                times.append(time.perf_counter() - start)
+            timings[name] = min(times)
+
+        rendered = {name: JSONRenderer().render(data) for name, data in results.items()}
+        if rendered["VAFSerializer"] != rendered["VAFValuesSerializer"]:
+            raise base.CommandError(
+                "Results of the VAFValuesSerializer differ from the VAFSerializer"
+            )
+
+        print(f"VAFs: {sum(len(md['vaf']) for md in results['VAFSerializer'])}")
+        print(f"Samples: {len(results['VAFSerializer'])}")
+        print(f"{'serializer':<22}{'time (s)':<12}")
+        for name, timing in timings.items():
+            print(f"{name:<22}{round(timing, 4):<12}")
+        print(
+            f"Speedup: {round(timings['VAFSerializer'] / timings['VAFValuesSerializer'], 2)}x"
+        )
@@ -0,0 +1,99 @@
+from django.core.management import base
+from ...stats import get_stats, iterate_batch_stats
+import maptide
+import numpy as np
+import time
+
+
+class Command(base.BaseCommand):
+    help = "Benchmark the batched statistics engine against the per-position statistics."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--bam",
+            help="[optional] Path of BAM file to benchmark on. Default: Randomly generated counts",
+        )
+        parser.add_argument(
+            "--region",
+            help="[optional] Region of the BAM file to benchmark on. Enter in 'CHROM:START-END' format. Default: All regions",
+        )
+        parser.add_argument(
+            "--positions",
+            type=int,
+            default=30000,
+            help="[optional] Number of randomly generated positions. Default: 30000",
+        )
+        parser.add_argument(
+            "--repeats",
+            type=int,
+            default=5,
+            help="[optional] Number of times each engine is run. Default: 5",
+        )
+        parser.add_argument(
+            "--decimals",
+            type=int,
+            default=3,
+            help="[optional] Number of decimal places to round to. Default: 3",
+        )
+
+    def handle(self, *args, **options):
+        if options["bam"]:
+            data = maptide.query(options["bam"], region=options["region"])
+        else:
+            # Mostly single-base positions, with some noise and some empty positions
+            rng = np.random.default_rng(0)
+            counts = rng.poisson(2, size=(options["positions"], 6))
+            counts[:, 0] += rng.poisson(500, size=options["positions"])
+            counts[rng.random(options["positions"]) < 0.01] = 0
+            data = {
+                "synthetic": {
+                    (pos, 0): row for pos, row in enumerate(counts.tolist(), start=1)
+                }
+            }
+
+        chroms = {chrom: sorted(chrom_data.items()) for chrom, chrom_data in data.items()}
+        num_positions = sum(len(items) for items in chroms.values())
+
+        def per_position():
+            return [
+                [chrom, pos, ins_pos] + get_stats(row, decimals=options["decimals"])
+                for chrom, items in chroms.items()
+                for (pos, ins_pos), row in items
+            ]
+
+        def batched():
+            return [
+                record
+                for chrom, items in chroms.items()
+                for record in iterate_batch_stats(
+                    chrom,
+                    [key for key, _ in items],
+                    [row for _, row in items],
+                    decimals=options["decimals"],
+                )
+            ]
+
+        results = {}
+        timings = {}
+        for name, engine in [("per-position", per_position), ("batched", batched)]:
+            times = []
+            for _ in range(options["repeats"]):
+                start = time.perf_counter()
+                results[name] = engine()
+                times.append(time.perf_counter() - start)
+            timings[name] = min(times)
+
+        print(f"Positions: {num_positions}")
+        for name, seconds in timings.items():
+            print(
+                f"{name}: {round(seconds, 3)} s ({round(num_positions / seconds)} positions/s)"
+            )
+        print(f"Speedup: {round(timings['per-position'] / timings['batched'], 1)}x")
+
+        if results["per-position"] == results["batched"]:
+            print("Outputs: identical")
+        else:
+            mismatches = sum(
+                a != b for a, b in zip(results["per-position"], results["batched"])
+            )
+            raise base.CommandError(f"Outputs differ at {mismatches} positions")
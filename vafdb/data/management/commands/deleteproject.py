@@ -1,5 +1,6 @@
 from django.core.management import base
 from ...models import Project
+from ...deletion import delete_project
 
 
 class Command(base.BaseCommand):
@@ -7,6 +8,11 @@ class Command(base.BaseCommand):
 
     def add_arguments(self, parser):
         parser.add_argument("code")
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            help="[optional] Number of rows deleted in each batch. Default: The DELETE_BATCH_SIZE setting",
+        )
 
     def handle(self, *args, **options):
         project = Project.objects.get(code=options["code"])
@@ -16,5 +22,12 @@ class Command(base.BaseCommand):
         yn = input("Proceed? [y/n]:").upper()
 
         if yn == "Y":
-            project.delete()
+            # Rows are deleted in batches, reporting progress after each one
+            delete_project(
+                project,
+                batch_size=options["batch_size"],
+                progress=lambda name, deleted, total: print(
+                    f"Deleted {deleted}/{total} {name}"
+                ),
+            )
             print("Project deleted.")
@@ -0,0 +1,158 @@
+from django.core.management import base
+from django.db import connection, connections
+from django.test.utils import override_settings
+from ...models import Project, Metadata
+from ...tasks import generate, store
+from ...querylog import request_factory, replay
+from ...deletion import delete_sample
+import multiprocessing
+import numpy as np
+import threading
+import time
+import uuid
+
+
+def read(entry, stop, latencies, errors):
+    """
+    Replay the request `entry` until `stop` is set, recording the latency of each response.
+    """
+    factory = request_factory()
+
+    try:
+        while not stop.is_set():
+            start = time.perf_counter()
+            try:
+                ok = replay(entry, factory).status_code == 200
+            except Exception:
+                ok = False
+            (latencies if ok else errors).append(time.perf_counter() - start)
+    finally:
+        connection.close()
+
+
+def ingest(code, bam, sample_ids):
+    """
+    Generate and store VAFs from the `bam` for each of the `sample_ids`, as the Celery workers would.
+    """
+    project = Project.objects.get(code=code)
+
+    for sample_id in sample_ids:
+        store(
+            generate(
+                code,
+                {"project": project.id, "sample_id": sample_id, "bam_path": bam},
+            )
+        )
+
+
+class Command(base.BaseCommand):
+    help = "Measure the latency of filter requests on a project, before and while samples are ingested into it."
+
+    def add_arguments(self, parser):
+        parser.add_argument("code")
+        parser.add_argument("bam", help="Path of BAM file to ingest.")
+        parser.add_argument(
+            "--samples",
+            type=int,
+            default=5,
+            help="[optional] Number of samples ingested from the BAM. Default: 5",
+        )
+        parser.add_argument(
+            "--readers",
+            type=int,
+            default=4,
+            help="[optional] Number of concurrent readers. Default: 4",
+        )
+        parser.add_argument(
+            "--field",
+            nargs=2,
+            action="append",
+            metavar=("FIELD", "VALUE"),
+            default=[],
+            help="[optional] Field and value to filter on. Default: No filters",
+        )
+        parser.add_argument(
+            "--baseline",
+            type=float,
+            default=5,
+            help="[optional] Seconds that reads are measured for before ingesting. Default: 5",
+        )
+
+    def handle(self, *args, **options):
+        project = Project.objects.get(code=options["code"])
+        entry = {
+            "view": "filter",
+            "code": project.code,
+            "params": {field: [value] for field, value in options["field"]},
+        }
+        sample_ids = [
+            f"loadtest-{uuid.uuid4().hex[:8]}-{i}" for i in range(options["samples"])
+        ]
+
+        if connection.vendor == "sqlite":
+            with connection.cursor() as cursor:
+                cursor.execute("PRAGMA journal_mode")
+                print(f"SQLite journal mode: {cursor.fetchone()[0]}")
+
+        def measure(during):
+            """
+            Measure reads on `options["readers"]` threads while `during` runs.
+            """
+            stop = threading.Event()
+            latencies = []
+            errors = []
+            readers = [
+                threading.Thread(target=read, args=(entry, stop, latencies, errors))
+                for _ in range(options["readers"])
+            ]
+            for reader in readers:
+                reader.start()
+
+            start = time.perf_counter()
+            try:
+                during()
+            finally:
+                stop.set()
+                for reader in readers:
+                    reader.join()
+
+            return time.perf_counter() - start, latencies, errors
+
+        def report(name, seconds, latencies, errors):
+            ms = np.array(latencies) * 1000 if latencies else np.zeros(1)
+            print(f"[{name}]")
+            print(f"Time: {round(seconds, 1)} s")
+            print(
+                f"Requests: {len(latencies)} ({round(len(latencies) / seconds, 1)}/s)"
+            )
+            print(
+                f"Latency: p50 {round(float(np.percentile(ms, 50)), 1)} ms, "
+                f"p95 {round(float(np.percentile(ms, 95)), 1)} ms, "
+                f"max {round(float(ms.max()), 1)} ms"
+            )
+            print(f"Errors: {len(errors)}")
+
+        def ingesting():
+            # Ingest runs in its own process (as the store worker does), so it competes with the readers for the database
+            connections.close_all()
+            process = multiprocessing.get_context("fork").Process(
+                target=ingest,
+                args=(project.code, options["bam"], sample_ids),
+            )
+            process.start()
+            process.join()
+            if process.exitcode != 0:
+                raise base.CommandError(
+                    f"Ingest failed with exit code {process.exitcode}"
+                )
+
+        # Requests made by the load test are not added to the query log
+        with override_settings(QUERY_LOG_FILE=None):
+            try:
+                report("BASELINE", *measure(lambda: time.sleep(options["baseline"])))
+                report("DURING INGEST", *measure(ingesting))
+            finally:
+                for metadata in Metadata.objects.filter(
+                    project=project, sample_id__in=sample_ids
+                ):
+                    delete_sample(metadata)
@@ -1,4 +1,6 @@
 from django.core.management import base
+from django.conf import settings
+from django.db.models import F
 from ...models import Project, Reference
 from Bio import SeqIO
 from maptide import parse_region
@@ -17,7 +19,8 @@ class Command(base.BaseCommand):
         parser.add_argument("--description", help="[optional] Project description.")
         parser.add_argument(
             "--region",
-            help="[optional] Specific region to store. Enter in 'CHROM:START-END' format. Default: All regions",
+            nargs="+",
+            help="[optional] Specific region(s) to store. Enter in 'CHROM:START-END' format. Default: All regions",
         )
         parser.add_argument(
             "--base-quality",
@@ -59,10 +62,30 @@ class Command(base.BaseCommand):
             type=float,
             help="[optional] Only store VAFs with a different base from the reference, above a certain confidence. Default: None",
         )
+        parser.add_argument(
+            "--chunk-size",
+            type=int,
+            help=f"[optional] Number of VAFs generated and stored at a time. Default: {settings.VAF_BATCH_SIZE}",
+        )
+        parser.add_argument(
+            "--packed",
+            action="store_true",
+            help="[optional] Store each sample's VAFs packed into compressed arrays, rather than as one row per VAF. Default: False",
+        )
+        parser.add_argument(
+            "--store-derived",
+            action="store_true",
+            help="[optional] Store the reference base and base percentages of each VAF, rather than deriving them when the VAFs are read. Default: False",
+        )
 
     def handle(self, *args, **options):
+        if options["chunk_size"] is not None and options["chunk_size"] <= 0:
+            raise base.CommandError("The chunk size must be a positive integer.")
+
         if options["region"]:
-            parse_region(options["region"])
+            for region in options["region"]:
+                parse_region(region)
+            options["region"] = ",".join(options["region"])
 
         project = Project.objects.create(
             code=options["code"],
@@ -75,6 +98,9 @@ class Command(base.BaseCommand):
             min_secondary_entropy=options["min_secondary_entropy"],
             insertions=options["insertions"],
             diff_confidence=options["diff_confidence"],
+            chunk_size=options["chunk_size"],
+            packed=options["packed"],
+            store_derived=options["store_derived"],
         )
 
         references = []
@@ -100,6 +126,9 @@ class Command(base.BaseCommand):
             else:
                 print("Sequence ignored.")
 
+        # Bump the project version, so that workers refresh any cached copies of the project
+        Project.objects.filter(pk=project.pk).update(version=F("version") + 1)
+
         print("Project created.")
         print("Code:", project.code)
         print("Description:", project.description)
@@ -0,0 +1,24 @@
+from django.core.management import base
+from django.conf import settings
+from ...spool import prune_spools
+
+
+class Command(base.BaseCommand):
+    help = "Delete spools of VAFs that were generated but never stored."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--max-age",
+            type=float,
+            help="[optional] Delete spools that have not been written to in this many hours. Default: The SPOOL_MAX_AGE setting",
+        )
+
+    def handle(self, *args, **options):
+        max_age = options["max_age"]
+        if max_age is None:
+            max_age = settings.SPOOL_MAX_AGE
+
+        removed = prune_spools(max_age)
+        for path in removed:
+            print(f"Deleted {path}")
+        print(f"Deleted {len(removed)} spools.")
@@ -0,0 +1,162 @@
+from django.core.management import base
+from django.db import connection
+from django.test.utils import CaptureQueriesContext, override_settings
+from collections import Counter
+from ...models import Metadata, VAF, PackedVAF
+from ...querylog import read_log, request_factory, replay
+import time
+import re
+
+# Models whose tables and indexes are reported on
+MODELS = [Metadata, VAF, PackedVAF]
+
+
+def get_indexes(model):
+    """
+    Names of the indexes on the table of the `model`, not including its primary key.
+    """
+    with connection.cursor() as cursor:
+        constraints = connection.introspection.get_constraints(
+            cursor, model._meta.db_table
+        )
+
+    return [
+        name
+        for name, constraint in constraints.items()
+        if constraint["index"] and not constraint["primary_key"]
+    ]
+
+
+def root_relation(cursor, name):
+    """
+    The partitioned table (or index) that the PostgreSQL relation `name` is a partition of, or `name` if it is not a partition.
+    """
+    while True:
+        cursor.execute(
+            "SELECT inhparent::regclass::text FROM pg_inherits WHERE inhrelid = to_regclass(%s)",
+            [name],
+        )
+        row = cursor.fetchone()
+        if row is None:
+            return name
+        name = row[0]
+
+
+def explain(sql):
+    """
+    Returns the indexes (and full table scans) in the query plan of the `sql`, or `None` if the database cannot report it.
+    """
+    uses = []
+
+    with connection.cursor() as cursor:
+        if connection.vendor == "postgresql":
+            # Indexes and scans of a partition are reported as those of the partitioned table
+            cursor.execute("EXPLAIN " + sql)
+            for (line,) in cursor.fetchall():
+                match = re.search(
+                    r"Index (?:Only )?Scan(?: Backward)? using (\S+)", line
+                )
+                match = match or re.search(r"Bitmap Index Scan on (\S+)", line)
+                if match:
+                    uses.append(root_relation(cursor, match.group(1)))
+                elif match := re.search(r"Seq Scan on (\S+)", line):
+                    uses.append(f"full scan of {root_relation(cursor, match.group(1))}")
+
+        elif connection.vendor == "sqlite":
+            cursor.execute("EXPLAIN QUERY PLAN " + sql)
+            for row in cursor.fetchall():
+                words = row[-1].split()
+                if words[0] not in {"SCAN", "SEARCH"}:
+                    continue
+
+                if match := re.search(r"USING (?:COVERING )?INDEX (\S+)", row[-1]):
+                    uses.append(match.group(1))
+                elif "INTEGER PRIMARY KEY" in row[-1]:
+                    uses.append(f"primary key of {words[1]}")
+                elif words[0] == "SCAN":
+                    uses.append(f"full scan of {words[1]}")
+
+        else:
+            return None
+
+    return list(dict.fromkeys(uses))
+
+
+class Command(base.BaseCommand):
+    help = "Replay a log of filter and query requests, and report the indexes each request uses and how long it takes."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "log",
+            help="Path of a query log, as written to the QUERY_LOG_FILE setting.",
+        )
+        parser.add_argument(
+            "--repeats",
+            type=int,
+            default=3,
+            help="[optional] Number of times each request is run. Default: 3",
+        )
+        parser.add_argument(
+            "--limit",
+            type=int,
+            help="[optional] Maximum number of requests to replay. Default: All requests",
+        )
+
+    def handle(self, *args, **options):
+        entries = read_log(options["log"])[: options["limit"]]
+        if not entries:
+            raise base.CommandError(f"No requests found in '{options['log']}'")
+
+        factory = request_factory()
+        tables = {model._meta.db_table for model in MODELS}
+        uses = Counter()
+        times = Counter()
+
+        # Replayed requests are not themselves added to the log
+        with override_settings(QUERY_LOG_FILE=None):
+            for i, entry in enumerate(entries):
+                seconds = []
+                for _ in range(options["repeats"]):
+                    with CaptureQueriesContext(connection) as queries:
+                        start = time.perf_counter()
+                        response = replay(entry, factory)
+                        seconds.append(time.perf_counter() - start)
+
+                sql_seconds = sum(float(query["time"]) for query in queries)
+
+                # Explain the queries of the final run that read from the reported tables
+                indexes = []
+                for query in queries:
+                    if query["sql"].lstrip().upper().startswith("SELECT") and any(
+                        table in query["sql"] for table in tables
+                    ):
+                        plan = explain(query["sql"])
+                        if plan is None:
+                            indexes = None
+                            break
+                        indexes += [x for x in plan if x not in indexes]
+
+                for index in indexes or []:
+                    uses[index] += 1
+                    times[index] += min(seconds)
+
+                print(
+                    f"[{i + 1}] {entry['view']} {entry['code']} [{response.status_code}] "
+                    f"time: {round(min(seconds) * 1000, 1)} ms "
+                    f"sql: {round(sql_seconds * 1000, 1)} ms "
+                    f"indexes: {'unavailable for this database' if indexes is None else ', '.join(indexes) or 'none'}"
+                )
+
+        print("[INDEXES]")
+        for index, count in uses.most_common():
+            print(
+                f"{index}: {count} requests, mean time: {round(times[index] / count * 1000, 1)} ms"
+            )
+
+        unused = [
+            index
+            for model in MODELS
+            for index in get_indexes(model)
+            if index not in uses
+        ]
+        print(f"Unused: {', '.join(unused) or 'none'}")
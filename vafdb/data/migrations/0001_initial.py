@@ -0,0 +1,135 @@
+# Generated by Django 5.2.18 on 2026-10-18 19:05
+
+import django.db.models.deletion
+import utils.fields
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Project',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('code', utils.fields.LowerCharField(max_length=50, unique=True)),
+                ('description', models.TextField(null=True)),
+                ('region', models.TextField(null=True)),
+                ('base_quality', models.IntegerField(default=0)),
+                ('mapping_quality', models.IntegerField(default=0)),
+                ('min_coverage', models.IntegerField(default=0)),
+                ('min_entropy', models.FloatField(default=0)),
+                ('min_secondary_entropy', models.FloatField(default=0)),
+                ('insertions', models.BooleanField(default=False)),
+                ('diff_confidence', models.IntegerField(null=True)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['code'], name='data_projec_code_86222e_idx')],
+            },
+        ),
+        migrations.CreateModel(
+            name='Metadata',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created', models.DateTimeField(auto_now_add=True)),
+                ('sample_id', models.TextField()),
+                ('bam_path', models.TextField()),
+                ('published_date', models.DateField(auto_now_add=True)),
+                ('collection_date', models.DateField(null=True)),
+                ('site', models.TextField(null=True)),
+                ('num_reads', models.IntegerField(null=True)),
+                ('num_vafs', models.IntegerField(null=True)),
+                ('mean_coverage', models.FloatField(null=True)),
+                ('mean_entropy', models.FloatField(null=True)),
+                ('references', models.TextField(null=True)),
+                ('project', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='data.project')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='Reference',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.TextField()),
+                ('sequence', models.TextField()),
+                ('project', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='data.project')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='VAF',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created', models.DateTimeField(auto_now_add=True)),
+                ('reference', models.TextField()),
+                ('position', models.IntegerField()),
+                ('insertion', models.IntegerField()),
+                ('ptype', utils.fields.UpperCharField(choices=[('REF', 'REF'), ('INS', 'INS')], max_length=3)),
+                ('coverage', models.IntegerField()),
+                ('ref_base', utils.fields.UpperCharField(choices=[('A', 'A'), ('C', 'C'), ('T', 'T'), ('G', 'G'), ('DS', 'DS')], max_length=2)),
+                ('base', utils.fields.UpperCharField(choices=[('A', 'A'), ('C', 'C'), ('T', 'T'), ('G', 'G'), ('DS', 'DS')], max_length=2, null=True)),
+                ('confidence', models.FloatField()),
+                ('diff', models.BooleanField()),
+                ('a', models.IntegerField()),
+                ('c', models.IntegerField()),
+                ('g', models.IntegerField()),
+                ('t', models.IntegerField()),
+                ('ds', models.IntegerField()),
+                ('pc_a', models.FloatField()),
+                ('pc_c', models.FloatField()),
+                ('pc_g', models.FloatField()),
+                ('pc_t', models.FloatField()),
+                ('pc_ds', models.FloatField()),
+                ('entropy', models.FloatField()),
+                ('secondary_entropy', models.FloatField()),
+                ('metadata', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='vaf', to='data.metadata')),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='metadata',
+            index=models.Index(fields=['project', 'sample_id'], name='data_metada_project_418aeb_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='metadata',
+            index=models.Index(fields=['project'], name='data_metada_project_b7803c_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='metadata',
+            index=models.Index(fields=['sample_id'], name='data_metada_sample__d53841_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='metadata',
+            index=models.Index(fields=['published_date'], name='data_metada_publish_fe305f_idx'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='metadata',
+            unique_together={('project', 'sample_id')},
+        ),
+        migrations.AlterUniqueTogether(
+            name='reference',
+            unique_together={('project', 'name')},
+        ),
+        migrations.AddIndex(
+            model_name='vaf',
+            index=models.Index(fields=['metadata'], name='data_vaf_metadat_efd02c_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='vaf',
+            index=models.Index(fields=['reference'], name='data_vaf_referen_3aa08a_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='vaf',
+            index=models.Index(fields=['position'], name='data_vaf_positio_373a28_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='vaf',
+            index=models.Index(fields=['insertion'], name='data_vaf_inserti_54c51c_idx'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='vaf',
+            unique_together={('metadata', 'reference', 'position', 'insertion')},
+        ),
+    ]
@@ -0,0 +1,238 @@
+# Generated by Django 5.2.18 on 2026-10-18 19:05
+
+import data.models
+import django.db.models.deletion
+import utils.fields
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery
+
+
+def fill_vaf_project_and_reference(apps, schema_editor):
+    """
+    Fill in the project of each existing VAF from its sample, and its reference from the name it was stored with.
+    """
+    Metadata = apps.get_model("data", "Metadata")
+    Reference = apps.get_model("data", "Reference")
+    VAF = apps.get_model("data", "VAF")
+
+    VAF.objects.update(
+        project_id=Subquery(
+            Metadata.objects.filter(id=OuterRef("metadata_id")).values("project_id")
+        )
+    )
+    VAF.objects.update(
+        reference_id=Subquery(
+            Reference.objects.filter(
+                project_id=OuterRef("project_id"), name=OuterRef("reference_name")
+            ).values("id")
+        )
+    )
+
+
+def fill_vaf_reference_name(apps, schema_editor):
+    """
+    Fill in the name of each VAF's reference, from its reference.
+    """
+    Reference = apps.get_model("data", "Reference")
+    VAF = apps.get_model("data", "VAF")
+
+    VAF.objects.update(
+        reference_name=Subquery(
+            Reference.objects.filter(id=OuterRef("reference_id")).values("name")
+        )
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('data', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Job',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('task_id', models.UUIDField(unique=True)),
+                ('batch_id', models.UUIDField(null=True)),
+                ('sample_id', models.TextField()),
+                ('state', utils.fields.UpperCharField(choices=[('PENDING', 'PENDING'), ('SKIPPED', 'SKIPPED'), ('GENERATING', 'GENERATING'), ('GENERATED', 'GENERATED'), ('STORING', 'STORING'), ('SUCCESS', 'SUCCESS'), ('FAILURE', 'FAILURE')], default='PENDING', max_length=10)),
+                ('error', models.TextField(null=True)),
+                ('submitted', models.DateTimeField(auto_now_add=True)),
+                ('generate_started', models.DateTimeField(null=True)),
+                ('generate_finished', models.DateTimeField(null=True)),
+                ('store_started', models.DateTimeField(null=True)),
+                ('store_finished', models.DateTimeField(null=True)),
+                ('pileup_time', models.FloatField(null=True)),
+                ('stats_time', models.FloatField(null=True)),
+                ('filter_time', models.FloatField(null=True)),
+                ('spool_time', models.FloatField(null=True)),
+                ('write_time', models.FloatField(null=True)),
+                ('num_positions', models.IntegerField(null=True)),
+                ('num_vafs', models.IntegerField(null=True)),
+                ('filtered_insertion', models.IntegerField(null=True)),
+                ('filtered_coverage', models.IntegerField(null=True)),
+                ('filtered_diff', models.IntegerField(null=True)),
+                ('filtered_entropy', models.IntegerField(null=True)),
+                ('filtered_secondary_entropy', models.IntegerField(null=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='PackedVAF',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('reference', models.TextField()),
+                ('num_vafs', models.IntegerField()),
+                ('positions', models.BinaryField()),
+                ('insertions', models.BinaryField()),
+                ('counts', models.BinaryField()),
+                ('ref_bases', models.BinaryField()),
+            ],
+        ),
+        migrations.CreateModel(
+            name='PositionSummary',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('position', models.IntegerField()),
+                ('insertion', models.IntegerField()),
+                ('num_samples', models.IntegerField()),
+                ('num_diff', models.IntegerField()),
+                ('num_base_a', models.IntegerField()),
+                ('num_base_c', models.IntegerField()),
+                ('num_base_g', models.IntegerField()),
+                ('num_base_t', models.IntegerField()),
+                ('num_base_ds', models.IntegerField()),
+                ('sum_coverage', models.BigIntegerField()),
+                ('sum_pc_a', models.BigIntegerField()),
+                ('sum_pc_c', models.BigIntegerField()),
+                ('sum_pc_g', models.BigIntegerField()),
+                ('sum_pc_t', models.BigIntegerField()),
+                ('sum_pc_ds', models.BigIntegerField()),
+            ],
+        ),
+        migrations.RemoveIndex(
+            model_name='metadata',
+            name='data_metada_project_418aeb_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='metadata',
+            name='data_metada_project_b7803c_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='vaf',
+            name='data_vaf_metadat_efd02c_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='vaf',
+            name='data_vaf_referen_3aa08a_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='vaf',
+            name='data_vaf_positio_373a28_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='vaf',
+            name='data_vaf_inserti_54c51c_idx',
+        ),
+        migrations.AlterUniqueTogether(
+            name='vaf',
+            unique_together=set(),
+        ),
+        migrations.AddField(
+            model_name='metadata',
+            name='bam_hash',
+            field=models.TextField(null=True),
+        ),
+        migrations.AddField(
+            model_name='metadata',
+            name='bam_mtime',
+            field=models.BigIntegerField(null=True),
+        ),
+        migrations.AddField(
+            model_name='metadata',
+            name='bam_size',
+            field=models.BigIntegerField(null=True),
+        ),
+        migrations.AddField(
+            model_name='metadata',
+            name='cold_file',
+            field=models.TextField(null=True),
+        ),
+        migrations.AddField(
+            model_name='project',
+            name='chunk_size',
+            field=models.IntegerField(null=True),
+        ),
+        migrations.AddField(
+            model_name='project',
+            name='packed',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.AddField(
+            model_name='project',
+            name='store_derived',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.AddField(
+            model_name='project',
+            name='version',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='vaf',
+            name='project',
+            field=models.ForeignKey(db_index=False, null=True, on_delete=django.db.models.deletion.CASCADE, to='data.project'),
+        ),
+        migrations.AlterField(
+            model_name='metadata',
+            name='project',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, to='data.project'),
+        ),
+        migrations.AlterField(
+            model_name='vaf',
+            name='metadata',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='vaf', to='data.metadata'),
+        ),
+        migrations.AlterField(
+            model_name='vaf',
+            name='pc_a',
+            field=data.models.PercentageField(count='a', null=True),
+        ),
+        migrations.AlterField(
+            model_name='vaf',
+            name='pc_c',
+            field=data.models.PercentageField(count='c', null=True),
+        ),
+        migrations.AlterField(
+            model_name='vaf',
+            name='pc_ds',
+            field=data.models.PercentageField(count='ds', null=True),
+        ),
+        migrations.AlterField(
+            model_name='vaf',
+            name='pc_g',
+            field=data.models.PercentageField(count='g', null=True),
+        ),
+        migrations.AlterField(
+            model_name='vaf',
+            name='pc_t',
+            field=data.models.PercentageField(count='t', null=True),
+        ),
+        migrations.AlterField(
+            model_name='vaf',
+            name='ref_base',
+            field=data.models.ReferenceBaseField(choices=[('A', 'A'), ('C', 'C'), ('T', 'T'), ('G', 'G'), ('DS', 'DS')], max_length=2, null=True),
+        ),
+        migrations.RenameField(
+            model_name='vaf',
+            old_name='reference',
+            new_name='reference_name',
+        ),
+        migrations.AddField(
+            model_name='vaf',
+            name='reference',
+            field=models.ForeignKey(db_index=False, null=True, on_delete=django.db.models.deletion.CASCADE, to='data.reference'),
+        ),
+        migrations.RunPython(fill_vaf_project_and_reference, fill_vaf_reference_name),
+    ]
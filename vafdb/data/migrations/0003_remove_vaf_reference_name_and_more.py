@@ -0,0 +1,80 @@
+# Generated by Django 5.2.18 on 2026-10-18 19:05
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('data', '0002_vaf_project_reference_and_more'),
+    ]
+
+    operations = [
+        migrations.RemoveField(
+            model_name='vaf',
+            name='reference_name',
+        ),
+        migrations.AlterField(
+            model_name='vaf',
+            name='project',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, to='data.project'),
+        ),
+        migrations.AlterField(
+            model_name='vaf',
+            name='reference',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, to='data.reference'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='vaf',
+            unique_together={('metadata', 'reference', 'position', 'insertion', 'project')},
+        ),
+        migrations.AddIndex(
+            model_name='vaf',
+            index=models.Index(fields=['project', 'position'], name='vaf_project_position_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='vaf',
+            index=models.Index(fields=['reference', 'position'], name='vaf_reference_position_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='vaf',
+            index=models.Index(condition=models.Q(('diff', True)), fields=['project', 'position'], name='vaf_diff_idx'),
+        ),
+        migrations.AddField(
+            model_name='job',
+            name='project',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='data.project'),
+        ),
+        migrations.AddField(
+            model_name='packedvaf',
+            name='metadata',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='packed_vaf', to='data.metadata'),
+        ),
+        migrations.AddField(
+            model_name='positionsummary',
+            name='project',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, to='data.project'),
+        ),
+        migrations.AddField(
+            model_name='positionsummary',
+            name='reference',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, to='data.reference'),
+        ),
+        migrations.AddIndex(
+            model_name='job',
+            index=models.Index(fields=['batch_id'], name='data_job_batch_i_916382_idx'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='packedvaf',
+            unique_together={('metadata', 'reference')},
+        ),
+        migrations.AddIndex(
+            model_name='positionsummary',
+            index=models.Index(fields=['project', 'position'], name='summary_project_position_idx'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='positionsummary',
+            unique_together={('project', 'reference', 'position', 'insertion')},
+        ),
+    ]
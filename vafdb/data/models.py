@@ -1,6 +1,12 @@
+from django.conf import settings
 from django.db import models
+from django.db.models.expressions import Col
 from django.db.models.lookups import BuiltinLookup
 from django.db.models.fields.related_lookups import RelatedLookupMixin
+from decimal import Decimal
+from fractions import Fraction
+import functools
+import math
 from utils.functions import choices
 from utils.fields import UpperCharField, LowerCharField
 
@@ -46,6 +52,194 @@ class IsNullRelated(RelatedLookupMixin, IsNull):
     pass
 
 
+class Derived(models.Expression):
+    """
+    The value of a derived VAF field: the stored value if there is one, and otherwise the value derived from the rest of the VAF.
+    """
+
+    def __init__(self, col):
+        super().__init__(output_field=col.output_field)
+        self.col = col
+
+    def get_source_expressions(self):
+        return [self.col]
+
+    def set_source_expressions(self, exprs):
+        (self.col,) = exprs
+
+    def as_sql(self, compiler, connection):
+        sql, params = compiler.compile(self.col)
+        derived = self.col.target.derived_sql(
+            compiler.quote_name_unless_alias(self.col.alias), connection
+        )
+        return f"COALESCE({sql}, {derived})", params
+
+
+@functools.cache
+def derived_lookup(lookup):
+    """
+    Subclass of the `lookup` that is applied to the `Derived` value of its field.
+    """
+
+    class DerivedLookup(lookup):
+        def __init__(self, lhs, rhs):
+            if isinstance(lhs, Col):
+                lhs = Derived(lhs)
+            super().__init__(lhs, rhs)
+
+    DerivedLookup.__name__ = "Derived" + lookup.__name__
+    return DerivedLookup
+
+
+class DerivedFieldMixin:
+    """
+    Mixin for VAF fields that can be derived from the other fields of the VAF, so they are only stored by projects that ask for them.
+
+    Lookups on the field are applied to the stored value if there is one, and otherwise to the value derived in SQL.
+    """
+
+    def get_lookup(self, lookup_name):
+        lookup = super().get_lookup(lookup_name)
+        if lookup is None:
+            return None
+
+        return derived_lookup(lookup)
+
+
+class ReferenceBaseField(DerivedFieldMixin, UpperCharField):
+    """
+    Base of the reference sequence at the VAF's position.
+    """
+
+    def derived_sql(self, alias, connection):
+        qn = connection.ops.quote_name
+        return "(SELECT SUBSTR(r.{}, {}.{}, 1) FROM {} r WHERE r.{} = {}.{})".format(
+            qn("sequence"),
+            alias,
+            qn(self.model._meta.get_field("position").column),
+            qn(Reference._meta.db_table),
+            qn("id"),
+            alias,
+            qn(self.model._meta.get_field("reference").column),
+        )
+
+
+class PercentageLookup(models.Lookup):
+    """
+    Compares a percentage of the coverage, as rounded to `FLOATFIELD_DECIMAL_PLACES` by the generate task.
+
+    The comparison is made with exact integer arithmetic on the counts. For a scale `S = 10 ** decimals`,
+    a percentage is at least `k / S` when its count / coverage is above the rounding boundary `(2k - 1) / 200S`.
+    Percentages exactly on a boundary are rounded up or down as Python's `round` rounds them.
+    """
+
+    prepare_rhs = False
+
+    def at_least(self, k, count, coverage):
+        """
+        SQL condition that the rounded percentage is at least `k / S`.
+        """
+        decimals = settings.FLOATFIELD_DECIMAL_PLACES
+        scale = 10**decimals
+
+        if k <= 0:
+            return "1 = 1"
+
+        if k > 100 * scale:
+            return "1 = 0"
+
+        # Find which way Python rounds a percentage that lies exactly on the boundary
+        boundary = Fraction(2 * k - 1, 200 * scale)
+        rounds_up = round(round(100 * float(boundary), decimals) * scale) == k
+
+        return "({} > 0 AND CAST({} AS BIGINT) * {} {} CAST({} AS BIGINT) * {})".format(
+            coverage,
+            200 * scale,
+            count,
+            ">=" if rounds_up else ">",
+            2 * k - 1,
+            coverage,
+        )
+
+    def scaled(self, value):
+        return Decimal(str(value)) * 10**settings.FLOATFIELD_DECIMAL_PLACES
+
+    def gte(self, value, count, coverage):
+        return self.at_least(math.ceil(self.scaled(value)), count, coverage)
+
+    def gt(self, value, count, coverage):
+        return self.at_least(math.floor(self.scaled(value)) + 1, count, coverage)
+
+    def exact(self, value, count, coverage):
+        if self.scaled(value) != int(self.scaled(value)):
+            return "1 = 0"
+        return f"({self.gte(value, count, coverage)} AND NOT {self.gt(value, count, coverage)})"
+
+    # SQL condition of each lookup, given the lookup, its value and the count and coverage columns
+    # These are the only lookups registered on a `PercentageField`
+    conditions = {
+        "exact": lambda self, value, *columns: self.exact(value, *columns),
+        "ne": lambda self, value, *columns: f"NOT {self.exact(value, *columns)}",
+        "gte": lambda self, value, *columns: self.gte(value, *columns),
+        "gt": lambda self, value, *columns: self.gt(value, *columns),
+        "lte": lambda self, value, *columns: f"NOT {self.gt(value, *columns)}",
+        "lt": lambda self, value, *columns: f"NOT {self.gte(value, *columns)}",
+        "in": lambda self, values, *columns: "({})".format(
+            " OR ".join([self.exact(x, *columns) for x in values] or ["1 = 0"])
+        ),
+        "range": lambda self, values, *columns: "({} AND NOT {})".format(
+            self.gte(values[0], *columns), self.gt(values[1], *columns)
+        ),
+    }
+
+    def as_sql(self, compiler, connection):
+        qn = connection.ops.quote_name
+        alias = compiler.quote_name_unless_alias(self.lhs.alias)
+        field = self.lhs.target
+        count = f"{alias}.{qn(field.model._meta.get_field(field.count).column)}"
+        coverage = f"{alias}.{qn(field.model._meta.get_field('coverage').column)}"
+
+        return self.conditions[self.lookup_name](self, self.rhs, count, coverage), []
+
+
+@functools.cache
+def percentage_lookup(lookup_name):
+    return type(
+        "Percentage" + lookup_name.capitalize(),
+        (PercentageLookup,),
+        {"lookup_name": lookup_name},
+    )
+
+
+class PercentageField(DerivedFieldMixin, models.FloatField):
+    """
+    Percentage of the VAF's coverage made up by the `count` field.
+
+    Comparisons are made on the counts (see `PercentageLookup`), so they give the same result whether or not the percentage is stored.
+    """
+
+    def __init__(self, *args, count=None, **kwargs):
+        self.count = count
+        super().__init__(*args, **kwargs)
+
+    def deconstruct(self):
+        name, path, args, kwargs = super().deconstruct()
+        kwargs["count"] = self.count
+        return name, path, args, kwargs
+
+    def get_lookup(self, lookup_name):
+        if lookup_name in PercentageLookup.conditions:
+            return percentage_lookup(lookup_name)
+
+        return super().get_lookup(lookup_name)
+
+    def derived_sql(self, alias, connection):
+        qn = connection.ops.quote_name
+        count = f"{alias}.{qn(self.model._meta.get_field(self.count).column)}"
+        coverage = f"{alias}.{qn(self.model._meta.get_field('coverage').column)}"
+        return f"(CASE WHEN {coverage} > 0 THEN 100 * (CAST({count} AS DOUBLE PRECISION) / {coverage}) ELSE 0 END)"
+
+
 class Project(models.Model):
     code = LowerCharField(max_length=50, unique=True)
     description = models.TextField(null=True)
@@ -57,6 +251,10 @@ class Project(models.Model):
     min_secondary_entropy = models.FloatField(default=0)
     insertions = models.BooleanField(default=False)
     diff_confidence = models.IntegerField(null=True)
+    chunk_size = models.IntegerField(null=True)
+    packed = models.BooleanField(default=False)
+    store_derived = models.BooleanField(default=False)
+    version = models.IntegerField(default=0)
 
     class Meta:
         indexes = [
@@ -78,9 +276,12 @@ class Reference(models.Model):
 
 class Metadata(models.Model):
     created = models.DateTimeField(auto_now_add=True)
-    project = models.ForeignKey(Project, on_delete=models.CASCADE)
+    project = models.ForeignKey(Project, on_delete=models.CASCADE, db_index=False)
     sample_id = models.TextField()
     bam_path = models.TextField()
+    bam_size = models.BigIntegerField(null=True)
+    bam_mtime = models.BigIntegerField(null=True)
+    bam_hash = models.TextField(null=True)
     published_date = models.DateField(auto_now_add=True)
     collection_date = models.DateField(null=True)
     site = models.TextField(null=True)
@@ -89,15 +290,16 @@ class Metadata(models.Model):
     mean_coverage = models.FloatField(null=True)
     mean_entropy = models.FloatField(null=True)
     references = models.TextField(null=True)
+    # Name of the cold file that the sample's VAFs have been moved to, if they are no longer in the VAF table
+    cold_file = models.TextField(null=True)
 
     class Meta:
         unique_together = [
             "project",
             "sample_id",
         ]
+        # The unique (project, sample_id) index also serves lookups by project alone
         indexes = [
-            models.Index(fields=["project", "sample_id"]),
-            models.Index(fields=["project"]),
             models.Index(fields=["sample_id"]),
             models.Index(fields=["published_date"]),
         ]
@@ -105,13 +307,18 @@ class Metadata(models.Model):
 
 class VAF(models.Model):
     created = models.DateTimeField(auto_now_add=True)
-    metadata = models.ForeignKey(Metadata, on_delete=models.CASCADE, related_name="vaf")
-    reference = models.TextField()
+    project = models.ForeignKey(Project, on_delete=models.CASCADE, db_index=False)
+    metadata = models.ForeignKey(
+        Metadata, on_delete=models.CASCADE, related_name="vaf", db_index=False
+    )
+    reference = models.ForeignKey(Reference, on_delete=models.CASCADE, db_index=False)
     position = models.IntegerField()
     insertion = models.IntegerField()
     ptype = UpperCharField(max_length=3, choices=choices(["REF", "INS"]))
     coverage = models.IntegerField()
-    ref_base = UpperCharField(max_length=2, choices=choices(["A", "C", "T", "G", "DS"]))
+    ref_base = ReferenceBaseField(
+        max_length=2, choices=choices(["A", "C", "T", "G", "DS"]), null=True
+    )
     base = UpperCharField(
         max_length=2, choices=choices(["A", "C", "T", "G", "DS"]), null=True
     )
@@ -122,24 +329,152 @@ class VAF(models.Model):
     g = models.IntegerField()
     t = models.IntegerField()
     ds = models.IntegerField()
-    pc_a = models.FloatField()
-    pc_c = models.FloatField()
-    pc_g = models.FloatField()
-    pc_t = models.FloatField()
-    pc_ds = models.FloatField()
+    pc_a = PercentageField(count="a", null=True)
+    pc_c = PercentageField(count="c", null=True)
+    pc_g = PercentageField(count="g", null=True)
+    pc_t = PercentageField(count="t", null=True)
+    pc_ds = PercentageField(count="ds", null=True)
     entropy = models.FloatField()
     secondary_entropy = models.FloatField()
 
+    # Fields that are only stored by projects with `store_derived` set, and are otherwise derived when queried
+    DERIVED_FIELDS = ["ref_base", "pc_a", "pc_c", "pc_g", "pc_t", "pc_ds"]
+
+    class Meta:
+        # The project is included in the unique constraint because it is the partition key on PostgreSQL
+        unique_together = [
+            "metadata",
+            "reference",
+            "position",
+            "insertion",
+            "project",
+        ]
+        # Filters are always applied within a project, on the project's VAFs (which on PostgreSQL are its partition):
+        # - The unique (metadata, reference, position, insertion, project) index serves lookups and deletes by sample
+        # - (project, position) serves position filters
+        # - (reference, position) serves position filters on a reference, and deletes of a reference
+        # - The partial index on (project, position) serves the (much fewer) VAFs that differ from the reference
+        indexes = [
+            models.Index(
+                fields=["project", "position"], name="vaf_project_position_idx"
+            ),
+            models.Index(
+                fields=["reference", "position"], name="vaf_reference_position_idx"
+            ),
+            models.Index(
+                fields=["project", "position"],
+                condition=models.Q(diff=True),
+                name="vaf_diff_idx",
+            ),
+        ]
+
+
+class PackedVAF(models.Model):
+    """
+    The VAFs of a sample on one reference, packed into compressed arrays.
+
+    Positions are delta-encoded, and the counts are stored as int32 (one row of A, C, G, T, DS, N per VAF).
+    Every other VAF field is derived from the counts and the reference bases when the VAFs are unpacked.
+    """
+
+    metadata = models.ForeignKey(
+        Metadata, on_delete=models.CASCADE, related_name="packed_vaf", db_index=False
+    )
+    reference = models.TextField()
+    num_vafs = models.IntegerField()
+    positions = models.BinaryField()
+    insertions = models.BinaryField()
+    counts = models.BinaryField()
+    ref_bases = models.BinaryField()
+
     class Meta:
         unique_together = [
             "metadata",
             "reference",
+        ]
+
+
+class PositionSummary(models.Model):
+    """
+    Totals across the VAFs of a project's samples at one position, updated as samples are stored and deleted.
+
+    Percentages are summed as integers, in units of the smallest stored decimal place,
+    so that the sums for a sample can be subtracted again exactly.
+    """
+
+    project = models.ForeignKey(Project, on_delete=models.CASCADE, db_index=False)
+    reference = models.ForeignKey(Reference, on_delete=models.CASCADE, db_index=False)
+    position = models.IntegerField()
+    insertion = models.IntegerField()
+    num_samples = models.IntegerField()
+    num_diff = models.IntegerField()
+    num_base_a = models.IntegerField()
+    num_base_c = models.IntegerField()
+    num_base_g = models.IntegerField()
+    num_base_t = models.IntegerField()
+    num_base_ds = models.IntegerField()
+    sum_coverage = models.BigIntegerField()
+    sum_pc_a = models.BigIntegerField()
+    sum_pc_c = models.BigIntegerField()
+    sum_pc_g = models.BigIntegerField()
+    sum_pc_t = models.BigIntegerField()
+    sum_pc_ds = models.BigIntegerField()
+
+    class Meta:
+        # The unique index is the key that summaries are updated on, and serves lookups by reference and position
+        unique_together = [
+            "project",
+            "reference",
             "position",
             "insertion",
         ]
         indexes = [
-            models.Index(fields=["metadata"]),
-            models.Index(fields=["reference"]),
-            models.Index(fields=["position"]),
-            models.Index(fields=["insertion"]),
+            models.Index(
+                fields=["project", "position"], name="summary_project_position_idx"
+            ),
+        ]
+
+
+class Job(models.Model):
+    task_id = models.UUIDField(unique=True)
+    batch_id = models.UUIDField(null=True)
+    project = models.ForeignKey(Project, on_delete=models.CASCADE)
+    sample_id = models.TextField()
+    state = UpperCharField(
+        max_length=10,
+        choices=choices(
+            [
+                "PENDING",
+                "SKIPPED",
+                "GENERATING",
+                "GENERATED",
+                "STORING",
+                "SUCCESS",
+                "FAILURE",
+            ]
+        ),
+        default="PENDING",
+    )
+    error = models.TextField(null=True)
+    submitted = models.DateTimeField(auto_now_add=True)
+    generate_started = models.DateTimeField(null=True)
+    generate_finished = models.DateTimeField(null=True)
+    store_started = models.DateTimeField(null=True)
+    store_finished = models.DateTimeField(null=True)
+    pileup_time = models.FloatField(null=True)
+    stats_time = models.FloatField(null=True)
+    filter_time = models.FloatField(null=True)
+    spool_time = models.FloatField(null=True)
+    write_time = models.FloatField(null=True)
+    num_positions = models.IntegerField(null=True)
+    num_vafs = models.IntegerField(null=True)
+    filtered_insertion = models.IntegerField(null=True)
+    filtered_coverage = models.IntegerField(null=True)
+    filtered_diff = models.IntegerField(null=True)
+    filtered_entropy = models.IntegerField(null=True)
+    filtered_secondary_entropy = models.IntegerField(null=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["batch_id"]),
         ]
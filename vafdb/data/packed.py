@@ -0,0 +1,405 @@
+from django.conf import settings
+from django.core.exceptions import FieldError
+from .models import Metadata, PackedVAF, VAF
+from .serializers import MetadataSerializer
+from .stats import get_batch_stats, round_exact, call_bases
+from utils.classes import KeyValue
+from decimal import Decimal
+import numpy as np
+import operator
+import base64
+import zlib
+import re
+
+# Fields of a VAF, in the order they are serialized
+VAF_FIELDS = [
+    field.name
+    for field in VAF._meta.fields
+    if field.name not in {"id", "created", "project", "metadata"}
+]
+
+# Fields of the metadata, which are the same for every VAF of a sample
+METADATA_FIELDS = [field.attname for field in Metadata._meta.fields]
+
+# Lookups that can be applied directly to numeric arrays
+NUMPY_LOOKUPS = {
+    "exact": operator.eq,
+    "ne": operator.ne,
+    "lt": operator.lt,
+    "lte": operator.le,
+    "gt": operator.gt,
+    "gte": operator.ge,
+}
+
+
+def encode_array(array, dtype):
+    return zlib.compress(np.ascontiguousarray(array, dtype=dtype).tobytes())
+
+
+def decode_array(data, dtype):
+    return np.frombuffer(zlib.decompress(data), dtype=dtype)
+
+
+def pack(reference, vafs):
+    """
+    Pack the `vafs` (a dict of equal-length arrays, keyed by VAF field) on the `reference` into the fields of a PackedVAF.
+    """
+    positions = np.asarray(vafs["position"], dtype=np.int64)
+    counts = np.column_stack([vafs[base] for base in ["a", "c", "g", "t", "ds"]])
+    n = np.asarray(vafs["coverage"]) - counts.sum(axis=1)
+
+    return {
+        "reference": reference,
+        "num_vafs": len(positions),
+        "positions": encode_array(np.diff(positions, prepend=0), np.int32),
+        "insertions": encode_array(vafs["insertion"], np.int32),
+        "counts": encode_array(np.column_stack([counts, n]), np.int32),
+        "ref_bases": encode_array(vafs["ref_base"], "S1"),
+    }
+
+
+def pack_vafs(instance, batches):
+    """
+    Pack the VAFs of the `instance` (a Metadata object) from the `batches`, storing one PackedVAF per reference.
+
+    Each batch is a dict of equal-length arrays, keyed by VAF field.
+    """
+    batches = [batch for batch in batches if len(batch["position"])]
+    if not batches:
+        return
+
+    vafs = {
+        field: np.concatenate([batch[field] for batch in batches])
+        for field in batches[0]
+    }
+
+    # References are packed in the order they first appear
+    references, first = np.unique(vafs["reference"], return_index=True)
+    PackedVAF.objects.bulk_create(
+        [
+            PackedVAF(
+                metadata=instance,
+                **pack(
+                    reference,
+                    {
+                        field: values[vafs["reference"] == reference]
+                        for field, values in vafs.items()
+                    },
+                ),
+            )
+            for reference in references[np.argsort(first)].tolist()
+        ]
+    )
+
+
+def unpack(blocks, decimals=None):
+    """
+    Unpack a list of PackedVAF `blocks` into a dict of arrays, keyed by VAF field.
+
+    Derived fields are calculated exactly as they are by the generate task. Missing bases are represented by empty strings.
+    """
+    if decimals is None:
+        decimals = settings.FLOATFIELD_DECIMAL_PLACES
+
+    references = [np.full(block.num_vafs, block.reference) for block in blocks]
+    positions = [
+        np.cumsum(decode_array(block.positions, np.int32), dtype=np.int64)
+        for block in blocks
+    ]
+    insertions = [decode_array(block.insertions, np.int32) for block in blocks]
+    counts = [decode_array(block.counts, np.int32) for block in blocks]
+    ref_bases = [decode_array(block.ref_bases, "S1") for block in blocks]
+
+    if blocks:
+        references = np.concatenate(references)
+        positions = np.concatenate(positions)
+        insertions = np.concatenate(insertions).astype(np.int64)
+        counts = np.concatenate(counts).astype(np.int64).reshape(-1, 6)
+        ref_bases = np.concatenate(ref_bases)
+    else:
+        references = np.array([], dtype=str)
+        positions = insertions = np.array([], dtype=np.int64)
+        counts = np.zeros((0, 6), dtype=np.int64)
+        ref_bases = np.array([], dtype="S1")
+
+    base, confidence = call_bases(counts)
+    _, stats = get_batch_stats(counts, decimals=decimals)
+
+    vafs = {
+        "reference": references,
+        "position": positions,
+        "insertion": insertions,
+        "ptype": np.where(insertions == 0, "REF", "INS"),
+        "coverage": counts.sum(axis=1),
+        "ref_base": ref_bases.astype("U2"),
+        "base": base.astype("U2"),
+        "confidence": round_exact(confidence, decimals),
+        "diff": (base != b"") & (base != ref_bases),
+    }
+    for i, field in enumerate(["a", "c", "g", "t", "ds"]):
+        vafs[field] = counts[:, i]
+    for i, field in enumerate(["pc_a", "pc_c", "pc_g", "pc_t", "pc_ds"]):
+        vafs[field] = stats[:, i]
+    vafs["entropy"] = stats[:, 6]
+    vafs["secondary_entropy"] = stats[:, 7]
+
+    return vafs
+
+
+class PackedColumns(dict):
+    """
+    The fields of a sample's VAFs as arrays, with the metadata fields as single-item arrays.
+
+    The sample's PackedVAFs are only fetched and unpacked the first time a VAF field is accessed.
+    """
+
+    def __init__(self, metadata):
+        super().__init__()
+        self.metadata = metadata
+
+        for field in METADATA_FIELDS:
+            self["metadata__" + field] = np.array(
+                [getattr(self.metadata, field)], dtype=object
+            )
+
+    def __missing__(self, field):
+        if field not in VAF_FIELDS:
+            raise FieldError(f"Cannot resolve keyword '{field}' into field.")
+
+        self.update(unpack(list(self.metadata.packed_vaf.order_by("id"))))
+        return self[field]
+
+
+def match(x, lookup, value):
+    """
+    Returns `True` if the single value `x` matches the `lookup` against `value`.
+    """
+    if lookup == "isnull":
+        return (x is None) == bool(value)
+
+    if x is None:
+        return False
+
+    if lookup == "exact":
+        return x == value
+    elif lookup == "ne":
+        return x != value
+    elif lookup == "lt":
+        return x < value
+    elif lookup == "lte":
+        return x <= value
+    elif lookup == "gt":
+        return x > value
+    elif lookup == "gte":
+        return x >= value
+    elif lookup == "in":
+        return x in value
+    elif lookup == "range":
+        return value[0] <= x <= value[1]
+    elif lookup == "iexact":
+        return str(x).lower() == str(value).lower()
+    elif lookup == "contains":
+        return str(value) in str(x)
+    elif lookup == "icontains":
+        return str(value).lower() in str(x).lower()
+    elif lookup == "startswith":
+        return str(x).startswith(str(value))
+    elif lookup == "istartswith":
+        return str(x).lower().startswith(str(value).lower())
+    elif lookup == "endswith":
+        return str(x).endswith(str(value))
+    elif lookup == "iendswith":
+        return str(x).lower().endswith(str(value).lower())
+    elif lookup == "regex":
+        return re.search(str(value), str(x)) is not None
+    elif lookup == "iregex":
+        return re.search(str(value), str(x), re.IGNORECASE) is not None
+    else:
+        raise FieldError(f"Unsupported lookup '{lookup}'.")
+
+
+def coerce(values, value):
+    """
+    Convert a query `value` to the type of the numeric array `values`, as the database would.
+    """
+    if isinstance(value, (list, tuple)):
+        return [coerce(values, x) for x in value]
+
+    if isinstance(value, Decimal):
+        return int(value) if values.dtype.kind in "iu" else float(value)
+
+    return value
+
+
+def lookup_mask(values, lookup, value, nullable=False):
+    """
+    Returns a boolean array of the items of `values` that match the `lookup` against `value`.
+
+    Numeric arrays are compared directly. Otherwise, the lookup is matched against each unique value once.
+    For `nullable` string arrays, empty strings are treated as null.
+    """
+    # As in the database, an exact match against None is a null check
+    if lookup == "exact" and value is None:
+        lookup, value = "isnull", True
+
+    transform = None
+    if lookup.split("__")[0] in {"iso_year", "week"}:
+        transform, _, lookup = lookup.partition("__")
+        lookup = lookup or "exact"
+
+    if transform is None and values.dtype.kind in "biuf":
+        value = coerce(values, value)
+
+        if lookup in NUMPY_LOOKUPS:
+            return NUMPY_LOOKUPS[lookup](values, value)
+        elif lookup == "in":
+            return np.isin(values, value)
+        elif lookup == "range":
+            return (values >= value[0]) & (values <= value[1])
+        elif lookup == "isnull":
+            return np.full(len(values), not value)
+
+    uniques, inverse = np.unique(values, return_inverse=True)
+    matches = []
+    for x in uniques.tolist():
+        if nullable and x == "":
+            x = None
+
+        if x is not None and transform == "iso_year":
+            x = x.isocalendar()[0]
+        elif x is not None and transform == "week":
+            x = x.isocalendar()[1]
+
+        matches.append(match(x, lookup, value))
+
+    return np.array(matches, dtype=bool)[inverse.reshape(-1)]
+
+
+def get_mask(data, columns):
+    """
+    Traverses the provided `data` (in the same format as for `get_query`) and forms the corresponding boolean mask over the `columns`.
+
+    Metadata fields give a mask of a single item, which broadcasts over the sample's VAFs.
+    Sample VAFs are only unpacked if a VAF field is needed to decide the result.
+    """
+    key, value = next(iter(data.items()))
+
+    # AND of multiple keyvalues
+    if key == "&":
+        mask = np.array([True])
+        for k_v in value:
+            mask = mask & get_mask(k_v, columns)
+            if not mask.any():
+                break
+        return mask
+
+    # OR of multiple keyvalues
+    elif key == "|":
+        mask = np.array([False])
+        for k_v in value:
+            mask = mask | get_mask(k_v, columns)
+            if mask.all():
+                break
+        return mask
+
+    # XOR of multiple keyvalues
+    elif key == "^":
+        mask = np.array([False])
+        for k_v in value:
+            mask = mask ^ get_mask(k_v, columns)
+        return mask
+
+    # NOT of a single keyvalue
+    elif key == "~":
+        return ~get_mask(value[0], columns)
+
+    # Base case: a keyvalue to filter on
+    else:
+        if isinstance(value, KeyValue):
+            key, value = value.key, value.value
+
+        if key.startswith("metadata__"):
+            field, _, lookup = key.removeprefix("metadata__").partition("__")
+            field = "metadata__" + field
+        else:
+            field, _, lookup = key.partition("__")
+
+        return lookup_mask(
+            columns[field], lookup or "exact", value, nullable=field == "base"
+        )
+
+
+def encode_cursor(metadata_id, index):
+    return base64.urlsafe_b64encode(f"{metadata_id}:{index}".encode()).decode()
+
+
+def decode_cursor(cursor):
+    """
+    Returns the `(metadata_id, index)` of a cursor, or raises a `ValueError` if it is invalid.
+    """
+    try:
+        metadata_id, index = (
+            base64.urlsafe_b64decode(cursor.encode()).decode().split(":")
+        )
+        return int(metadata_id), int(index)
+    except Exception as e:
+        raise ValueError("Invalid cursor") from e
+
+
+def filter_packed(project, query, start=(0, 0), page_size=None):
+    """
+    Filter the packed VAFs of the `project` with the `query` (in the same format as for `get_query`, or `None` for all VAFs).
+
+    Samples are scanned in the order they were created, from the `(metadata_id, index)` given by `start`.
+    Returns a page of (at most) `page_size` VAFs, grouped by sample in the same format as the `VAFSerializer`,
+    and the cursor for the next page (or `None` if there are no more samples).
+    """
+    if page_size is None:
+        page_size = settings.CURSOR_PAGINATION_PAGE_SIZE
+
+    metadata_id, start = start
+
+    results = []
+    remaining = page_size
+    for metadata in (
+        Metadata.objects.filter(project=project, id__gte=metadata_id)
+        .order_by("id")
+        .iterator()
+    ):
+        if metadata.id != metadata_id:
+            start = 0
+
+        columns = PackedColumns(metadata)
+        if query:
+            mask = get_mask(query, columns)
+        else:
+            mask = np.array([True])
+
+        if not mask.any():
+            continue
+
+        indices = np.flatnonzero(np.broadcast_to(mask, columns["position"].shape))
+        page = indices[start : start + remaining]
+
+        if len(page):
+            values = {field: columns[field][page].tolist() for field in VAF_FIELDS}
+            values["base"] = [x or None for x in values["base"]]
+
+            md = dict(MetadataSerializer(metadata).data)
+            md.pop("id")
+            md.pop("project")
+            md["vaf"] = [
+                dict(zip(VAF_FIELDS, row))
+                for row in zip(*(values[field] for field in VAF_FIELDS))
+            ]
+            results.append(md)
+            remaining -= len(page)
+
+        if remaining == 0:
+            end = start + len(page)
+            if end < len(indices):
+                return results, encode_cursor(metadata.id, end)
+            else:
+                return results, encode_cursor(metadata.id + 1, 0)
+
+    return results, None
@@ -0,0 +1,120 @@
+from django.conf import settings
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+import base64
+
+
+class KeysetPagination(BasePagination):
+    """
+    Paginates a queryset by seeking past the `ordering` values of the last row of the previous page,
+    rather than counting through an offset.
+
+    The `ordering` fields must be integers that (within the queryset) uniquely identify each row,
+    and be covered by an index, so that every page costs the same to fetch as the first.
+    Pages can only be followed forwards, so responses have a `next` link but no `previous` link.
+    """
+
+    cursor_query_param = "cursor"
+    page_size_query_param = "page_size"
+    ordering = ("id",)
+    page_size = None
+    invalid_cursor_message = "Invalid cursor"
+
+    def get_page_size(self, request):
+        """
+        The page size requested by the client, capped at the `CURSOR_PAGINATION_MAX_PAGE_SIZE`.
+
+        Defaults to the `CURSOR_PAGINATION_PAGE_SIZE` if the client does not request a (valid) page size.
+        """
+        try:
+            page_size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return settings.CURSOR_PAGINATION_PAGE_SIZE
+
+        if page_size <= 0:
+            return settings.CURSOR_PAGINATION_PAGE_SIZE
+
+        return min(page_size, settings.CURSOR_PAGINATION_MAX_PAGE_SIZE)
+
+    def encode_cursor(self, position):
+        return base64.urlsafe_b64encode(
+            ",".join(str(value) for value in position).encode()
+        ).decode()
+
+    def decode_cursor(self, request):
+        """
+        Returns the position given by the request's cursor, or `None` if it has no cursor.
+        """
+        cursor = request.query_params.get(self.cursor_query_param)
+        if not cursor:
+            return None
+
+        try:
+            position = tuple(
+                int(value)
+                for value in base64.urlsafe_b64decode(cursor.encode())
+                .decode()
+                .split(",")
+            )
+        except Exception:
+            raise NotFound(self.invalid_cursor_message)
+
+        if len(position) != len(self.ordering):
+            raise NotFound(self.invalid_cursor_message)
+
+        return position
+
+    def seek(self, position):
+        """
+        Q object for the rows that come after the `position` in the `ordering`.
+
+        For an ordering of (a, b), this is `a >= x AND (a > x OR b > y)`, so the seek is a range scan on the index.
+        """
+        query = Q(**{f"{self.ordering[-1]}__gt": position[-1]})
+
+        for field, value in zip(self.ordering[-2::-1], position[-2::-1]):
+            query = Q(**{f"{field}__gt": value}) | (Q(**{field: value}) & query)
+
+        if len(self.ordering) > 1:
+            query = Q(**{f"{self.ordering[0]}__gte": position[0]}) & query
+
+        return query
+
+    def paginate_queryset(self, queryset, request, view=None):
+        if self.page_size is None:
+            self.page_size = self.get_page_size(request)
+
+        self.request = request
+        position = self.decode_cursor(request)
+
+        if position is not None:
+            queryset = queryset.filter(self.seek(position))
+
+        # One more row than the page size is fetched, to find out if there is a next page
+        page = list(queryset.order_by(*self.ordering)[: self.page_size + 1])
+        self.has_next = len(page) > self.page_size
+        self.page = page[: self.page_size]
+
+        return self.page
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+
+        last = self.page[-1]
+        return replace_query_param(
+            self.request.build_absolute_uri(),
+            self.cursor_query_param,
+            self.encode_cursor([getattr(last, field) for field in self.ordering]),
+        )
+
+    def get_paginated_response(self, data):
+        return Response(
+            {
+                "next": self.get_next_link(),
+                "results": data,
+            }
+        )
@@ -0,0 +1,151 @@
+from django.db import connection, transaction
+from django.db.models.signals import post_migrate, post_save, pre_delete
+from django.dispatch import receiver
+from .models import Project, VAF
+
+
+def partition_name(project_id):
+    """
+    Name of the partition of the VAF table for the project with id `project_id`.
+    """
+    return f"{VAF._meta.db_table}_{int(project_id)}"
+
+
+def is_partitioned():
+    """
+    Returns `True` if the VAF table is partitioned. Only PostgreSQL tables are partitioned.
+    """
+    if connection.vendor != "postgresql":
+        return False
+
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT EXISTS (SELECT 1 FROM pg_partitioned_table WHERE partrelid = to_regclass(%s))",
+            [VAF._meta.db_table],
+        )
+        return cursor.fetchone()[0]
+
+
+def create_partition(project_id):
+    """
+    Create the partition of the VAF table for the project with id `project_id`, if it does not exist.
+    """
+    qn = connection.ops.quote_name
+
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "CREATE TABLE IF NOT EXISTS {} PARTITION OF {} FOR VALUES IN ({})".format(
+                qn(partition_name(project_id)),
+                qn(VAF._meta.db_table),
+                int(project_id),
+            )
+        )
+
+
+def drop_partition(project_id):
+    """
+    Drop the partition of the VAF table for the project with id `project_id`, and with it all of the project's VAFs.
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "DROP TABLE IF EXISTS {}".format(
+                connection.ops.quote_name(partition_name(project_id))
+            )
+        )
+
+
+def partition_vafs():
+    """
+    Convert the VAF table to a table that is list-partitioned by project, with a partition for each project.
+
+    The table is recreated with the same columns, constraints and indexes (with the project added to the primary key,
+    as the partition key must be part of it), and any existing VAFs are moved into their project's partition.
+    VAFs of a project without a partition are kept in a default partition.
+    """
+    if connection.vendor != "postgresql" or is_partitioned():
+        return
+
+    qn = connection.ops.quote_name
+    table = VAF._meta.db_table
+    old = table + "_unpartitioned"
+    pk = VAF._meta.pk.column
+    key = VAF._meta.get_field("project").column
+
+    with transaction.atomic(), connection.cursor() as cursor:
+        # Definitions of the table's constraints and (other) indexes, which are recreated on the partitioned table
+        cursor.execute(
+            "SELECT conname, contype, pg_get_constraintdef(oid) FROM pg_constraint "
+            "WHERE conrelid = %s::regclass AND contype IN ('p', 'u', 'f', 'c')",
+            [table],
+        )
+        constraints = cursor.fetchall()
+        cursor.execute(
+            "SELECT indexdef FROM pg_indexes WHERE tablename = %s AND indexname NOT IN "
+            "(SELECT conname FROM pg_constraint WHERE conrelid = %s::regclass)",
+            [table, table],
+        )
+        indexes = [indexdef for (indexdef,) in cursor.fetchall()]
+
+        cursor.execute(f"ALTER TABLE {qn(table)} RENAME TO {qn(old)}")
+        cursor.execute(
+            f"CREATE TABLE {qn(table)} (LIKE {qn(old)} INCLUDING DEFAULTS INCLUDING IDENTITY) "
+            f"PARTITION BY LIST ({qn(key)})"
+        )
+        cursor.execute(
+            f"CREATE TABLE {qn(table + '_default')} PARTITION OF {qn(table)} DEFAULT"
+        )
+        for project_id in Project.objects.values_list("id", flat=True):
+            create_partition(project_id)
+
+        cursor.execute(f"INSERT INTO {qn(table)} SELECT * FROM {qn(old)}")
+        cursor.execute(f"DROP TABLE {qn(old)}")
+
+        # Continue the ids of the new table from those of the old one
+        cursor.execute(f"SELECT COALESCE(MAX({qn(pk)}), 0) + 1 FROM {qn(table)}")
+        cursor.execute(
+            f"ALTER TABLE {qn(table)} ALTER COLUMN {qn(pk)} RESTART WITH {int(cursor.fetchone()[0])}"
+        )
+
+        for name, kind, definition in constraints:
+            if kind == "p":
+                definition = f"PRIMARY KEY ({qn(pk)}, {qn(key)})"
+            cursor.execute(
+                f"ALTER TABLE {qn(table)} ADD CONSTRAINT {qn(name)} {definition}"
+            )
+
+        for indexdef in indexes:
+            cursor.execute(indexdef)
+
+
+def has_project_column():
+    """
+    Returns `True` if the VAF table exists and has the project column that it is partitioned by,
+    which is only added by the migrations after the initial one.
+    """
+    table = VAF._meta.db_table
+    if table not in connection.introspection.table_names():
+        return False
+
+    with connection.cursor() as cursor:
+        columns = connection.introspection.get_table_description(cursor, table)
+
+    return VAF._meta.get_field("project").column in {column.name for column in columns}
+
+
+@receiver(post_migrate)
+def migrated(sender, **kwargs):
+    if sender.name == "data" and has_project_column():
+        partition_vafs()
+
+
+@receiver(post_save, sender=Project)
+def project_saved(sender, instance, created, **kwargs):
+    if created and is_partitioned():
+        create_partition(instance.id)
+
+
+@receiver(pre_delete, sender=Project)
+def project_deleted(sender, instance, **kwargs):
+    # Dropping the partition removes the project's VAFs at once, rather than deleting them row by row
+    if is_partitioned():
+        drop_partition(instance.id)
@@ -0,0 +1,60 @@
+from django.core.exceptions import ValidationError
+from .serializers import MetadataSerializer
+from .packed import VAF_FIELDS
+
+
+def get_columns():
+    """
+    Columns of a VAF result: the sample_id, followed by the fields of the VAF and then the rest of its sample's metadata.
+
+    This is the same order as the table output by the client.
+    """
+    metadata_fields = [
+        field.field_name
+        for field in MetadataSerializer()._readable_fields
+        if field.field_name not in {"id", "project", "sample_id"}
+    ]
+    return ["sample_id"] + VAF_FIELDS + metadata_fields
+
+
+def get_projection(fields=None, exclude=None):
+    """
+    Columns of the results requested: the `fields` (or every column, if not given) without those in `exclude`,
+    in the same order as `get_columns`.
+
+    The sample_id is always included, as results are grouped by sample.
+    Raises a `ValidationError` (keyed by the param, `fields` or `exclude`) if any of the fields are unknown.
+    """
+    columns = get_columns()
+
+    errors = {}
+    for param, values in [("fields", fields), ("exclude", exclude)]:
+        unknown = [value for value in values or [] if value not in columns]
+        if unknown:
+            errors[param] = [f"Unknown field(s): {', '.join(dict.fromkeys(unknown))}."]
+
+    if errors:
+        raise ValidationError(errors)
+
+    selected = set(fields or columns) - set(exclude or [])
+    selected.add("sample_id")
+
+    return [column for column in columns if column in selected]
+
+
+def project_results(results, columns):
+    """
+    Restrict `results` grouped by sample (in the same format as the `VAFSerializer`) to the `columns`.
+    """
+    columns = set(columns)
+
+    return [
+        {
+            **{field: value for field, value in md.items() if field in columns},
+            "vaf": [
+                {field: value for field, value in vaf.items() if field in columns}
+                for vaf in md["vaf"]
+            ],
+        }
+        for md in results
+    ]
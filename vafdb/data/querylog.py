@@ -0,0 +1,90 @@
+from django.conf import settings
+from django.urls import resolve
+from django.utils import timezone
+from rest_framework.test import APIRequestFactory
+from urllib.parse import urlencode
+import logging
+import json
+
+logger = logging.getLogger(__name__)
+
+
+def log_request(view, code, request):
+    """
+    Append a filter or query `request` for the project `code` to the `QUERY_LOG_FILE` (if set) as a line of JSON,
+    so that it can be replayed by the `replayqueries` command.
+
+    Failing to write the log does not fail the request.
+    """
+    if not settings.QUERY_LOG_FILE:
+        return
+
+    entry = {
+        "time": timezone.now().isoformat(),
+        "view": view,
+        "code": code,
+        "params": {
+            field: request.query_params.getlist(field) for field in request.query_params
+        },
+    }
+    if view == "query":
+        entry["data"] = request.data
+
+    try:
+        with open(settings.QUERY_LOG_FILE, "a") as log:
+            log.write(json.dumps(entry, default=str) + "\n")
+    except (OSError, TypeError, ValueError) as e:
+        logger.warning(f"Could not write to the query log: {e!r}")
+
+
+def read_log(path):
+    """
+    Returns the requests in the query log at `path`, skipping any lines that are not valid entries.
+    """
+    entries = []
+
+    with open(path) as log:
+        for line in log:
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                continue
+
+            if isinstance(entry, dict) and entry.get("view") in {"filter", "query"}:
+                entries.append(entry)
+
+    return entries
+
+
+def request_factory():
+    """
+    Factory for replayed requests, built for a host the server accepts so that pagination links can be made.
+    """
+    host = next(
+        (host.lstrip(".") for host in settings.ALLOWED_HOSTS if host != "*"),
+        "localhost",
+    )
+    return APIRequestFactory(SERVER_NAME=host)
+
+
+def replay(entry, factory):
+    """
+    Run the logged request `entry` through its view, with a request built by the `factory`.
+
+    Returns the rendered response.
+    """
+    path = f"/data/{entry['view']}/{entry['code']}/"
+    match = resolve(path)
+
+    if entry["view"] == "filter":
+        request = factory.get(path, entry["params"])
+    else:
+        request = factory.post(
+            path + "?" + urlencode(entry["params"], doseq=True),
+            entry.get("data"),
+            format="json",
+        )
+
+    response = match.func(request, **match.kwargs)
+    response.render()
+    return response
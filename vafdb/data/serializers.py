@@ -1,12 +1,77 @@
 from rest_framework import serializers
-from data.models import Metadata, VAF
+from django.conf import settings
+from data.models import Metadata, Reference, VAF, PositionSummary, Job
 from utils.fieldserializers import UpperChoiceField
+from .fingerprint import FIELDS as FINGERPRINT_FIELDS
 
 
 class MetadataSerializer(serializers.ModelSerializer):
     class Meta:
         model = Metadata
-        exclude = ("created",)
+        exclude = ("created", "cold_file")
+
+        # The fingerprint of the sample's BAM is set by the view, and is left out of results
+        extra_kwargs = {field: {"write_only": True} for field in FINGERPRINT_FIELDS}
+
+    def get_fields(self):
+        fields = super().get_fields()
+
+        # Results can be restricted to the `columns` in the context, with the id kept so that VAFs can be grouped by sample
+        columns = self.context.get("columns")
+        if columns is not None:
+            fields = {
+                name: field
+                for name, field in fields.items()
+                if name in columns or name == "id"
+            }
+
+        return fields
+
+
+class MetadataBatchSerializer(MetadataSerializer):
+    """
+    Validates metadata in a batch, without the project.
+
+    The project is shared by the batch, and the uniqueness of each (project, sample_id) is
+    checked for the whole batch at once by the view.
+    """
+
+    class Meta:
+        model = Metadata
+        exclude = ("created", "project", "cold_file")
+        extra_kwargs = MetadataSerializer.Meta.extra_kwargs
+        validators = []
+
+
+# Fields that each derived field is calculated from (along with the sequence of the VAF's reference)
+DERIVED_FROM = {
+    "ref_base": ["position"],
+    **{f"pc_{base}": [base, "coverage"] for base in ["a", "c", "g", "t", "ds"]},
+}
+
+
+def derive(vaf, sequence):
+    """
+    Fill in any derived fields of the `vaf` (a dict keyed by VAF field) that are `None`, from the rest of
+    the VAF and the `sequence` of its reference. The values are the same as those calculated by the generate task.
+
+    Derived fields that are not in the `vaf` are left out.
+    """
+    if "ref_base" in vaf and vaf["ref_base"] is None:
+        vaf["ref_base"] = sequence[vaf["position"] - 1]
+
+    for base in ["a", "c", "g", "t", "ds"]:
+        if "pc_" + base in vaf and vaf["pc_" + base] is None:
+            vaf["pc_" + base] = (
+                round(
+                    100 * (vaf[base] / vaf["coverage"]),
+                    settings.FLOATFIELD_DECIMAL_PLACES,
+                )
+                if vaf["coverage"] > 0
+                else 0.0
+            )
+
+    return vaf
 
 
 class VAFListSerializer(serializers.ListSerializer):
@@ -19,7 +84,7 @@ class VAFListSerializer(serializers.ListSerializer):
             id = record["metadata"]["id"]
             md = record.pop("metadata")
             md.pop("id")
-            md.pop("project")
+            md.pop("project", None)
 
             if not id in transformed_data:
                 transformed_data[id] = md
@@ -32,6 +97,7 @@ class VAFListSerializer(serializers.ListSerializer):
 
 class VAFSerializer(serializers.ModelSerializer):
     metadata = MetadataSerializer()
+    reference = serializers.SlugRelatedField(slug_field="name", read_only=True)
     ref_base = UpperChoiceField(
         choices=VAF._meta.get_field("ref_base").choices,
     )
@@ -41,5 +107,229 @@ class VAFSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = VAF
-        exclude = ("id", "created")
+        exclude = ("id", "created", "project")
         list_serializer_class = VAFListSerializer
+
+    def get_sequence(self, reference_id):
+        """
+        Get the sequence of the reference with id `reference_id`, fetching it once per serialization.
+        """
+        sequences = self.context.setdefault("sequences", {})
+
+        if reference_id not in sequences:
+            sequences[reference_id] = Reference.objects.values_list(
+                "sequence", flat=True
+            ).get(id=reference_id)
+
+        return sequences[reference_id]
+
+    def get_fields(self):
+        fields = super().get_fields()
+
+        # Results can be restricted to the `columns` in the context, along with the metadata of the VAFs
+        columns = self.context.get("columns")
+        if columns is not None:
+            fields = {
+                name: field
+                for name, field in fields.items()
+                if name in columns or name == "metadata"
+            }
+
+        return fields
+
+    def to_representation(self, instance):
+        data = super().to_representation(instance)
+
+        # Derived fields that the project does not store are calculated from the rest of the VAF
+        derived = [
+            field
+            for field in VAF.DERIVED_FIELDS
+            if field in data and data[field] is None
+        ]
+        if derived:
+            # The fields they are calculated from may not have been requested, so are taken from the instance
+            vaf = {field: None for field in derived}
+            for field in derived:
+                vaf.update({x: getattr(instance, x) for x in DERIVED_FROM[field]})
+            derive(vaf, self.get_sequence(instance.reference_id))
+            data.update({field: vaf[field] for field in derived})
+
+        return data
+
+
+class VAFValuesSerializer:
+    """
+    Serializes VAFs read from a queryset as flat tuples of values (on the paths given by `get_paths`),
+    into the same results as the `VAFSerializer`.
+
+    Rather than serializing the metadata of every VAF, the metadata of each sample is fetched and serialized once,
+    and the VAFs are grouped under it in a single pass.
+    """
+
+    get_sequence = VAFSerializer.get_sequence
+
+    def __init__(self, rows, context=None):
+        self.rows = rows
+        self.context = context if context is not None else {}
+
+    @staticmethod
+    def get_fields(columns=None):
+        """
+        Fields of each VAF, in the same order as the `VAFSerializer`, restricted to the `columns` (if given).
+        """
+        return [
+            field
+            for field in VAFSerializer(context={"columns": columns}).fields
+            if field != "metadata"
+        ]
+
+    @staticmethod
+    def get_inputs(fields):
+        """
+        Fields that are not in `fields`, but are needed to derive them.
+        """
+        inputs = [x for field in fields for x in DERIVED_FROM.get(field, [])]
+        return [x for x in dict.fromkeys(inputs) if x not in fields]
+
+    @classmethod
+    def get_paths(cls, columns=None):
+        """
+        Paths of the values read for each VAF: its id, metadata id and reference id, followed by its fields and their inputs.
+        """
+        fields = cls.get_fields(columns)
+
+        return ["id", "metadata_id", "reference_id"] + [
+            "reference__name" if field == "reference" else field
+            for field in fields + cls.get_inputs(fields)
+        ]
+
+    @property
+    def data(self):
+        columns = self.context.get("columns")
+        fields = self.get_fields(columns)
+        inputs = self.get_inputs(fields)
+        keys = fields + inputs
+        derived = [field for field in VAF.DERIVED_FIELDS if field in fields]
+
+        samples = {}
+        for row in self.rows:
+            vaf = dict(zip(keys, row[3:]))
+
+            # Derived fields that the project does not store are calculated from the rest of the VAF
+            for field in derived:
+                if vaf[field] is None:
+                    derive(vaf, self.get_sequence(row[2]))
+                    break
+
+            for x in inputs:
+                del vaf[x]
+
+            vafs = samples.get(row[1])
+            if vafs is None:
+                vafs = samples[row[1]] = []
+            vafs.append(vaf)
+
+        # The metadata of each sample is serialized once, with its VAFs in the order they were read
+        metadata = {}
+        if samples:
+            md_fields = [
+                field.field_name
+                for field in MetadataSerializer(context=self.context)._readable_fields
+            ]
+            for md in MetadataSerializer(
+                Metadata.objects.filter(id__in=samples).only(*md_fields),
+                many=True,
+                context=self.context,
+            ).data:
+                md = dict(md)
+                metadata[md.pop("id")] = md
+                md.pop("project", None)
+
+        return [{**metadata[id], "vaf": vafs} for id, vafs in samples.items()]
+
+
+class PositionSummarySerializer(serializers.ModelSerializer):
+    """
+    Serializes the totals of a PositionSummary, with the means of the coverage and percentages across its samples.
+    """
+
+    reference = serializers.SlugRelatedField(slug_field="name", read_only=True)
+
+    class Meta:
+        model = PositionSummary
+        fields = (
+            "reference",
+            "position",
+            "insertion",
+            "num_samples",
+            "num_diff",
+            "num_base_a",
+            "num_base_c",
+            "num_base_g",
+            "num_base_t",
+            "num_base_ds",
+        )
+
+    def to_representation(self, instance):
+        data = super().to_representation(instance)
+        decimals = settings.FLOATFIELD_DECIMAL_PLACES
+
+        data["mean_coverage"] = round(
+            instance.sum_coverage / instance.num_samples, decimals
+        )
+        for base in ["a", "c", "g", "t", "ds"]:
+            # Percentages are summed in units of the smallest stored decimal place
+            data["mean_pc_" + base] = round(
+                getattr(instance, "sum_pc_" + base)
+                / 10**decimals
+                / instance.num_samples,
+                decimals,
+            )
+
+        return data
+
+
+class JobSerializer(serializers.ModelSerializer):
+    project = serializers.SlugRelatedField(slug_field="code", read_only=True)
+    generate_wait = serializers.SerializerMethodField()
+    store_wait = serializers.SerializerMethodField()
+
+    class Meta:
+        model = Job
+        exclude = ("id",)
+
+        # Fields that count the positions removed by each of the project's filters
+        filters = [
+            "filtered_insertion",
+            "filtered_coverage",
+            "filtered_diff",
+            "filtered_entropy",
+            "filtered_secondary_entropy",
+        ]
+
+        # Fields that are totalled across a batch
+        totals = [
+            "generate_wait",
+            "store_wait",
+            "pileup_time",
+            "stats_time",
+            "filter_time",
+            "spool_time",
+            "write_time",
+            "num_positions",
+            "num_vafs",
+        ] + filters
+
+    def get_generate_wait(self, obj):
+        """
+        Seconds the task spent queued before generating began.
+        """
+        if obj.generate_started:
+            return (obj.generate_started - obj.submitted).total_seconds()
+
+    def get_store_wait(self, obj):
+        """
+        Seconds the task spent queued between generating and storing.
+        """
+        if obj.store_started and obj.generate_finished:
+            return (obj.store_started - obj.generate_finished).total_seconds()
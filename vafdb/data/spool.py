@@ -0,0 +1,189 @@
+from django.conf import settings
+import numpy as np
+import hashlib
+import shutil
+import uuid
+import time
+import io
+import os
+
+# Column dtypes of the VAFs written to a spool
+# The reference and ptype columns are not stored directly:
+# references are stored once with an index per VAF, and ptype is derived from the insertion
+COLUMNS = {
+    "position": np.int32,
+    "insertion": np.int32,
+    "coverage": np.int32,
+    "ref_base": "U2",
+    "base": "U2",
+    "confidence": np.float64,
+    "diff": np.bool_,
+    "a": np.int32,
+    "c": np.int32,
+    "g": np.int32,
+    "t": np.int32,
+    "ds": np.int32,
+    "pc_a": np.float64,
+    "pc_c": np.float64,
+    "pc_g": np.float64,
+    "pc_t": np.float64,
+    "pc_ds": np.float64,
+    "entropy": np.float64,
+    "secondary_entropy": np.float64,
+}
+
+
+def encode_chunk(vafs):
+    """
+    Encode the `vafs` (a dict of equal-length arrays, keyed by VAF field) as the bytes of a compressed npz file.
+    """
+    references, reference_index = np.unique(
+        np.asarray(vafs["reference"], dtype=str), return_inverse=True
+    )
+    arrays = {
+        "references": references,
+        "reference_index": reference_index.astype(np.int32),
+    }
+    for column, dtype in COLUMNS.items():
+        arrays[column] = np.asarray(vafs[column], dtype=dtype)
+
+    buffer = io.BytesIO()
+    np.savez_compressed(buffer, **arrays)
+    return buffer.getvalue()
+
+
+def decode_columns(data):
+    """
+    Decode the bytes of a compressed npz file into a dict of arrays, keyed by VAF field.
+
+    Missing bases are represented by empty strings.
+    """
+    with np.load(io.BytesIO(data)) as chunk:
+        vafs = {
+            "reference": chunk["references"][chunk["reference_index"]],
+            "ptype": np.where(chunk["insertion"] == 0, "REF", "INS"),
+        }
+        for column in COLUMNS:
+            vafs[column] = chunk[column]
+
+    return vafs
+
+
+def decode_chunk(data):
+    """
+    Decode the bytes of a compressed npz file into a list of dicts, keyed by VAF field.
+    """
+    vafs = decode_columns(data)
+
+    # Empty strings represent missing bases
+    vafs["base"] = np.where(vafs["base"] == "", None, vafs["base"])
+
+    fields = list(vafs)
+    columns = [vafs[field].tolist() for field in fields]
+    return [dict(zip(fields, row)) for row in zip(*columns)]
+
+
+class SpoolWriter:
+    """
+    Writes VAFs to a spool directory, one compressed chunk file at a time.
+
+    The SHA-256 checksum of the spool is accumulated over the chunks, in the order they are written.
+    """
+
+    def __init__(self):
+        self.path = os.path.join(settings.SPOOL_DIR, uuid.uuid4().hex)
+        os.makedirs(self.path)
+        self.sha256 = hashlib.sha256()
+        self.chunks = 0
+
+    def write(self, vafs):
+        """
+        Write the `vafs` (a dict of equal-length arrays, keyed by VAF field) to the spool as a new chunk.
+
+        Missing bases are represented by empty strings.
+        """
+        if not len(vafs["position"]):
+            return
+
+        data = encode_chunk(vafs)
+        self.sha256.update(data)
+
+        with open(os.path.join(self.path, f"{self.chunks}.npz"), "wb") as f:
+            f.write(data)
+        self.chunks += 1
+
+    def close(self):
+        """
+        Returns a handle for the spool, containing its path, number of chunks and checksum.
+        """
+        return {
+            "path": self.path,
+            "chunks": self.chunks,
+            "checksum": self.sha256.hexdigest(),
+        }
+
+    def remove(self):
+        """
+        Delete the spool, including any chunks written so far.
+        """
+        shutil.rmtree(self.path, ignore_errors=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        # A spool that was not finished would never be stored, so it is removed
+        if exc_type is not None:
+            self.remove()
+
+
+def iterate_spool(handle, columns=False):
+    """
+    Yield the chunks of the spool for the provided `handle`, each as a list of dicts keyed by VAF field.
+
+    If `columns` is set, each chunk is instead yielded as a dict of arrays keyed by VAF field.
+
+    Raises a `ValueError` after the final chunk if the spool does not match its checksum.
+    """
+    sha256 = hashlib.sha256()
+
+    for i in range(handle["chunks"]):
+        with open(os.path.join(handle["path"], f"{i}.npz"), "rb") as f:
+            data = f.read()
+
+        sha256.update(data)
+        yield decode_columns(data) if columns else decode_chunk(data)
+
+    if sha256.hexdigest() != handle["checksum"]:
+        raise ValueError(f"Spool '{handle['path']}' does not match its checksum")
+
+
+def remove_spool(handle):
+    """
+    Delete the spool for the provided `handle`.
+    """
+    shutil.rmtree(handle["path"], ignore_errors=True)
+
+
+def prune_spools(max_age):
+    """
+    Delete the spools that have not been written to in the last `max_age` hours.
+
+    These were left behind by samples that were never stored (e.g. because the store task failed).
+    Returns the paths of the deleted spools.
+    """
+    cutoff = time.time() - max_age * 60 * 60
+
+    try:
+        names = sorted(os.listdir(settings.SPOOL_DIR))
+    except FileNotFoundError:
+        return []
+
+    removed = []
+    for name in names:
+        path = os.path.join(settings.SPOOL_DIR, name)
+        if os.path.isdir(path) and os.path.getmtime(path) < cutoff:
+            shutil.rmtree(path, ignore_errors=True)
+            removed.append(path)
+
+    return removed
@@ -0,0 +1,63 @@
+from django.conf import settings
+from django.db import connection
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+import contextlib
+import threading
+import fcntl
+
+
+# Depth of the write lane held by each thread, so that it can be re-entered
+lane = threading.local()
+
+
+@receiver(connection_created)
+def apply_pragmas(sender, connection, **kwargs):
+    """
+    Apply the `SQLITE_PRAGMAS` profile to each SQLite connection when it is opened.
+    """
+    if connection.vendor != "sqlite" or not settings.SQLITE_PRAGMAS:
+        return
+
+    with connection.cursor() as cursor:
+        for pragma, value in settings.SQLITE_PRAGMAS.items():
+            cursor.execute(f"PRAGMA {pragma} = {value}")
+
+
+def lock_path():
+    """
+    Path of the file locked by the write lane, or `None` if the database does not need one.
+    """
+    if connection.vendor != "sqlite" or connection.is_in_memory_db():
+        return None
+
+    return settings.SQLITE_WRITE_LOCK or f"{connection.settings_dict['NAME']}.lock"
+
+
+@contextlib.contextmanager
+def write_lane():
+    """
+    Serialize writes to a SQLite database across every process that uses it (web workers and Celery workers alike).
+
+    SQLite has a single writer lock, and a writer that waits on it longer than the busy timeout fails.
+    Writers instead queue on an exclusive lock of a file next to the database, so only one of them writes at a time,
+    while reads carry on against the database (in WAL mode, readers do not wait on the writer).
+    The lane can be re-entered by the thread that holds it. On other databases this does nothing.
+    """
+    path = lock_path()
+    if path is None or getattr(lane, "depth", 0):
+        lane.depth = getattr(lane, "depth", 0) + 1
+        try:
+            yield
+        finally:
+            lane.depth -= 1
+        return
+
+    with open(path, "a") as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        lane.depth = 1
+        try:
+            yield
+        finally:
+            lane.depth = 0
+            fcntl.flock(lock, fcntl.LOCK_UN)
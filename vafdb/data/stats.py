@@ -0,0 +1,185 @@
+import numpy as np
+import math
+
+# Bases that can be called at a position, in the order of their columns in the pileup
+BASES = np.array([b"A", b"C", b"G", b"T", b"DS"])
+
+
+def entropy(probabilities, normalised=False):
+    ent = sum([-(x * math.log2(x)) if x != 0 else 0 for x in probabilities])
+
+    if normalised:
+        return ent / math.log2(len(probabilities))
+    else:
+        return ent
+
+
+def get_stats(counts, decimals=3):
+    coverage = sum(counts)
+    probabilities = [count / coverage if coverage > 0 else 0.0 for count in counts]
+    percentages = [100 * probability for probability in probabilities]
+    ent = entropy(probabilities, normalised=True)
+    secondary_count = list(counts)
+    secondary_count.pop(counts.index(max(counts)))
+    secondary_coverage = sum(secondary_count)
+    secondary_probabilities = [
+        count / secondary_coverage if secondary_coverage > 0 else 0.0
+        for count in secondary_count
+    ]
+    secondary_ent = entropy(secondary_probabilities, normalised=True)
+    return (
+        [coverage]
+        + counts
+        + [round(x, decimals) for x in percentages + [ent, secondary_ent]]
+    )
+
+
+def batch_entropy(probabilities):
+    """
+    Normalised entropy of each row of a 2D array of `probabilities`.
+
+    Terms are summed column by column, in the same order as `entropy`, so that the results match it.
+    """
+    with np.errstate(divide="ignore", invalid="ignore"):
+        terms = np.where(
+            probabilities != 0, -(probabilities * np.log2(probabilities)), 0.0
+        )
+
+    ent = np.zeros(len(probabilities))
+    for column in terms.T:
+        ent += column
+
+    return ent / math.log2(probabilities.shape[1])
+
+
+def round_exact(values, decimals=3):
+    """
+    Round an array of `values` to `decimals`, with the same results as Python's `round`.
+
+    Values within a whisker of a rounding boundary are rounded individually with `round`.
+    """
+    values = np.asarray(values, dtype=np.float64)
+    rounded = np.round(values, decimals)
+
+    scaled = np.abs(values) * 10**decimals
+    for i in np.flatnonzero(np.abs(scaled - np.floor(scaled) - 0.5) < 1e-6):
+        rounded.flat[i] = round(float(values.flat[i]), decimals)
+
+    return rounded
+
+
+def get_batch_stats(counts, decimals=3):
+    """
+    Vectorised `get_stats`, for a 2D array of `counts` with one row per position.
+
+    Returns the `coverage` and `counts` as an integer array, and the percentages, entropy and
+    secondary entropy (rounded to `decimals`) as a float array.
+
+    Python's `round` works on the exact binary value of a float, whereas `np.round` works on the scaled value.
+    These only disagree when a value sits right on a rounding boundary, so any rows with a value on or next
+    to a boundary are recalculated with `get_stats`. This guarantees the output is identical to `get_stats`.
+    """
+    counts = np.asarray(counts, dtype=np.int64).reshape(-1, 6)
+    coverage = counts.sum(axis=1)
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        probabilities = np.where(coverage[:, None] > 0, counts / coverage[:, None], 0.0)
+    percentages = 100 * probabilities
+    ent = batch_entropy(probabilities)
+
+    # Remove the first occurrence of the maximum count in each row
+    secondary_counts = counts[
+        np.arange(counts.shape[1]) != counts.argmax(axis=1)[:, None]
+    ].reshape(-1, counts.shape[1] - 1)
+    secondary_coverage = secondary_counts.sum(axis=1)
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        secondary_probabilities = np.where(
+            secondary_coverage[:, None] > 0,
+            secondary_counts / secondary_coverage[:, None],
+            0.0,
+        )
+    secondary_ent = batch_entropy(secondary_probabilities)
+
+    floats = np.column_stack([percentages, ent, secondary_ent])
+    rounded = np.round(floats, decimals)
+
+    # Find values within a whisker of a rounding boundary, and recalculate their rows
+    scaled = np.abs(floats) * 10**decimals
+    boundary = np.abs(scaled - np.floor(scaled) - 0.5) < 1e-6
+    for i in np.flatnonzero(boundary.any(axis=1)):
+        rounded[i] = get_stats(counts[i].tolist(), decimals=decimals)[7:]
+
+    return np.column_stack([coverage, counts]), rounded
+
+
+class PileupSummary:
+    """
+    Running totals over the reference positions (not insertions) of a pileup, added to one chunk at a time,
+    from which the summary statistics of a sample are calculated.
+    """
+
+    def __init__(self):
+        self.references = []
+        self.num_positions = 0
+        self.total_coverage = 0
+        self.total_entropy = 0.0
+
+    def add(self, chrom, keys, counts):
+        """
+        Add a chunk of the pileup on `chrom`, with its 2D arrays of `(position, insertion)` keys and counts.
+        """
+        if chrom not in self.references:
+            self.references.append(chrom)
+
+        counts = counts[keys[:, 1] == 0]
+        coverage = counts.sum(axis=1)
+
+        with np.errstate(divide="ignore", invalid="ignore"):
+            probabilities = np.where(
+                coverage[:, None] > 0, counts / coverage[:, None], 0.0
+            )
+
+        self.num_positions += len(counts)
+        self.total_coverage += int(coverage.sum())
+        self.total_entropy += float(batch_entropy(probabilities).sum())
+
+    def mean_coverage(self, decimals=3):
+        if self.num_positions:
+            return round(self.total_coverage / self.num_positions, decimals)
+
+    def mean_entropy(self, decimals=3):
+        if self.num_positions:
+            return round(self.total_entropy / self.num_positions, decimals)
+
+
+def call_bases(counts):
+    """
+    Dominant base of each row of a 2D array of `counts`, and its confidence.
+
+    Rows with no A, C, G, T or DS counts have no base (an empty string), and a confidence of zero.
+    """
+    base_counts = counts[:, :5]
+    base_total = base_counts.sum(axis=1)
+    has_base = base_total > 0
+    base = np.where(has_base, BASES[base_counts.argmax(axis=1)], b"")
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        confidence = np.where(has_base, 100 * base_counts.max(axis=1) / base_total, 0.0)
+
+    return base, confidence
+
+
+def iterate_batch_stats(chrom, keys, counts, decimals=3):
+    """
+    Yield rows in the same format as `get_stats`, prefixed with the chromosome and position keys.
+
+    `keys` is a sequence of `(position, insert_position)` tuples, and `counts` the corresponding base counts.
+    """
+    if not len(keys):
+        return
+
+    integers, floats = get_batch_stats(counts, decimals=decimals)
+
+    for (pos, ins_pos), ints, fls in zip(keys, integers.tolist(), floats.tolist()):
+        yield [chrom, pos, ins_pos] + ints + fls
@@ -0,0 +1,161 @@
+from django.conf import settings
+from django.db import connection
+from .models import Reference, VAF, PositionSummary
+from .packed import unpack
+from . import cold
+from .stats import get_batch_stats
+import numpy as np
+
+# Bases that are tallied by the summaries
+BASES = ["a", "c", "g", "t", "ds"]
+
+# Fields of a summary that identify its position
+KEY_FIELDS = ["project", "reference", "position", "insertion"]
+
+# Fields of a summary that are totalled across samples
+TOTAL_FIELDS = [
+    "num_samples",
+    "num_diff",
+    *[f"num_base_{base}" for base in BASES],
+    "sum_coverage",
+    *[f"sum_pc_{base}" for base in BASES],
+]
+
+# Number of summaries updated by each statement
+BATCH_SIZE = 500
+
+
+def scale():
+    """
+    Number of units that a percentage is summed in, per percent.
+    """
+    return 10**settings.FLOATFIELD_DECIMAL_PLACES
+
+
+def contributions(vafs, references, sign=1):
+    """
+    Rows of the keys and totals that the `vafs` of one sample (a dict of equal-length arrays, keyed by VAF field)
+    add to the summaries, with each total multiplied by `sign`. Missing bases are represented by empty strings.
+
+    `references` maps the name of each of the project's references to its id.
+    """
+    columns = [
+        [references[name] for name in vafs["reference"].tolist()],
+        np.asarray(vafs["position"], dtype=np.int64).tolist(),
+        np.asarray(vafs["insertion"], dtype=np.int64).tolist(),
+        [sign] * len(vafs["position"]),
+        (sign * np.asarray(vafs["diff"], dtype=np.int64)).tolist(),
+    ]
+    for base in BASES:
+        columns.append(
+            (sign * (vafs["base"] == base.upper()).astype(np.int64)).tolist()
+        )
+    columns.append((sign * np.asarray(vafs["coverage"], dtype=np.int64)).tolist())
+    for base in BASES:
+        # Percentages are already rounded to the stored decimal places, so they scale to whole numbers
+        units = np.rint(np.asarray(vafs[f"pc_{base}"], dtype=np.float64) * scale())
+        columns.append((sign * units.astype(np.int64)).tolist())
+
+    return list(zip(*columns))
+
+
+def update_summaries(project, batches, sign=1):
+    """
+    Add the `batches` of VAFs of one sample of the `project` to its summaries, or subtract them if `sign` is -1.
+
+    Each batch is a dict of equal-length arrays, keyed by VAF field. Summaries that are left without any samples are removed.
+    """
+    qn = connection.ops.quote_name
+    table = qn(PositionSummary._meta.db_table)
+    keys = [qn(PositionSummary._meta.get_field(f).column) for f in KEY_FIELDS]
+    totals = [qn(PositionSummary._meta.get_field(f).column) for f in TOTAL_FIELDS]
+    row = "({})".format(", ".join(["%s"] * (len(keys) + len(totals))))
+
+    # Both PostgreSQL and SQLite add to an existing summary in place with an upsert
+    sql = "INSERT INTO {} ({}) VALUES {{}} ON CONFLICT ({}) DO UPDATE SET {}".format(
+        table,
+        ", ".join(keys + totals),
+        ", ".join(keys),
+        ", ".join(
+            f"{column} = {table}.{column} + EXCLUDED.{column}" for column in totals
+        ),
+    )
+    references = dict(
+        Reference.objects.filter(project=project).values_list("name", "id")
+    )
+
+    with connection.cursor() as cursor:
+        for batch in batches:
+            rows = contributions(batch, references, sign=sign)
+
+            for i in range(0, len(rows), BATCH_SIZE):
+                chunk = rows[i : i + BATCH_SIZE]
+                cursor.execute(
+                    sql.format(", ".join([row] * len(chunk))),
+                    [value for r in chunk for value in (project.id,) + r],
+                )
+
+    if sign < 0:
+        PositionSummary.objects.filter(project=project, num_samples__lte=0).delete()
+
+
+def sample_vafs(metadata):
+    """
+    The stored VAFs of the sample with the `metadata`, as a dict of equal-length arrays keyed by VAF field.
+
+    Percentages are recalculated from the counts, exactly as they were by the generate task.
+    """
+    if metadata.project.packed:
+        return unpack(list(metadata.packed_vaf.order_by("id")))
+
+    # The VAFs of a cold sample are read from its cold file, which holds their derived fields
+    if metadata.cold_file:
+        table = cold.read_sample(
+            metadata,
+            columns=["reference", "position", "insertion", "coverage", "base", "diff"]
+            + [f"pc_{base}" for base in BASES],
+        )
+        vafs = {
+            column: table.column(column).to_numpy() for column in table.column_names
+        }
+        vafs["base"] = np.array([base or "" for base in vafs["base"]], dtype=str)
+        return vafs
+
+    fields = ["reference__name", "position", "insertion", "coverage", "base", "diff"]
+    rows = list(
+        VAF.objects.filter(project=metadata.project, metadata=metadata).values_list(
+            *fields, *BASES
+        )
+    )
+    if not rows:
+        return None
+
+    columns = list(zip(*rows))
+    vafs = {
+        "reference": np.array(columns[0], dtype=str),
+        "position": np.array(columns[1], dtype=np.int64),
+        "insertion": np.array(columns[2], dtype=np.int64),
+        "coverage": np.array(columns[3], dtype=np.int64),
+        "base": np.array([base or "" for base in columns[4]], dtype=str),
+        "diff": np.array(columns[5], dtype=bool),
+    }
+    counts = np.array(columns[len(fields) :], dtype=np.int64).T
+
+    # Reads without a called base make up the rest of the coverage
+    n = vafs["coverage"] - counts.sum(axis=1)
+    _, stats = get_batch_stats(
+        np.column_stack([counts, n]), decimals=settings.FLOATFIELD_DECIMAL_PLACES
+    )
+    for i, base in enumerate(BASES):
+        vafs[f"pc_{base}"] = stats[:, i]
+
+    return vafs
+
+
+def remove_sample(metadata):
+    """
+    Subtract the VAFs of the sample with the `metadata` from its project's summaries, before the sample is deleted.
+    """
+    vafs = sample_vafs(metadata)
+    if vafs is not None:
+        update_summaries(metadata.project, [vafs], sign=-1)
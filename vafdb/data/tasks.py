@@ -1,221 +1,495 @@
-from celery import shared_task
+from celery import shared_task, Task
 from django.conf import settings
-from django.db import transaction
-from .models import Project, Reference, VAF
+from django.db import connection, transaction
+from django.utils import timezone
+from .models import Metadata, Reference, VAF, Job
+from .cache import get_project, get_sequence
 from .serializers import MetadataSerializer
+from .stats import get_batch_stats, round_exact, call_bases, PileupSummary
+from .spool import SpoolWriter, iterate_spool, remove_spool
+from .fingerprint import matches, FIELDS as FINGERPRINT_FIELDS
+from .packed import pack_vafs
+from .bamindex import mapped_reads
+from .summaries import update_summaries
+from .deletion import delete_sample
+from .sqlite import write_lane
 import maptide
-import time
+import numpy as np
+import itertools
 import math
+import time
+import io
+from datetime import datetime
+
+
+def parse_regions(region):
+    """
+    Parse a comma-separated list of regions, each in 'CHROM:START-END' format.
+
+    Returns a dict mapping each chromosome to a sorted list of its `(start, end)` spans, with overlapping spans merged.
+    A `start` or `end` of `None` is unbounded.
+    """
+    spans = {}
+    for r in region.split(","):
+        chrom, start, end = maptide.parse_region(r.strip())
+        spans.setdefault(chrom, []).append((start or 0, end or math.inf))
+
+    for chrom, chrom_spans in spans.items():
+        merged = []
+        for start, end in sorted(chrom_spans):
+            if merged and start <= merged[-1][1] + 1:
+                merged[-1][1] = max(merged[-1][1], end)
+            else:
+                merged.append([start, end])
 
+        spans[chrom] = [
+            (start or None, None if end == math.inf else end) for start, end in merged
+        ]
 
-def entropy(probabilities, normalised=False):
-    ent = sum([-(x * math.log2(x)) if x != 0 else 0 for x in probabilities])
+    return spans
 
-    if normalised:
-        return ent / math.log2(len(probabilities))
+
+def query_region(region):
+    """
+    The region to run the pileup over, for a comma-separated list of regions.
+
+    A single region is passed through, regions on one chromosome are covered by that chromosome,
+    and regions across chromosomes require the whole pileup.
+    """
+    if not region or "," not in region:
+        return region
+
+    chroms = list(parse_regions(region))
+    if len(chroms) == 1:
+        return chroms[0]
     else:
-        return ent
-
-
-def get_stats(counts, decimals=3):
-    coverage = sum(counts)
-    probabilities = [count / coverage if coverage > 0 else 0.0 for count in counts]
-    percentages = [100 * probability for probability in probabilities]
-    ent = entropy(probabilities, normalised=True)
-    secondary_count = list(counts)
-    secondary_count.pop(counts.index(max(counts)))
-    secondary_coverage = sum(secondary_count)
-    secondary_probabilities = [
-        count / secondary_coverage if secondary_coverage > 0 else 0.0
-        for count in secondary_count
-    ]
-    secondary_ent = entropy(secondary_probabilities, normalised=True)
-    return (
-        [coverage]
-        + counts
-        + [round(x, decimals) for x in percentages + [ent, secondary_ent]]
-    )
+        return None
 
 
-def iterate(data, region=None, stats=False, decimals=3):
+def iterate_chunks(data, region=None, chunk_size=None):
+    """
+    Yield the pileup `data` in chunks of (at most) `chunk_size` positions, sorted by position and insertion.
+
+    Each chunk is a tuple of the chromosome, a 2D array of `(position, insertion)` keys,
+    and a 2D array of the corresponding counts.
+    """
     if region:
-        chrom, start, end = maptide.parse_region(region)
-        for (pos, ins_pos), row in sorted(data[chrom].items()):
-            if (not start or pos >= start) and (not end or pos <= end):
-                if stats:
-                    yield [chrom, pos, ins_pos] + get_stats(row, decimals=decimals)
-                else:
-                    yield [chrom, pos, ins_pos, sum(row)] + row
+        spans = parse_regions(region)
+    else:
+        spans = {chrom: [(None, None)] for chrom in data}
+
+    for chrom, chrom_spans in spans.items():
+        chrom_data = data.get(chrom, {})
+        if not chrom_data:
+            continue
+
+        # The `(position, insertion)` keys are read straight into an array, without a tuple per key
+        keys = np.fromiter(
+            itertools.chain.from_iterable(chrom_data),
+            dtype=np.int64,
+            count=2 * len(chrom_data),
+        ).reshape(-1, 2)
+        values = list(chrom_data.values())
+
+        for start, end in chrom_spans:
+            # Select the positions within the region before sorting them,
+            # so that a small region does not pay for sorting the whole chromosome
+            in_region = np.ones(len(keys), dtype=bool)
+            if start:
+                in_region &= keys[:, 0] >= start
+            if end:
+                in_region &= keys[:, 0] <= end
+            if in_region.all():
+                region_keys, region_values = keys, values
+            else:
+                selected = np.flatnonzero(in_region)
+                region_keys = keys[selected]
+                region_values = [values[i] for i in selected.tolist()]
+
+            # Counts are converted to an array in the order they were read, and then sorted along with their keys
+            order = np.lexsort((region_keys[:, 1], region_keys[:, 0]))
+            region_keys = region_keys[order]
+            region_rows = np.array(region_values, dtype=np.int64)[order]
+
+            step = chunk_size or len(order) or 1
+            for i in range(0, len(order), step):
+                yield chrom, region_keys[i : i + step], region_rows[i : i + step]
+
+
+def copy_value(value):
+    """
+    Format a value for PostgreSQL's `COPY` text format.
+    """
+    if value is None:
+        return "\\N"
+    elif isinstance(value, bool):
+        return "t" if value else "f"
+    elif isinstance(value, datetime):
+        return value.isoformat()
+    else:
+        return str(value)
+
+
+def copy_vafs(instance, batches):
+    """
+    Insert `batches` of VAFs for the Metadata `instance` using PostgreSQL's `COPY FROM STDIN`.
+    """
+    fields = [field for field in VAF._meta.concrete_fields if not field.primary_key]
+    sql = "COPY {} ({}) FROM STDIN".format(
+        connection.ops.quote_name(VAF._meta.db_table),
+        ", ".join(connection.ops.quote_name(field.column) for field in fields),
+    )
+    values = {"created": timezone.now(), "metadata_id": instance.id}
+
+    with connection.cursor() as cursor:
+        for batch in batches:
+            rows = [
+                [values.get(field.attname, vaf.get(field.attname)) for field in fields]
+                for vaf in batch
+            ]
+
+            if hasattr(cursor, "copy_expert"):
+                # psycopg2 takes a file-like object in COPY's text format
+                buffer = io.StringIO()
+                for row in rows:
+                    buffer.write("\t".join(copy_value(value) for value in row) + "\n")
+                buffer.seek(0)
+                cursor.copy_expert(sql, buffer)
+            else:
+                # psycopg3 adapts each row itself
+                with cursor.copy(sql) as copy:
+                    for row in rows:
+                        copy.write_row(row)
+
+
+def normalise_vafs(project, batches):
+    """
+    Replace the reference name of each VAF in the `batches` with the id of its Reference in the `project`,
+    and set the project of each VAF (which on PostgreSQL decides the partition it is stored in).
+
+    Unless the project stores them, the derived fields are left null, and are derived from the rest of the VAF when it is read.
+    """
+    references = dict(
+        Reference.objects.filter(project=project).values_list("name", "id")
+    )
+
+    for batch in batches:
+        for vaf in batch:
+            vaf["project_id"] = project.id
+            vaf["reference_id"] = references[vaf.pop("reference")]
+
+            if not project.store_derived:
+                for field in VAF.DERIVED_FIELDS:
+                    vaf[field] = None
+
+        yield batch
+
+
+def bulk_create_vafs(instance, batches):
+    """
+    Insert `batches` of VAFs (each a list of dicts) for the Metadata `instance`.
+
+    Uses the backend's native bulk loader where one is available, and `bulk_create` otherwise.
+    """
+    if connection.vendor == "postgresql":
+        copy_vafs(instance, batches)
     else:
-        for chrom, chrom_data in data.items():
-            for (pos, ins_pos), row in sorted(chrom_data.items()):
-                if stats:
-                    yield [chrom, pos, ins_pos] + get_stats(row, decimals=decimals)
-                else:
-                    yield [chrom, pos, ins_pos, sum(row)] + row
+        for batch in batches:
+            VAF.objects.bulk_create(
+                [VAF(metadata=instance, **vaf) for vaf in batch],
+                batch_size=len(batch),
+            )
+
+
+# Filters applied to the positions of a pileup, in the order they are applied
+FILTERS = ["insertion", "coverage", "diff", "entropy", "secondary_entropy"]
+
+
+def prune(chunk, keep, name, filtered):
+    """
+    Remove the positions of the `chunk` (a dict of equal-length arrays) where `keep` is false.
+
+    The number of positions removed is added to `filtered[name]`.
+    """
+    filtered[name] += len(keep) - int(np.count_nonzero(keep))
+    for column, values in chunk.items():
+        chunk[column] = values[keep]
 
 
-@shared_task
-def generate(code, metadata):
+def concatenate(chunks):
+    """
+    Join a list of `chunks` (each a dict of equal-length arrays) into one.
+    """
+    return {
+        column: np.concatenate([chunk[column] for chunk in chunks])
+        for column in chunks[0]
+    }
+
+
+def update_job(job, **fields):
+    """
+    Update the Job with task_id `job` (if there is one) with the provided `fields`.
+    """
+    if job:
+        with write_lane():
+            Job.objects.filter(task_id=job).update(**fields)
+
+
+class JobTask(Task):
+    """
+    Task that records any failure on the Job passed as its `job` keyword argument.
+    """
+
+    def on_failure(self, exc, task_id, args, kwargs, einfo):
+        update_job(kwargs.get("job"), state="FAILURE", error=repr(exc))
+
+
+@shared_task(base=JobTask)
+def generate(code, metadata, job=None, replace=False):
     start = time.time()
+    update_job(job, state="GENERATING", generate_started=timezone.now())
 
     # Get the project
-    project = Project.objects.get(code=code)
+    project = get_project(code)
+
+    # Unless the sample is being replaced, check it has not been stored since it was submitted
+    # (e.g. by an earlier submission of the same sample that was still queued) before doing any pileup work
+    if not replace:
+        stored = (
+            Metadata.objects.filter(project=project, sample_id=metadata["sample_id"])
+            .values(*FINGERPRINT_FIELDS)
+            .first()
+        )
+        if stored is not None:
+            if metadata.get("bam_size") is not None and matches(stored, metadata):
+                update_job(job, state="SKIPPED", generate_finished=timezone.now())
+                print(f"[GENERATE] [SAMPLE_ID] {metadata['sample_id']} [SKIPPED]")
+                return metadata, None, 0, None, None, None, None
+
+            # The sample was stored from a different BAM, so fail validation now rather than after the pileup
+            MetadataSerializer(data=metadata).is_valid(raise_exception=True)  # type: ignore
 
     # Run maptide
+    pileup_start = time.perf_counter()
     mp = maptide.query(
         metadata["bam_path"],
-        region=project.region,
+        region=query_region(project.region),
         bai=metadata.get("bai_path"),
         mapping_quality=project.mapping_quality,
         base_quality=project.base_quality,
     )
+    pileup_time = time.perf_counter() - pileup_start
 
-    # Maptide output columns
-    columns = [
-        "reference",
-        "position",
-        "insertion",
-        "coverage",
-        "a",
-        "c",
-        "g",
-        "t",
-        "ds",
-        "n",
-        "pc_a",
-        "pc_c",
-        "pc_g",
-        "pc_t",
-        "pc_ds",
-        "pc_n",
-        "entropy",
-        "secondary_entropy",
-    ]
-
-    references = {}
-    vafs = []
+    decimals = settings.FLOATFIELD_DECIMAL_PLACES
+    sequences = {}
+    pending = []
+    num_pending = 0
+    num_positions = 0
     num_vafs = 0
+    filtered = {name: 0 for name in FILTERS}
+    timings = {"stats": 0.0, "spool": 0.0}
 
-    # Create VAF instances
-    for record in iterate(mp, region=project.region, stats=True):
-        record = dict(zip(columns, record))
+    # Summary statistics of the sample, over every position of the pileup before any filters are applied
+    summary = PileupSummary()
 
-        # If the project is not recording insertions, skip any non-ref VAFS
-        if (not project.insertions) and record["insertion"] != 0:
-            continue
+    # VAFs are written to a spool in chunks, so that only one chunk is held in memory at a time
+    chunk_size = project.chunk_size or settings.VAF_BATCH_SIZE
 
-        # Check the VAF's coverage and entropies fit the project requirements
-        if (
-            record["coverage"] < project.min_coverage
-            or record["entropy"] < project.min_entropy
-            or record["secondary_entropy"] < project.min_secondary_entropy
+    # If generating fails part of the way through, the partial spool is removed rather than left behind
+    with SpoolWriter() as spool:
+        # Create VAFs, one chunk of positions at a time
+        # Each filter prunes the chunk in turn, cheapest first, so that statistics
+        # are only calculated for the positions that pass the cheaper filters
+        filter_start = time.perf_counter()
+        for chrom, keys, counts in iterate_chunks(
+            mp, region=project.region, chunk_size=chunk_size
         ):
-            continue
+            num_positions += len(keys)
+            summary.add(chrom, keys, counts)
+            chunk = {"keys": keys, "counts": counts}
+
+            # If the project is not recording insertions, skip any non-ref VAFS
+            if not project.insertions:
+                prune(chunk, chunk["keys"][:, 1] == 0, "insertion", filtered)
 
-        # Find the dominant base and its confidence
-        base_counts = {
-            "A": record["a"],
-            "C": record["c"],
-            "G": record["g"],
-            "T": record["t"],
-            "DS": record["ds"],
-        }
-        if record["coverage"] > 0:
-            record["base"] = max(
-                base_counts,
-                key=base_counts.get,  # type: ignore
+            # Check the VAF's coverage fits the project requirements
+            chunk["coverage"] = chunk["counts"].sum(axis=1)
+            prune(
+                chunk, chunk["coverage"] >= project.min_coverage, "coverage", filtered
             )
-            record["confidence"] = (
-                100 * base_counts[record["base"]] / sum(base_counts.values())
+
+            # Find the dominant base and its confidence
+            chunk["base"], chunk["confidence"] = call_bases(chunk["counts"])
+
+            # Get the corresponding reference sequence for the VAFs, if not already retrieved
+            # Sequences are cached by the worker, so they are only fetched from the database once per reference
+            if chrom not in sequences:
+                sequences[chrom] = get_sequence(project, chrom)
+
+            # Check for difference between ref_base and base
+            chunk["ref_base"] = sequences[chrom][chunk["keys"][:, 0] - 1]
+            chunk["diff"] = (chunk["base"] != b"") & (
+                chunk["base"] != chunk["ref_base"]
             )
-        else:
-            record["base"] = None
-            record["confidence"] = 0
 
-        # Get the corresponding reference object for the VAF, if not already retrieved
-        if record["reference"] not in references:
-            references[record["reference"]] = Reference.objects.get(
-                project=project, name=record["reference"]
+            # If the project requires VAFS with a difference from the reference, above a certain confidence,
+            # check that there is a difference, above the diff confidence threshold.
+            # If not, skip
+            if project.diff_confidence:
+                prune(
+                    chunk,
+                    chunk["diff"] & (chunk["confidence"] >= project.diff_confidence),
+                    "diff",
+                    filtered,
+                )
+
+            # Calculate the statistics of the remaining positions
+            stats_start = time.perf_counter()
+            _, chunk["stats"] = get_batch_stats(chunk["counts"], decimals=decimals)
+            timings["stats"] += time.perf_counter() - stats_start
+
+            # Check the VAF's entropies fit the project requirements
+            prune(
+                chunk, chunk["stats"][:, 6] >= project.min_entropy, "entropy", filtered
+            )
+            prune(
+                chunk,
+                chunk["stats"][:, 7] >= project.min_secondary_entropy,
+                "secondary_entropy",
+                filtered,
             )
 
-        # Check for difference between ref_base and base
-        ref_base = references[record["reference"]].sequence[record["position"] - 1]
-        diff = bool(record["base"] and record["base"] != ref_base)
+            if not len(chunk["keys"]):
+                continue
 
-        # If the project requires VAFS with a difference from the reference, above a certain confidence,
-        # check that there is a difference, above the diff confidence threshold.
-        # If not, skip
-        if project.diff_confidence and not (
-            diff and record["confidence"] >= project.diff_confidence
-        ):
-            continue
+            pending.append(
+                {
+                    "reference": np.full(len(chunk["keys"]), chrom),
+                    "position": chunk["keys"][:, 0],
+                    "insertion": chunk["keys"][:, 1],
+                    "coverage": chunk["coverage"],
+                    "ref_base": chunk["ref_base"].astype("U2"),
+                    "base": chunk["base"].astype("U2"),
+                    "confidence": round_exact(chunk["confidence"], decimals),
+                    "diff": chunk["diff"],
+                    **{
+                        base: chunk["counts"][:, i]
+                        for i, base in enumerate(["a", "c", "g", "t", "ds"])
+                    },
+                    **{
+                        column: chunk["stats"][:, i]
+                        for i, column in enumerate(
+                            ["pc_a", "pc_c", "pc_g", "pc_t", "pc_ds"]
+                        )
+                    },
+                    "entropy": chunk["stats"][:, 6],
+                    "secondary_entropy": chunk["stats"][:, 7],
+                }
+            )
+            num_pending += len(chunk["keys"])
+            num_vafs += len(chunk["keys"])
 
-        vafs.append(
-            {
-                "reference": record["reference"],
-                "position": record["position"],
-                "insertion": record["insertion"],
-                "ptype": "REF" if record["insertion"] == 0 else "INS",
-                "coverage": record["coverage"],
-                "ref_base": ref_base,
-                "base": record["base"],
-                "confidence": round(
-                    record["confidence"], settings.FLOATFIELD_DECIMAL_PLACES
-                ),
-                "diff": diff,
-                "a": record["a"],
-                "c": record["c"],
-                "g": record["g"],
-                "t": record["t"],
-                "ds": record["ds"],
-                "pc_a": round(record["pc_a"], settings.FLOATFIELD_DECIMAL_PLACES),
-                "pc_c": round(record["pc_c"], settings.FLOATFIELD_DECIMAL_PLACES),
-                "pc_g": round(record["pc_g"], settings.FLOATFIELD_DECIMAL_PLACES),
-                "pc_t": round(record["pc_t"], settings.FLOATFIELD_DECIMAL_PLACES),
-                "pc_ds": round(record["pc_ds"], settings.FLOATFIELD_DECIMAL_PLACES),
-                "entropy": round(record["entropy"], settings.FLOATFIELD_DECIMAL_PLACES),
-                "secondary_entropy": round(
-                    record["secondary_entropy"], settings.FLOATFIELD_DECIMAL_PLACES
-                ),
-            }
-        )
-        num_vafs += 1
+            if num_pending >= chunk_size:
+                spool_start = time.perf_counter()
+                spool.write(concatenate(pending))
+                pending = []
+                num_pending = 0
+                timings["spool"] += time.perf_counter() - spool_start
+
+        # Write the final chunk, so that only the spool's handle is passed to the store task
+        spool_start = time.perf_counter()
+        if pending:
+            spool.write(concatenate(pending))
+        handle = spool.close()
+        timings["spool"] += time.perf_counter() - spool_start
 
+    # Time spent in the loop that was not calculating statistics or writing the spool was spent filtering
+    filter_time = (
+        time.perf_counter() - filter_start - timings["stats"] - timings["spool"]
+    )
+
+    # The number of reads is not recorded by the pileup, so it is taken from the BAM index
+    read_counts = mapped_reads(metadata["bam_path"], metadata.get("bai_path"))
+    if read_counts is not None:
+        num_reads = sum(read_counts.get(chrom, 0) for chrom in summary.references)
+    else:
+        num_reads = None
     end = time.time()
 
+    update_job(
+        job,
+        state="GENERATED",
+        generate_finished=timezone.now(),
+        pileup_time=pileup_time,
+        stats_time=timings["stats"],
+        filter_time=filter_time,
+        spool_time=timings["spool"],
+        num_positions=num_positions,
+        num_vafs=num_vafs,
+        **{f"filtered_{name}": count for name, count in filtered.items()},
+    )
+
     print(
         f"[GENERATE] [SAMPLE_ID] {metadata['sample_id']} [SUCCESS] time: {round(end - start, settings.FLOATFIELD_DECIMAL_PLACES)} s"
     )
-    return metadata, vafs, num_vafs, None, None, None, None
+    return (
+        metadata,
+        handle,
+        num_vafs,
+        num_reads,
+        summary.mean_coverage(decimals),
+        summary.mean_entropy(decimals),
+        ",".join(summary.references),
+    )
 
 
-@shared_task
-def store(args):
-    metadata, vafs, num_vafs, num_reads, mean_coverage, mean_entropy, references = args
-    start = time.time()
+@shared_task(base=JobTask)
+def store(args, job=None, replace=False):
+    metadata, spool, num_vafs, num_reads, mean_coverage, mean_entropy, references = args
 
-    # Validate the metadata (again because we cant pass the object to the task) before doing anything else
-    serializer = MetadataSerializer(data=metadata)  # type: ignore
-    serializer.is_valid(raise_exception=True)
+    # The generate task skipped the sample, so there is nothing to store
+    if spool is None:
+        return
+
+    start = time.time()
+    update_job(job, state="STORING", store_started=timezone.now())
 
     # All changes to the db for this task are wrapped in a single transaction
     # So if anything goes wrong, any changes made are rolled back
-    with transaction.atomic():
+    # On SQLite, the transaction waits its turn in the write lane, so it never collides with another writer
+    with write_lane(), transaction.atomic():
+        # If the sample is being replaced, delete its existing metadata (and VAFs), removing it from the project's summaries
+        if replace:
+            for existing in Metadata.objects.filter(
+                project=metadata["project"], sample_id=metadata["sample_id"]
+            ):
+                delete_sample(existing)
+
+        # Validate the metadata (again because we cant pass the object to the task) before doing anything else
+        serializer = MetadataSerializer(data=metadata)  # type: ignore
+        serializer.is_valid(raise_exception=True)
+
         # Create Metadata instance
         instance = serializer.save()
 
-        # Create VAF instances
-        for vaf in vafs:
-            print(vaf)
-            VAF.objects.create(metadata=instance, **vaf)
+        # Create VAF instances, one chunk of the spool written by the generate task at a time
+        # If the project packs its VAFs, they are instead packed into arrays, one set per reference
+        if instance.project.packed:
+            pack_vafs(instance, iterate_spool(spool, columns=True))
+        else:
+            bulk_create_vafs(
+                instance, normalise_vafs(instance.project, iterate_spool(spool))
+            )
+
+        # Add the VAFs to the project's per-position summaries
+        update_summaries(instance.project, iterate_spool(spool, columns=True))
 
-        # Update Metadata instance with VAF summary statistics
-        # instance.num_reads = sum(bc.read_counts.values())
-        # instance.mean_coverage = bc.mean_coverage()
+        # Update Metadata instance with the sample's summary statistics, calculated by the generate task
+        instance.num_reads = num_reads
+        instance.mean_coverage = mean_coverage
         instance.num_vafs = num_vafs
-        # instance.mean_entropy = bc.mean_entropy()
-        # instance.references = ",".join(bc.references)
+        instance.mean_entropy = mean_entropy
+        instance.references = references
         instance.save(
             update_fields=[
                 "num_reads",
@@ -225,8 +499,18 @@ def store(args):
                 "references",
             ]
         )
+
+    # The VAFs are in the database, so the spool file is no longer needed
+    remove_spool(spool)
     end = time.time()
 
+    update_job(
+        job,
+        state="SUCCESS",
+        store_finished=timezone.now(),
+        write_time=end - start,
+    )
+
     print(
-        f"[STORE] [SAMPLE_ID] {metadata['sample_id']} [SUCCESS] time: {round(end - start, settings.FLOATFIELD_DECIMAL_PLACES)} s"
+        f"[STORE] [SAMPLE_ID] {metadata['sample_id']} [SUCCESS] time: {round(end - start, settings.FLOATFIELD_DECIMAL_PLACES)} s rows: {num_vafs} rows/s: {round(num_vafs / max(end - start, 1e-9))}"
     )
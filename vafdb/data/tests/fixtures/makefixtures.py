@@ -0,0 +1,126 @@
+"""
+Make the reference and BAM fixtures used by the tests.
+
+Requires pysam, which is not a dependency of VAFDB. Run from this directory:
+
+    python makefixtures.py
+"""
+
+import pysam
+import random
+
+# chrom3 has no reads in any of the BAMs
+REFERENCES = {"chrom1": 300, "chrom2": 200, "chrom3": 100}
+READ_LENGTH = 50
+
+
+def make_references(rng):
+    references = {
+        name: "".join(rng.choice("ACGT") for _ in range(length))
+        for name, length in REFERENCES.items()
+    }
+
+    with open("ref.fasta", "w") as fasta:
+        for name, sequence in references.items():
+            fasta.write(f">{name}\n{sequence}\n")
+
+    return references
+
+
+def make_read(rng, name, reference_id, sequence):
+    start = rng.randint(0, len(sequence) - READ_LENGTH - 5)
+    bases = list(sequence[start : start + READ_LENGTH])
+    for i in range(len(bases)):
+        if rng.random() < 0.03:
+            bases[i] = rng.choice("ACGTN")
+
+    r = rng.random()
+    if r < 0.1:
+        bases = bases[:25] + list("TT") + bases[25:]
+        cigar = [(0, 25), (1, 2), (0, READ_LENGTH - 25)]
+    elif r < 0.2:
+        bases = bases[:20] + bases[23:]
+        cigar = [(0, 20), (2, 3), (0, READ_LENGTH - 23)]
+    else:
+        cigar = [(0, READ_LENGTH)]
+
+    read = pysam.AlignedSegment()
+    read.query_name = name
+    read.query_sequence = "".join(bases)
+    read.flag = 0
+    read.reference_id = reference_id
+    read.reference_start = start
+    read.mapping_quality = rng.choice([10, 30, 60])
+    read.cigartuples = cigar
+    read.query_qualities = pysam.qualitystring_to_array(
+        "".join(rng.choice("+5?I") for _ in bases)
+    )
+    return read
+
+
+def make_unmapped_read(rng, name, reference_id=-1, start=-1):
+    """
+    An unmapped read, which is placed at the position of its mate if it has a `reference_id`.
+    """
+    read = pysam.AlignedSegment()
+    read.query_name = name
+    read.query_sequence = "".join(rng.choice("ACGT") for _ in range(READ_LENGTH))
+    read.flag = 4
+    read.reference_id = reference_id
+    read.reference_start = start
+    read.query_qualities = pysam.qualitystring_to_array("I" * READ_LENGTH)
+    return read
+
+
+def make_bam(path, rng, references, num_reads, num_placed_unmapped, num_unplaced):
+    header = {
+        "HD": {"VN": "1.0", "SO": "coordinate"},
+        "SQ": [{"SN": name, "LN": len(seq)} for name, seq in references.items()],
+    }
+    reads = []
+    for reference_id, (name, count) in enumerate(num_reads.items()):
+        for i in range(count):
+            reads.append(make_read(rng, f"{name}_{i}", reference_id, references[name]))
+
+    for i in range(num_placed_unmapped):
+        reads.append(make_unmapped_read(rng, f"placed_{i}", 0, rng.randint(0, 200)))
+
+    reads.sort(key=lambda read: (read.reference_id, read.reference_start))
+    reads += [make_unmapped_read(rng, f"unplaced_{i}") for i in range(num_unplaced)]
+
+    with pysam.AlignmentFile(path, "wb", header=header) as bam:
+        for read in reads:
+            bam.write(read)
+
+    pysam.index(path)
+
+
+if __name__ == "__main__":
+    rng = random.Random(1)
+    references = make_references(rng)
+    make_bam(
+        "a.bam",
+        rng,
+        references,
+        num_reads={"chrom1": 150, "chrom2": 80},
+        num_placed_unmapped=5,
+        num_unplaced=3,
+    )
+    make_bam(
+        "b.bam",
+        rng,
+        references,
+        num_reads={"chrom1": 90, "chrom2": 120},
+        num_placed_unmapped=2,
+        num_unplaced=0,
+    )
+
+    # A BAM of only the first reference, whose index does not match the other BAMs
+    make_bam(
+        "chrom1.bam",
+        rng,
+        {"chrom1": references["chrom1"]},
+        num_reads={"chrom1": 20},
+        num_placed_unmapped=0,
+        num_unplaced=0,
+    )
@@ -0,0 +1,100 @@
+from django.test import SimpleTestCase
+from ..bamindex import reference_names, mapped_reads
+from ..models import Metadata
+from .utils import StorageTestCase, create_project, store_sample, fixture_path
+import tempfile
+import shutil
+import os
+
+# Numbers of mapped reads in the fixtures, as counted by `samtools idxstats`
+# a.bam also has 5 unmapped reads placed on chrom1 and 3 unplaced reads, and b.bam has 2 unmapped reads placed on chrom1
+MAPPED_READS = {
+    "a.bam": {"chrom1": 150, "chrom2": 80, "chrom3": 0},
+    "b.bam": {"chrom1": 90, "chrom2": 120, "chrom3": 0},
+}
+
+
+class BAMIndexTestCase(SimpleTestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+
+    def copy_fixture(self, name):
+        path = os.path.join(self.directory, name)
+        shutil.copy(fixture_path(name), path)
+        return path
+
+    def test_reference_names(self):
+        self.assertEqual(
+            reference_names(fixture_path("a.bam")), ["chrom1", "chrom2", "chrom3"]
+        )
+        self.assertEqual(reference_names(fixture_path("chrom1.bam")), ["chrom1"])
+
+    def test_mapped_reads(self):
+        # Unmapped reads are left out, including those placed on a reference
+        for name, expected in MAPPED_READS.items():
+            with self.subTest(name=name):
+                self.assertEqual(mapped_reads(fixture_path(name)), expected)
+
+    def test_bai_path(self):
+        bam_path = self.copy_fixture("a.bam")
+        bai_path = os.path.join(self.directory, "index.bai")
+        shutil.copy(fixture_path("a.bam.bai"), bai_path)
+
+        self.assertEqual(mapped_reads(bam_path, bai_path), MAPPED_READS["a.bam"])
+
+    def test_missing_bai(self):
+        bam_path = self.copy_fixture("a.bam")
+
+        self.assertIsNone(mapped_reads(bam_path))
+        self.assertIsNone(
+            mapped_reads(bam_path, os.path.join(self.directory, "missing.bai"))
+        )
+
+    def test_reference_mismatch(self):
+        # The index of a BAM with a different number of references does not match the BAM
+        self.assertIsNone(
+            mapped_reads(fixture_path("a.bam"), fixture_path("chrom1.bam.bai"))
+        )
+        self.assertIsNone(
+            mapped_reads(fixture_path("chrom1.bam"), fixture_path("a.bam.bai"))
+        )
+
+    def test_truncated_bai(self):
+        bam_path = self.copy_fixture("a.bam")
+        with open(fixture_path("a.bam.bai"), "rb") as f:
+            bai = f.read()
+
+        # The index ends with the optional number of unplaced reads (8 bytes), which is not read
+        for size in [0, 4, 8, 20, len(bai) // 2, len(bai) - 9]:
+            with self.subTest(size=size):
+                with open(f"{bam_path}.bai", "wb") as f:
+                    f.write(bai[:size])
+                self.assertIsNone(mapped_reads(bam_path))
+
+        # The linear index of the last reference is skipped rather than read, so cutting it short is found separately
+        bam_path = self.copy_fixture("chrom1.bam")
+        with open(fixture_path("chrom1.bam.bai"), "rb") as f:
+            bai = f.read()
+        with open(f"{bam_path}.bai", "wb") as f:
+            f.write(bai[:-12])
+        self.assertIsNone(mapped_reads(bam_path))
+
+    def test_not_bam(self):
+        self.assertIsNone(mapped_reads(fixture_path("ref.fasta")))
+
+
+class NumReadsTestCase(StorageTestCase):
+    def test_num_reads(self):
+        create_project("reads")
+        store_sample("reads", "a", bam="a.bam")
+        store_sample("reads", "b", bam="b.bam")
+
+        self.assertEqual(
+            dict(
+                Metadata.objects.filter(project__code="reads").values_list(
+                    "sample_id", "num_reads"
+                )
+            ),
+            {"a": 230, "b": 210},
+        )
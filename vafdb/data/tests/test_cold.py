@@ -0,0 +1,203 @@
+from django.core.management import call_command
+from django.db import transaction
+from django.test import override_settings
+from rest_framework.test import APIClient
+from urllib.parse import urlparse, parse_qs
+from ..models import Metadata
+from ..cold import project_dir, cold_files, decode_cursor
+from ..deletion import delete_sample
+from .utils import StorageTestCase, create_project, store_sample, fetch_all
+from .test_packed import FILTERS, QUERIES
+import pyarrow.dataset as ds
+import contextlib
+import datetime
+import io
+import os
+
+
+def archive(code, **options):
+    with contextlib.redirect_stdout(io.StringIO()):
+        call_command("archivesamples", code, **options)
+
+
+def cold_sample_ids(project, name):
+    """
+    Ids of the samples with VAFs in the cold file `name` of the `project`.
+    """
+    table = ds.dataset(os.path.join(project_dir(project), name)).to_table(
+        columns=["metadata_id"]
+    )
+    return set(table.column("metadata_id").to_pylist())
+
+
+class ColdTestCase(StorageTestCase):
+    """
+    Samples moved to cold files return the same results as they did from the VAF table.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.project = create_project("cold", insertions=True)
+        for sample_id, bam in [("s1", "a.bam"), ("s2", "b.bam"), ("s3", "a.bam")]:
+            store_sample("cold", sample_id, bam=bam)
+
+        # The first sample was published earlier, so can be archived on its own
+        Metadata.objects.filter(sample_id="s1").update(
+            published_date=datetime.date(2020, 1, 1)
+        )
+
+    def fetch(self, view, data, method):
+        return fetch_all(f"/data/{view}/cold/", data, method=method)
+
+    def hot_results(self):
+        return {
+            **{
+                ("filter", str(data)): self.fetch("filter", data, "get")
+                for data in FILTERS
+            },
+            **{
+                ("query", str(data)): self.fetch("query", data, "post")
+                for data in QUERIES
+            },
+        }
+
+    def assertResults(self, expected):
+        for data in FILTERS:
+            with self.subTest(**data):
+                self.assertEqual(
+                    self.fetch("filter", data, "get"), expected["filter", str(data)]
+                )
+
+        for data in QUERIES:
+            with self.subTest(query=data):
+                self.assertEqual(
+                    self.fetch("query", data, "post"), expected["query", str(data)]
+                )
+
+    def test_archived(self):
+        expected = self.hot_results()
+
+        # Some samples are cold, and the rest are still in the VAF table
+        archive("cold", published_before=datetime.date(2021, 1, 1))
+        self.assertEqual(len(cold_files(self.project)), 1)
+        self.assertResults(expected)
+
+        # All samples are cold, across several files
+        archive("cold", samples_per_file=1)
+        self.assertEqual(len(cold_files(self.project)), 3)
+        self.assertFalse(Metadata.objects.filter(cold_file__isnull=True))
+        self.assertResults(expected)
+
+        with override_settings(CURSOR_PAGINATION_PAGE_SIZE=37):
+            self.assertResults(expected)
+
+    def test_cursors(self):
+        expected = fetch_all("/data/filter/cold/", {"pc_a__gte": "20"})
+        archive("cold", samples_per_file=2)
+
+        # Follow the pages, checking each cursor is a cold cursor of one of the files
+        results = {}
+        cursors = []
+        response = APIClient().get(
+            "/data/filter/cold/", {"pc_a__gte": "20", "page_size": 37}
+        )
+        while True:
+            self.assertEqual(response.status_code, 200, response.content)
+            for md in response.json()["results"]:
+                vafs = md.pop("vaf")
+                results.setdefault(md["sample_id"], {**md, "vaf": []})["vaf"].extend(
+                    vafs
+                )
+
+            next_link = response.json()["next"]
+            if not next_link:
+                break
+
+            cursor = parse_qs(urlparse(next_link).query)["cursor"][0]
+            cursors.append(decode_cursor(cursor))
+            response = APIClient().get(next_link)
+
+        self.assertGreater(len(cursors), 2)
+        for cursor in cursors:
+            self.assertIsNotNone(cursor)
+
+        # The first cursor starts the cold VAFs, and each one after it is in a file, after the previous cursor
+        files = cold_files(self.project)
+        self.assertEqual(cursors[0], ("", 0))
+        for previous, (name, last_id) in zip(cursors, cursors[1:]):
+            self.assertIn(name, files)
+            self.assertGreater((name, last_id), previous)
+
+        for md in results.values():
+            md["vaf"].sort(
+                key=lambda vaf: (vaf["reference"], vaf["position"], vaf["insertion"])
+            )
+        self.assertEqual(results, expected)
+
+    def test_invalid_cursor(self):
+        archive("cold")
+        response = APIClient().get("/data/filter/cold/", {"cursor": "cold:nonsense"})
+        self.assertEqual(response.status_code, 404)
+
+
+class ColdDeleteTestCase(StorageTestCase):
+    """
+    The cold file of a deleted sample is only rewritten once the deletion has committed.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.project = create_project("cold", insertions=True)
+        store_sample("cold", "s1", bam="a.bam")
+        store_sample("cold", "s2", bam="b.bam")
+
+    def setUp(self):
+        archive("cold")
+        self.s1, self.s2 = Metadata.objects.filter(project=self.project).order_by(
+            "sample_id"
+        )
+        (self.name,) = cold_files(self.project)
+
+    def test_delete(self):
+        self.assertEqual(
+            cold_sample_ids(self.project, self.name), {self.s1.id, self.s2.id}
+        )
+
+        with self.captureOnCommitCallbacks() as callbacks:
+            response = APIClient().delete("/data/delete/cold/s1/")
+            self.assertEqual(response.status_code, 200, response.content)
+
+            # Until the deletion commits, the file still holds the sample's VAFs, but they are not read
+            self.assertEqual(
+                cold_sample_ids(self.project, self.name), {self.s1.id, self.s2.id}
+            )
+            self.assertEqual(set(fetch_all("/data/filter/cold/")), {"s2"})
+
+        self.assertEqual(len(callbacks), 1)
+        callbacks[0]()
+        self.assertEqual(cold_sample_ids(self.project, self.name), {self.s2.id})
+        self.assertEqual(set(fetch_all("/data/filter/cold/")), {"s2"})
+
+        # Deleting the last sample in the file removes it
+        with self.captureOnCommitCallbacks(execute=True):
+            response = APIClient().delete("/data/delete/cold/s2/")
+            self.assertEqual(response.status_code, 200, response.content)
+
+        self.assertEqual(cold_files(self.project), [])
+
+    def test_rollback(self):
+        expected = fetch_all("/data/filter/cold/")
+
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            with self.assertRaises(ValueError):
+                with transaction.atomic():
+                    delete_sample(self.s1)
+                    raise ValueError
+
+        # The rolled back deletion left the sample, and its VAFs in the file
+        self.assertEqual(callbacks, [])
+        self.assertTrue(Metadata.objects.filter(pk=self.s1.pk))
+        self.assertEqual(
+            cold_sample_ids(self.project, self.name), {self.s1.id, self.s2.id}
+        )
+        self.assertEqual(fetch_all("/data/filter/cold/"), expected)
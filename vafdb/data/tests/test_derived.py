@@ -0,0 +1,265 @@
+from django.db import connection
+from django.db.migrations.executor import MigrationExecutor
+from django.test import TestCase, TransactionTestCase
+from rest_framework.test import APIClient
+from ..models import Project, Reference, Metadata, VAF
+from ..stats import get_batch_stats
+import numpy as np
+import unittest
+import operator
+
+# (count, coverage) of percentages that sit on, or next to, a rounding boundary at three decimal places
+BOUNDARY_COUNTS = [
+    (1, 64),
+    (3, 64),
+    (5, 128),
+    (1, 1600),
+    (1, 3),
+    (2, 3),
+    (1, 6),
+    (1, 7),
+    (1, 8),
+    (0, 5),
+    (5, 5),
+    (0, 0),
+]
+
+
+def seeded_counts():
+    """
+    Rows of (A, C, G, T, DS, N) counts: random rows, followed by rows whose percentage of A is on a rounding boundary.
+    """
+    rng = np.random.default_rng(0)
+    counts = rng.integers(0, 12, size=(80, 6))
+    counts[:, 0] += rng.integers(0, 60, size=80)
+
+    boundary = np.zeros((len(BOUNDARY_COUNTS), 6), dtype=np.int64)
+    for row, (count, coverage) in zip(boundary, BOUNDARY_COUNTS):
+        row[0] = count
+        row[1] = coverage - count
+
+    return np.concatenate([counts, boundary])
+
+
+COUNTS = seeded_counts()
+SEQUENCE = "".join(np.random.default_rng(1).choice(list("ACGT"), size=len(COUNTS)))
+PERCENTAGES = ["pc_a", "pc_c", "pc_g", "pc_t", "pc_ds"]
+
+
+def create_project(code, store_derived):
+    """
+    Create a project with one sample, which has a VAF at each position for the rows of `COUNTS`.
+
+    Projects that store derived fields store them as the generate task calculates them.
+    """
+    project = Project.objects.create(code=code, store_derived=store_derived)
+    reference = Reference.objects.create(
+        project=project, name="chrom1", sequence=SEQUENCE
+    )
+    metadata = Metadata.objects.create(
+        project=project, sample_id="s1", bam_path="s1.bam"
+    )
+    integers, floats = get_batch_stats(COUNTS)
+
+    VAF.objects.bulk_create(
+        VAF(
+            project=project,
+            metadata=metadata,
+            reference=reference,
+            position=position,
+            insertion=0,
+            ptype="REF",
+            coverage=ints[0],
+            ref_base=SEQUENCE[position - 1] if store_derived else None,
+            base="A",
+            confidence=0.0,
+            diff=False,
+            **dict(zip(["a", "c", "g", "t", "ds"], ints[1:6])),
+            **dict(
+                zip(PERCENTAGES, fls[:5] if store_derived else [None] * 5),
+            ),
+            entropy=fls[6],
+            secondary_entropy=fls[7],
+        )
+        for position, (ints, fls) in enumerate(
+            zip(integers.tolist(), floats.tolist()), start=1
+        )
+    )
+
+    return project
+
+
+def stored_values(field):
+    """
+    Value of the `field` at each position, as the generate task stores it.
+    """
+    if field == "ref_base":
+        return dict(enumerate(SEQUENCE, start=1))
+
+    _, floats = get_batch_stats(COUNTS)
+    return dict(enumerate(floats[:, PERCENTAGES.index(field)].tolist(), start=1))
+
+
+class DerivedFieldTestCase(TestCase):
+    """
+    Filters on the derived fields return the same VAFs, with the same values, whether or not the fields are stored,
+    and these are the VAFs that match the values stored by the generate task.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        create_project("stored", store_derived=True)
+        create_project("derived", store_derived=False)
+
+    def filter(self, code, params):
+        """
+        Values of the VAFs returned by the FilterView for the `params`, keyed by position.
+        """
+        response = APIClient().get(f"/data/filter/{code}/", params)
+        self.assertEqual(response.status_code, 200, response.content)
+
+        return {
+            vaf["position"]: vaf
+            for md in response.json()["results"]
+            for vaf in md["vaf"]
+        }
+
+    def assertFilter(self, field, lookup, value, expected):
+        params = {f"{field}__{lookup}" if lookup != "exact" else field: value}
+        values = stored_values(field)
+        positions = {position for position, x in values.items() if expected(x)}
+
+        for code in ["stored", "derived"]:
+            with self.subTest(code=code, **params):
+                results = self.filter(code, params)
+                self.assertEqual(set(results), positions)
+                self.assertEqual(
+                    {position: vaf[field] for position, vaf in results.items()},
+                    {position: values[position] for position in positions},
+                )
+
+    def test_percentage_comparisons(self):
+        pc_a = stored_values("pc_a")
+        thresholds = sorted(
+            set(list(pc_a.values())[-len(BOUNDARY_COUNTS) :])
+            | {0, 100, 1.5625, 1.562, 1.563, 33.333, 33.3333, 33.334, 0.0625, 50}
+        )
+
+        for value in thresholds:
+            for lookup in ["exact", "ne", "gt", "gte", "lt", "lte"]:
+                compare = getattr(
+                    operator,
+                    {"exact": "eq", "gte": "ge", "lte": "le"}.get(lookup, lookup),
+                )
+                self.assertFilter(
+                    "pc_a", lookup, value, lambda x: compare(x, float(value))
+                )
+
+    def test_percentage_in_and_range(self):
+        for low, high in [(1.5625, 33.333), (0, 0), (12.5, 100), (1.562, 1.563)]:
+            self.assertFilter("pc_a", "in", f"{low},{high}", lambda x: x in {low, high})
+            self.assertFilter(
+                "pc_a", "range", f"{low},{high}", lambda x: low <= x <= high
+            )
+
+    def test_other_percentages(self):
+        for field in PERCENTAGES[1:]:
+            for value in [0, 10, 33.333, 100]:
+                self.assertFilter(field, "gte", value, lambda x: x >= value)
+
+    def test_reference_base(self):
+        self.assertFilter("ref_base", "exact", "a", lambda x: x == "A")
+        self.assertFilter("ref_base", "ne", "C", lambda x: x != "C")
+        self.assertFilter("ref_base", "in", "G,t", lambda x: x in {"G", "T"})
+
+
+@unittest.skipIf(
+    connection.vendor == "postgresql",
+    "The VAF table is partitioned by project on PostgreSQL, so cannot be migrated back to before it had a project",
+)
+class ReferenceMigrationTestCase(TransactionTestCase):
+    """
+    Migrating VAFs stored with the name of their reference gives them the id of that reference, and their sample's project.
+    """
+
+    migrate_from = [("data", "0001_initial")]
+
+    def setUp(self):
+        self.executor = MigrationExecutor(connection)
+        self.migrate_to = self.executor.loader.graph.leaf_nodes("data")
+        self.executor.migrate(self.migrate_from)
+
+    def tearDown(self):
+        executor = MigrationExecutor(connection)
+        executor.migrate(self.migrate_to)
+
+    def test_reference_names_to_ids(self):
+        apps = self.executor.loader.project_state(self.migrate_from).apps
+        OldProject, OldReference, OldMetadata, OldVAF = (
+            apps.get_model("data", name)
+            for name in ["Project", "Reference", "Metadata", "VAF"]
+        )
+        fields = dict(
+            ptype="REF",
+            coverage=10,
+            ref_base="A",
+            base="A",
+            confidence=100.0,
+            diff=False,
+            a=10,
+            c=0,
+            g=0,
+            t=0,
+            ds=0,
+            pc_a=100.0,
+            pc_c=0.0,
+            pc_g=0.0,
+            pc_t=0.0,
+            pc_ds=0.0,
+            entropy=0.0,
+            secondary_entropy=0.0,
+        )
+
+        # Both projects have references with the same names, so the name alone does not identify the reference
+        expected = {}
+        for code in ["p1", "p2"]:
+            project = OldProject.objects.create(code=code)
+            references = {
+                name: OldReference.objects.create(
+                    project=project, name=name, sequence="ACGT"
+                )
+                for name in ["chrom1", "chrom2"]
+            }
+            metadata = OldMetadata.objects.create(
+                project=project, sample_id="s1", bam_path="s1.bam"
+            )
+            for name, reference in references.items():
+                for position in [1, 2]:
+                    vaf = OldVAF.objects.create(
+                        metadata=metadata,
+                        reference=name,
+                        position=position,
+                        insertion=0,
+                        **fields,
+                    )
+                    expected[vaf.id] = (project.id, reference.id)
+
+        self.executor.loader.build_graph()
+        self.executor.migrate(self.migrate_to)
+
+        self.assertEqual(
+            {
+                vaf.id: (vaf.project_id, vaf.reference_id)
+                for vaf in VAF.objects.select_related("project", "reference")
+            },
+            expected,
+        )
+        self.assertEqual(
+            set(VAF.objects.values_list("project__code", "reference__name")),
+            {(code, name) for code in ["p1", "p2"] for name in ["chrom1", "chrom2"]},
+        )
+
+        # Stored derived fields are kept as they were
+        self.assertEqual(
+            set(VAF.objects.values_list("pc_a", "ref_base")), {(100.0, "A")}
+        )
@@ -0,0 +1,129 @@
+from django.test import SimpleTestCase
+from django_filters import rest_framework as filters
+from ..filters import VAFFilter, VAF_FILTERS, CHOICE_FILTERS, fields, build_filters
+from ..models import VAF
+import random
+
+# Filter data, each with fields in the order a user might give them
+DATA = [
+    {},
+    {"position": "100"},
+    {"position": "abc"},
+    {"position__gte": "1", "position__lte": "x", "coverage__in": "1,a"},
+    {"sample_id": "s1", "site__isnull": "maybe", "bogus": "1"},
+    {"base": "a", "ref_base__in": "A,c", "ptype": "del"},
+    {"base__ne": "Z", "base__contains": "A", "ref_base__range": "A"},
+    {"diff": "yes", "diff__in": "true,false", "diff__isnull": "true"},
+    {"collection_date": "2024-13-01", "published_date__range": "2024-01-01"},
+    {"published_date__iso_year__in": "2023,x", "collection_date__week": "5"},
+    {"pc_a__range": "10,60", "pc_t__gt": "x", "entropy__gte": "0.1"},
+    {"reference": "chrom1", "reference__contains": "m2", "referencex": "1"},
+    {"num_reads__lt": "-1", "mean_coverage__range": "1,2,3", "references": "a"},
+    {"confidence__lte": "", "insertion": "0", "a__exact": "1.5", "ds": "two"},
+    {
+        "pc_a__range": "10,60",
+        "entropy__gte": "0.1",
+        "base": "t",
+        "position__lt": "500",
+        "sample_id__in": "s1,s2",
+        "diff": "true",
+    },
+    {
+        "collection_date__range": "2023-01-01,2024-01-01",
+        "published_date__week__in": "1,2",
+        "ref_base__isnull": "false",
+        "reference__in": "chrom1,chrom2",
+    },
+]
+
+
+class PerInstanceVAFFilter(filters.FilterSet):
+    """
+    VAFFilter as it was, building the filters of every field whose name prefixes a field in the data, for each instance.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        choice_filters = []
+
+        for field, field_type in fields.items():
+            filter_name = field.removeprefix("metadata__")
+            if not any(x.startswith(filter_name) for x in self.data):
+                continue
+
+            field_filters, field_choice_filters = build_filters(field, field_type)
+            self.filters.update(field_filters)
+            choice_filters.extend(field_choice_filters)
+
+        for f in self.filters.values():
+            f.model = VAF
+            f.parent = self
+
+        for field, value in self.data.items():
+            if field in choice_filters and isinstance(value, str):
+                self.data[field] = value.upper()
+
+
+def shuffled(data, seed):
+    items = list(data.items())
+    random.Random(seed).shuffle(items)
+    return dict(items)
+
+
+class VAFFilterTestCase(SimpleTestCase):
+    """
+    VAFFilter validates and applies filters in the same order, with the same errors, as when it built its filters per instance.
+    """
+
+    def filtersets(self, data):
+        # Each filterset has its own copy of the data, as choice values are uppercased in place
+        return (
+            VAFFilter(data=dict(data), queryset=VAF.objects.all()),
+            PerInstanceVAFFilter(data=dict(data), queryset=VAF.objects.all()),
+        )
+
+    def test_no_base_filters(self):
+        self.assertEqual(VAFFilter.base_filters, {})
+
+    def test_filters(self):
+        filterset, _ = self.filtersets({"position": "1", "base": "a", "bogus": "1"})
+
+        # Only the filters for the fields in the data, each a copy of the shared filter that belongs to the filterset
+        self.assertEqual(list(filterset.filters), ["position", "base"])
+        for name, f in filterset.filters.items():
+            self.assertIsNot(f, VAF_FILTERS[name])
+            self.assertIs(f.parent, filterset)
+            self.assertIs(f.model, VAF)
+            self.assertFalse(hasattr(VAF_FILTERS[name], "parent"))
+
+        self.assertEqual(filterset.data["base"], "A")
+        self.assertIn("base", CHOICE_FILTERS)
+
+    def test_validation(self):
+        for i, data in enumerate(DATA):
+            for seed in range(3):
+                data = shuffled(data, seed + i)
+                with self.subTest(data=data):
+                    new, old = self.filtersets(data)
+
+                    self.assertEqual(new.is_valid(), old.is_valid())
+                    self.assertEqual(new.data, old.data)
+
+                    # Errors are in the same order, with the same messages
+                    self.assertEqual(list(new.errors.items()), list(old.errors.items()))
+                    self.assertEqual(
+                        {
+                            field: new.form[field].label
+                            for field in data
+                            if field in new.filters
+                        },
+                        {
+                            field: old.form[field].label
+                            for field in data
+                            if field in old.filters
+                        },
+                    )
+
+                    # Valid filters are applied in the same order
+                    if new.is_valid():
+                        self.assertEqual(str(new.qs.query), str(old.qs.query))
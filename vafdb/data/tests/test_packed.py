@@ -0,0 +1,104 @@
+from django.test import override_settings
+from ..models import VAF, PackedVAF
+from .utils import StorageTestCase, create_project, store_sample, fetch_all
+
+FILTERS = [
+    {},
+    {"reference": "chrom2"},
+    {"position__gte": "100", "position__lt": "200"},
+    {"sample_id": "s2"},
+    {"base": "a"},
+    {"base__isnull": "true"},
+    {"diff": "true"},
+    {"coverage__lt": "20", "entropy__gte": "0.1"},
+    {"confidence__lte": "95.5"},
+    {"pc_a__range": "10,60"},
+    {"pc_t__gt": "5.5"},
+    {"pc_ds__gte": "1"},
+    {"pc_g__in": "0,100"},
+    {"ref_base": "c"},
+    {"ref_base__in": "A,G"},
+    {"ref_base__ne": "T", "insertion__gt": "0"},
+]
+
+QUERIES = [
+    {"|": [{"base": "T"}, {"&": [{"sample_id": "s1"}, {"position__lt": 150}]}]},
+    {"&": [{"pc_a__gte": 50}, {"|": [{"ref_base": "A"}, {"diff": True}]}]},
+    {"|": [{"pc_c__lt": 1.5}, {"pc_g__exact": 100}]},
+    {"~": [{"ref_base__in": ["A", "C"]}]},
+    {"^": [{"diff": True}, {"reference": "chrom1"}]},
+    {"sample_id__ne": "s1"},
+]
+
+
+class PackedTestCase(StorageTestCase):
+    """
+    A project that packs its VAFs returns the same results as a project that stores a row per VAF, for the same samples.
+    """
+
+    configs = {
+        "insertions": dict(insertions=True, chunk_size=50),
+        "filtered": dict(min_coverage=5, min_entropy=0.05, mapping_quality=30),
+    }
+
+    @classmethod
+    def setUpTestData(cls):
+        for name, config in cls.configs.items():
+            create_project(f"{name}-row", store_derived=True, **config)
+            create_project(f"{name}-packed", packed=True, **config)
+
+            for code in [f"{name}-row", f"{name}-packed"]:
+                store_sample(code, "s1", bam="a.bam")
+                store_sample(code, "s2", bam="b.bam")
+
+    def test_stored(self):
+        for name in self.configs:
+            self.assertFalse(VAF.objects.filter(project__code=f"{name}-packed"))
+            self.assertTrue(
+                PackedVAF.objects.filter(metadata__project__code=f"{name}-packed")
+            )
+            self.assertTrue(VAF.objects.filter(project__code=f"{name}-row"))
+
+    def assertSameResults(self, name, view, data, method):
+        rows = fetch_all(f"/data/{view}/{name}-row/", data, method=method)
+        packed = fetch_all(f"/data/{view}/{name}-packed/", data, method=method)
+
+        # The references of a sample are in the order the pileup returned them, which can differ between runs
+        for md in [*rows.values(), *packed.values()]:
+            md["references"] = set(md["references"].split(","))
+
+        self.assertEqual(rows, packed)
+        return rows
+
+    def test_filter(self):
+        for name in self.configs:
+            for data in FILTERS:
+                with self.subTest(name=name, **data):
+                    self.assertSameResults(name, "filter", data, "get")
+
+    def test_query(self):
+        for name in self.configs:
+            for data in QUERIES:
+                with self.subTest(name=name, query=data):
+                    self.assertSameResults(name, "query", data, "post")
+
+    def test_results(self):
+        # The filters are not all empty (or all VAFs), so the comparisons above are meaningful
+        results = self.assertSameResults("insertions", "filter", {}, "get")
+        num_vafs = sum(len(md["vaf"]) for md in results.values())
+        for data in FILTERS[1:]:
+            results = self.assertSameResults("insertions", "filter", data, "get")
+            self.assertLess(sum(len(md["vaf"]) for md in results.values()), num_vafs)
+
+        results = self.assertSameResults("insertions", "query", QUERIES[1], "post")
+        self.assertTrue(results)
+
+    @override_settings(CURSOR_PAGINATION_PAGE_SIZE=37)
+    def test_pages(self):
+        for name in self.configs:
+            for data in [{}, {"pc_a__gte": "50"}, {"ref_base__in": "C,T"}]:
+                with self.subTest(name=name, **data):
+                    self.assertSameResults(name, "filter", data, "get")
+
+            with self.subTest(name=name, query=QUERIES[0]):
+                self.assertSameResults(name, "query", QUERIES[0], "post")
@@ -0,0 +1,143 @@
+from django.db import connection
+from django.test import TestCase
+from ..models import Project, Reference, Metadata, VAF
+from ..partitions import partition_name, is_partitioned, partition_vafs
+import unittest
+
+
+def partitions():
+    """
+    Names of the partitions of the VAF table.
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid "
+            "WHERE i.inhparent = to_regclass(%s)",
+            [VAF._meta.db_table],
+        )
+        return {name for (name,) in cursor.fetchall()}
+
+
+def count_rows(table):
+    with connection.cursor() as cursor:
+        cursor.execute(f"SELECT COUNT(*) FROM {connection.ops.quote_name(table)}")
+        return cursor.fetchone()[0]
+
+
+def unpartition_vafs():
+    """
+    Replace the partitioned VAF table with an ordinary table holding the same rows,
+    as it was before the table was partitioned.
+    """
+    qn = connection.ops.quote_name
+    table = VAF._meta.db_table
+    old = table + "_partitioned"
+
+    with connection.cursor() as cursor:
+        cursor.execute(f"ALTER TABLE {qn(table)} RENAME TO {qn(old)}")
+        cursor.execute(
+            f"CREATE TABLE {qn(table)} (LIKE {qn(old)} INCLUDING DEFAULTS INCLUDING IDENTITY)"
+        )
+        cursor.execute(f"ALTER TABLE {qn(table)} ADD PRIMARY KEY ({qn('id')})")
+        cursor.execute(f"INSERT INTO {qn(table)} SELECT * FROM {qn(old)}")
+        cursor.execute(f"DROP TABLE {qn(old)} CASCADE")
+
+
+@unittest.skipUnless(
+    connection.vendor == "postgresql",
+    "The VAF table is only partitioned on PostgreSQL (set VAFDB_DB_ENGINE=postgresql)",
+)
+class PartitionTestCase(TestCase):
+    def create_project(self, code, num_samples=2):
+        """
+        Create a project with a reference, and `num_samples` samples with three VAFs each.
+        """
+        project = Project.objects.create(code=code)
+        reference = Reference.objects.create(
+            project=project, name="chrom1", sequence="ACGT"
+        )
+
+        for i in range(num_samples):
+            metadata = Metadata.objects.create(
+                project=project, sample_id=f"{code}-s{i}", bam_path="sample.bam"
+            )
+            VAF.objects.bulk_create(
+                VAF(
+                    project=project,
+                    metadata=metadata,
+                    reference=reference,
+                    position=position,
+                    insertion=0,
+                    ptype="REF",
+                    coverage=10,
+                    base="A",
+                    confidence=100.0,
+                    diff=False,
+                    a=10,
+                    c=0,
+                    g=0,
+                    t=0,
+                    ds=0,
+                    entropy=0.0,
+                    secondary_entropy=0.0,
+                )
+                for position in [1, 2, 3]
+            )
+
+        # Run the (deferred) foreign key checks of the rows now, as they would be on commit,
+        # so that the tables can be altered and dropped within the test's transaction
+        connection.check_constraints()
+
+        return project
+
+    def test_partitioned_after_migrate(self):
+        self.assertTrue(is_partitioned())
+
+    def test_partition_vafs(self):
+        p1 = self.create_project("p1")
+        p2 = self.create_project("p2", num_samples=1)
+        ids = set(VAF.objects.values_list("id", flat=True))
+
+        unpartition_vafs()
+        self.assertFalse(is_partitioned())
+
+        partition_vafs()
+        self.assertTrue(is_partitioned())
+
+        # Each project's VAFs are moved into its own partition
+        self.assertLessEqual(
+            {partition_name(p1.id), partition_name(p2.id)}, partitions()
+        )
+        self.assertEqual(count_rows(partition_name(p1.id)), 6)
+        self.assertEqual(count_rows(partition_name(p2.id)), 3)
+        self.assertEqual(set(VAF.objects.values_list("id", flat=True)), ids)
+
+        # New VAFs continue from the ids of the old table
+        self.create_project("p3", num_samples=1)
+        self.assertGreater(
+            VAF.objects.filter(project__code="p3").order_by("id").first().id,
+            max(ids),
+        )
+
+        # Converting a table that is already partitioned does nothing
+        partition_vafs()
+        self.assertEqual(VAF.objects.count(), 12)
+
+    def test_create_partition(self):
+        project = self.create_project("p1")
+
+        self.assertIn(partition_name(project.id), partitions())
+        self.assertEqual(count_rows(partition_name(project.id)), 6)
+        self.assertEqual(count_rows(VAF._meta.db_table + "_default"), 0)
+
+    def test_drop_partition(self):
+        p1 = self.create_project("p1")
+        p2 = self.create_project("p2")
+
+        p1_id = p1.id
+        p1.delete()
+
+        self.assertNotIn(partition_name(p1_id), partitions())
+        self.assertIn(partition_name(p2.id), partitions())
+        self.assertFalse(Metadata.objects.filter(project_id=p1_id).exists())
+        self.assertEqual(VAF.objects.count(), 6)
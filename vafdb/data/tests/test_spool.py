@@ -0,0 +1,79 @@
+from django.core.management import call_command
+from django.test import override_settings
+from rest_framework.exceptions import ValidationError
+from ..models import Reference, Metadata
+from .. import tasks
+from .utils import StorageTestCase, create_project, generate_sample, store_sample
+import contextlib
+import time
+import io
+import os
+
+
+class SpoolTestCase(StorageTestCase):
+    """
+    Spools are removed once their sample is stored, or if generating them fails, and are otherwise kept until pruned.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        create_project("spool", chunk_size=50)
+
+    def spools(self):
+        try:
+            return {
+                os.path.join(self.spool_dir, name)
+                for name in os.listdir(self.spool_dir)
+            }
+        except FileNotFoundError:
+            return set()
+
+    def test_store(self):
+        store_sample("spool", "s1")
+        self.assertTrue(Metadata.objects.filter(sample_id="s1"))
+        self.assertEqual(self.spools(), set())
+
+    def test_failed_store(self):
+        args = generate_sample("spool", "s1")
+        spool = args[1]["path"]
+        self.assertEqual(self.spools(), {spool})
+
+        # The sample is stored from another spool first, so storing it from this spool fails
+        store_sample("spool", "s1", bam="b.bam")
+        with contextlib.redirect_stdout(io.StringIO()):
+            with self.assertRaises(ValidationError):
+                tasks.store(args)
+
+        self.assertEqual(self.spools(), {spool})
+        self.assertEqual(len(os.listdir(spool)), args[1]["chunks"])
+
+    def test_failed_generate(self):
+        # Without one of the references in the BAM, generating fails part of the way through the pileup
+        Reference.objects.filter(project__code="spool", name="chrom2").delete()
+
+        with contextlib.redirect_stdout(io.StringIO()):
+            with self.assertRaises(Reference.DoesNotExist):
+                generate_sample("spool", "s1")
+
+        self.assertEqual(self.spools(), set())
+
+    def test_prune(self):
+        old = generate_sample("spool", "s1")[1]["path"]
+        new = generate_sample("spool", "s2")[1]["path"]
+
+        # The first spool was last written to two days ago
+        two_days_ago = time.time() - 48 * 60 * 60
+        os.utime(old, (two_days_ago, two_days_ago))
+
+        with contextlib.redirect_stdout(io.StringIO()):
+            call_command("prunespools", max_age=72)
+        self.assertEqual(self.spools(), {old, new})
+
+        with contextlib.redirect_stdout(io.StringIO()):
+            call_command("prunespools", max_age=24)
+        self.assertEqual(self.spools(), {new})
+
+        with override_settings(SPOOL_MAX_AGE=0):
+            with contextlib.redirect_stdout(io.StringIO()):
+                call_command("prunespools")
+        self.assertEqual(self.spools(), set())
@@ -0,0 +1,98 @@
+from django.test import SimpleTestCase
+from ..stats import get_stats, get_batch_stats, round_exact, iterate_batch_stats
+import numpy as np
+
+# Rows with ties for the maximum count, no coverage, or a percentage on a rounding boundary
+EDGE_COUNTS = [
+    [0, 0, 0, 0, 0, 0],
+    [1, 0, 0, 0, 0, 0],
+    [0, 0, 0, 0, 0, 1],
+    [1, 1, 1, 1, 1, 1],
+    [5, 5, 0, 0, 0, 0],
+    [0, 3, 3, 3, 0, 0],
+    [2, 2, 2, 1, 0, 0],
+    [1, 63, 0, 0, 0, 0],
+    [3, 61, 0, 0, 0, 0],
+    [5, 123, 0, 0, 0, 0],
+    [1, 1599, 0, 0, 0, 0],
+    [1, 15999, 0, 0, 0, 0],
+    [1, 2, 0, 0, 0, 0],
+    [1, 6, 0, 0, 0, 0],
+    [1, 7, 0, 0, 0, 0],
+    [1, 0, 0, 0, 0, 7],
+    [7, 1, 0, 0, 0, 0],
+    [1, 1, 0, 0, 0, 2],
+    [0, 0, 0, 0, 8, 0],
+    [1000000, 1, 0, 0, 0, 0],
+    # Percentages that np.round and round disagree on, at one and three decimal places
+    [1, 1999, 0, 0, 0, 0],
+    [3, 1997, 0, 0, 0, 0],
+    [1, 7999, 0, 0, 0, 0],
+    [3, 7997, 0, 0, 0, 0],
+    [0, 9, 0, 7991, 0, 0],
+]
+
+
+class BatchStatsTestCase(SimpleTestCase):
+    """
+    The vectorised stats are identical to the stats calculated one position at a time with `get_stats`.
+    """
+
+    def assertStatsEqual(self, counts, decimals=3):
+        integers, floats = get_batch_stats(counts, decimals=decimals)
+
+        for row, ints, fls in zip(counts, integers.tolist(), floats.tolist()):
+            with self.subTest(counts=row, decimals=decimals):
+                stats = get_stats(list(row), decimals=decimals)
+                self.assertEqual(ints, stats[:7])
+
+                # Compare the exact binary values, so that 0.0 and -0.0, or values one ulp apart, differ
+                self.assertEqual(
+                    [x.hex() for x in fls], [float(x).hex() for x in stats[7:]]
+                )
+
+    def test_random_counts(self):
+        rng = np.random.default_rng(0)
+        counts = rng.integers(0, 50, size=(5000, 6))
+
+        # Sparse rows, which have more ties and zeros
+        counts[::3] *= rng.integers(0, 2, size=(len(counts[::3]), 6))
+
+        for decimals in [1, 3, 5]:
+            self.assertStatsEqual(counts.tolist(), decimals=decimals)
+
+    def test_edge_counts(self):
+        for decimals in [0, 1, 3, 5]:
+            self.assertStatsEqual(EDGE_COUNTS, decimals=decimals)
+
+    def test_iterate_batch_stats(self):
+        keys = [(position, 0) for position in range(1, len(EDGE_COUNTS) + 1)]
+        rows = list(iterate_batch_stats("chrom1", keys, np.array(EDGE_COUNTS)))
+
+        self.assertEqual(
+            rows,
+            [
+                ["chrom1", position, 0] + get_stats(counts)
+                for (position, _), counts in zip(keys, EDGE_COUNTS)
+            ],
+        )
+        self.assertEqual(list(iterate_batch_stats("chrom1", [], [])), [])
+
+    def test_round_exact(self):
+        rng = np.random.default_rng(0)
+        values = np.concatenate(
+            [
+                rng.uniform(-100, 100, size=5000),
+                100
+                * rng.integers(0, 100, size=5000)
+                / rng.integers(1, 2000, size=5000),
+                [0.0625, 1.5625, 2.675, 0.0005, 0.0015, -0.0625, 1e-9, 0.0, 100.0],
+            ]
+        )
+
+        for decimals in [0, 1, 3]:
+            with self.subTest(decimals=decimals):
+                self.assertEqual(
+                    [x.hex() for x in round_exact(values, decimals).tolist()],
+                    [round(x, decimals).hex() for x in values.tolist()],
+                )
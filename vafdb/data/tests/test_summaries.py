@@ -0,0 +1,71 @@
+from django.core.management import call_command
+from rest_framework.test import APIClient
+from ..models import Metadata, PositionSummary
+from ..summaries import KEY_FIELDS, TOTAL_FIELDS
+from .utils import StorageTestCase, create_project, store_sample
+import contextlib
+import io
+
+
+def summaries(code):
+    """
+    Totals of the summaries of the project with the `code`, keyed by reference name, position and insertion.
+    """
+    rows = PositionSummary.objects.filter(project__code=code).values_list(
+        "reference__name", *KEY_FIELDS[2:], *TOTAL_FIELDS
+    )
+    return {row[:3]: row[3:] for row in rows}
+
+
+class SummaryTestCase(StorageTestCase):
+    """
+    Deleting a sample subtracts exactly what storing it added to the summaries,
+    whether its VAFs are stored as rows, packed, or in a cold file.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        create_project("expected", insertions=True)
+        store_sample("expected", "b", bam="b.bam")
+
+    def assertDeleteLeaves(self, code, archive=False):
+        store_sample(code, "a", bam="a.bam")
+        store_sample(code, "b", bam="b.bam")
+        self.assertNotEqual(summaries(code), summaries("expected"))
+
+        if archive:
+            with contextlib.redirect_stdout(io.StringIO()):
+                call_command("archivesamples", code)
+            self.assertFalse(
+                Metadata.objects.filter(project__code=code, cold_file__isnull=True)
+            )
+
+        response = APIClient().delete(f"/data/delete/{code}/a/")
+        self.assertEqual(response.status_code, 200, response.content)
+        self.assertEqual(summaries(code), summaries("expected"))
+
+        # Deleting the last sample leaves no summaries
+        response = APIClient().delete(f"/data/delete/{code}/b/")
+        self.assertEqual(response.status_code, 200, response.content)
+        self.assertEqual(summaries(code), {})
+
+    def test_summaries(self):
+        # The expected summaries are not empty, and are only of the one sample
+        self.assertTrue(summaries("expected"))
+        self.assertEqual({totals[0] for totals in summaries("expected").values()}, {1})
+
+    def test_hot(self):
+        create_project("hot", insertions=True)
+        self.assertDeleteLeaves("hot")
+
+    def test_hot_store_derived(self):
+        create_project("derived", insertions=True, store_derived=True)
+        self.assertDeleteLeaves("derived")
+
+    def test_packed(self):
+        create_project("packed", insertions=True, packed=True)
+        self.assertDeleteLeaves("packed")
+
+    def test_cold(self):
+        create_project("cold", insertions=True)
+        self.assertDeleteLeaves("cold", archive=True)
@@ -0,0 +1,121 @@
+from django.test import TestCase, override_settings
+from rest_framework.test import APIClient
+from Bio import SeqIO
+from ..models import Project, Reference
+from .. import tasks
+import contextlib
+import tempfile
+import shutil
+import json
+import io
+import os
+
+FIXTURES_DIR = os.path.join(os.path.dirname(__file__), "fixtures")
+
+
+def fixture_path(name):
+    return os.path.join(FIXTURES_DIR, name)
+
+
+def create_project(code, **fields):
+    """
+    Create a project with the `fields`, and the references of the fixtures.
+    """
+    project = Project.objects.create(code=code, **fields)
+    for record in SeqIO.parse(fixture_path("ref.fasta"), "fasta"):
+        Reference.objects.create(
+            project=project, name=record.id, sequence=str(record.seq)
+        )
+    return project
+
+
+def generate_sample(code, sample_id, bam="a.bam", **metadata):
+    """
+    Run the generate task for a sample of the project with the `code`, from the `bam` fixture.
+
+    The result is passed through JSON, as it is between the tasks by Celery.
+    """
+    metadata = {
+        "sample_id": sample_id,
+        "bam_path": fixture_path(bam),
+        "project": Project.objects.get(code=code).id,
+        **metadata,
+    }
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        return json.loads(json.dumps(tasks.generate(code, metadata)))
+
+
+def store_sample(code, sample_id, bam="a.bam", **metadata):
+    """
+    Run the generate and store tasks for a sample of the project with the `code`, from the `bam` fixture.
+    """
+    args = generate_sample(code, sample_id, bam=bam, **metadata)
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        tasks.store(args)
+
+
+def fetch_all(url, data=None, method="get"):
+    """
+    Results of every page of a FilterView (`method="get"`) or QueryView (`method="post"`) request.
+
+    Results are keyed by sample, with the VAFs of each sample (which may be split across pages)
+    in the order of their reference, position and insertion.
+    """
+    client = APIClient()
+    results = {}
+
+    # The next link of a FilterView request carries its filters, whereas a QueryView request is sent again
+    if method == "get":
+        response = client.get(url, data)
+    else:
+        response = client.post(url, data, format="json")
+
+    while True:
+        assert response.status_code == 200, response.content
+        for md in response.json()["results"]:
+            vafs = md.pop("vaf")
+            results.setdefault(md["sample_id"], {**md, "vaf": []})["vaf"].extend(vafs)
+
+        next_link = response.json()["next"]
+        if not next_link:
+            break
+        elif method == "get":
+            response = client.get(next_link)
+        else:
+            response = client.post(next_link, data, format="json")
+
+    for md in results.values():
+        md["vaf"].sort(
+            key=lambda vaf: (vaf["reference"], vaf["position"], vaf["insertion"])
+        )
+
+    return results
+
+
+class StorageTestCase(TestCase):
+    """
+    TestCase whose spools and cold storage files are written to a temporary directory.
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        storage_dir = tempfile.mkdtemp()
+        cls.addClassCleanup(shutil.rmtree, storage_dir, ignore_errors=True)
+
+        cls.spool_dir = os.path.join(storage_dir, "spool")
+        cls.cold_storage_dir = os.path.join(storage_dir, "cold")
+        storage = override_settings(
+            SPOOL_DIR=cls.spool_dir, COLD_STORAGE_DIR=cls.cold_storage_dir
+        )
+        storage.enable()
+        cls.addClassCleanup(storage.disable)
+
+        super().setUpClass()
+
+    def tearDown(self):
+        # Spools and cold files are not rolled back with the database, so they are removed after each test
+        shutil.rmtree(self.spool_dir, ignore_errors=True)
+        shutil.rmtree(self.cold_storage_dir, ignore_errors=True)
+        super().tearDown()
@@ -4,7 +4,13 @@ from . import views
 
 urlpatterns = [
     path("generate/<code>/", views.GenerateView.as_view()),
+    path("generate/<code>/batch/", views.GenerateBatchView.as_view()),
     path("filter/<code>/", views.FilterView.as_view()),
     path("query/<code>/", views.QueryView.as_view()),
+    path("summary/<code>/", views.SummaryView.as_view()),
+    path("status/<code>/filters/", views.FilterStatusView.as_view()),
+    path("status/<code>/<task_id>/", views.StatusView.as_view()),
+    path("status/<code>/batch/<batch_id>/", views.BatchStatusView.as_view()),
+    path("delete/<code>/", views.BulkDeleteView.as_view()),
     path("delete/<code>/<sample_id>/", views.DeleteView.as_view()),
 ]
@@ -1,16 +1,172 @@
 from rest_framework import status
 from rest_framework.views import APIView
 from rest_framework.response import Response
-from rest_framework.pagination import CursorPagination
+from rest_framework.utils.urls import replace_query_param
+from rest_framework.settings import api_settings
+from django_filters.constants import EMPTY_VALUES
 from django.conf import settings
-from .models import Project, Metadata, VAF
-from .serializers import VAFSerializer, MetadataSerializer
-from .tasks import generate, store
-from .filters import VAFFilter
+from django.core.exceptions import FieldError, ValidationError
+from celery import group
+from django.db.models import Count, Sum, Q
+from collections import Counter
+import copy
+import uuid
+from .models import Project, Metadata, VAF, PositionSummary, Job
+from .serializers import (
+    VAFValuesSerializer,
+    MetadataSerializer,
+    MetadataBatchSerializer,
+    PositionSummarySerializer,
+    JobSerializer,
+)
+from .tasks import generate, store, FILTERS
+from .filters import VAFFilter, PositionSummaryFilter, related_fields
+from .packed import filter_packed, decode_cursor
+from .cold import (
+    filter_cold,
+    cold_files,
+    encode_cursor as encode_cold_cursor,
+    decode_cursor as decode_cold_cursor,
+    START as COLD_START,
+)
+from .pagination import KeysetPagination
+from .projection import get_projection, project_results
+from .export import (
+    export_response,
+    packed_pages,
+    cold_pages,
+    ArrowRenderer,
+    ParquetRenderer,
+    FORMATS as EXPORT_FORMATS,
+)
+from .querylog import log_request
+from .sqlite import write_lane
+from .deletion import delete_sample
+from .fingerprint import fingerprint, matches, FIELDS as FINGERPRINT_FIELDS
 from utils.contextmanagers import mutable
+from utils.classes import KeyValue
 from utils.functions import make_keyvalues, get_query
 
 
+def job_chain(code, metadata, job, replace=False):
+    """
+    Celery task chain that generates and stores VAFs from `metadata`, recording its progress on the `job`.
+
+    If `replace` is set, any existing metadata (and VAFs) for the sample are replaced.
+    """
+    return generate.s(code, metadata, job=str(job.task_id), replace=replace) | store.s(
+        job=str(job.task_id), replace=replace
+    ).set(task_id=str(job.task_id))
+
+
+def is_forced(request):
+    """
+    Returns `True` if the request asks for samples to be regenerated, even if they have already been stored.
+    """
+    return request.query_params.get("force", "").lower() in {"true", "1"}
+
+
+def get_list_param(query_params, param):
+    """
+    Take out the values of a list `param` from the `query_params`, which can be given comma-separated and/or repeated.
+    """
+    values = query_params.getlist(param)
+    query_params.pop(param, None)
+
+    return [value.strip() for v in values for value in v.split(",") if value.strip()]
+
+
+def packed_response(request, project, query, cursor, page_size, columns):
+    """
+    Paginated response of (at most) `page_size` VAFs of the packed `project` that match the `query`,
+    restricted to the `columns`.
+    """
+    try:
+        start = decode_cursor(cursor) if cursor else (0, 0)
+    except ValueError:
+        return Response(
+            {"detail": "Invalid cursor"},
+            status=status.HTTP_404_NOT_FOUND,
+        )
+
+    results, next_cursor = filter_packed(
+        project, query, start=start, page_size=page_size
+    )
+
+    if next_cursor is not None:
+        next_url = replace_query_param(
+            request.build_absolute_uri(), "cursor", next_cursor
+        )
+    else:
+        next_url = None
+
+    return Response(
+        {
+            "next": next_url,
+            "results": project_results(results, columns),
+        },
+        status=status.HTTP_200_OK,
+    )
+
+
+def cold_response(request, project, query, start, page_size, columns):
+    """
+    Paginated response of (at most) `page_size` cold VAFs of the `project` that match the `query`,
+    after the `(file, id)` given by `start`, restricted to the `columns`.
+    """
+    try:
+        results, next_cursor = filter_cold(
+            project, query, start=start, page_size=page_size
+        )
+    except FieldError as e:
+        return Response(
+            {"detail": str(e)},
+            status=status.HTTP_400_BAD_REQUEST,
+        )
+
+    if next_cursor is not None:
+        next_url = replace_query_param(
+            request.build_absolute_uri(), "cursor", next_cursor
+        )
+    else:
+        next_url = None
+
+    return Response(
+        {
+            "next": next_url,
+            "results": project_results(results, columns),
+        },
+        status=status.HTTP_200_OK,
+    )
+
+
+def vaf_response(request, project, paginator, vafs, columns):
+    """
+    Paginated response of the `vafs` in the VAF table, restricted to the `columns`.
+
+    Once these run out, the next page is the first page of the project's cold VAFs (if it has any).
+    """
+    # Paginate the response, reading the values of each VAF as a tuple
+    result_page = paginator.paginate_queryset(
+        vafs.values_list(*VAFValuesSerializer.get_paths(columns), named=True), request
+    )
+
+    # Serialize the results
+    serialized = VAFValuesSerializer(result_page, context={"columns": columns})
+
+    # Return paginated response
+    response = paginator.get_paginated_response(serialized.data)
+
+    if response.data["next"] is None and cold_files(project):
+        response.data["next"] = replace_query_param(
+            request.build_absolute_uri(),
+            paginator.cursor_query_param,
+            encode_cold_cursor(*COLD_START),
+        )
+
+    return response
+
+
 class GenerateView(APIView):
     def post(self, request, code):
         """
@@ -25,9 +181,37 @@ class GenerateView(APIView):
                 status=status.HTTP_404_NOT_FOUND,
             )
 
+        force = is_forced(request)
+        sample_id = request.data.get("sample_id")
+
+        # Fingerprint the BAM, and check whether the sample has already been stored from it
+        # If so, the sample is skipped without any pileup work (unless regenerating is forced)
+        fp = fingerprint(request.data.get("bam_path"))
+        existing = Metadata.objects.filter(project=project, sample_id=sample_id).first()
+
+        if existing and not force and matches(existing, fp):
+            with write_lane():
+                job = Job.objects.create(
+                    task_id=uuid.uuid4(),
+                    project=project,
+                    sample_id=sample_id,
+                    state="SKIPPED",
+                )
+            return Response(
+                {
+                    "project": project.code,
+                    "sample_id": sample_id,
+                    "task_id": job.task_id,
+                    "state": job.state,
+                },
+                status=status.HTTP_200_OK,
+            )
+
         # Validate the metadata
+        # When regenerating is forced, the metadata is validated as a replacement for the existing metadata
         request.data["project"] = project.id  # type: ignore
-        serializer = MetadataSerializer(data=request.data)
+        request.data.update(fp or dict.fromkeys(FINGERPRINT_FIELDS))  # type: ignore
+        serializer = MetadataSerializer(existing if force else None, data=request.data)
 
         if not serializer.is_valid():
             return Response(
@@ -35,25 +219,182 @@ class GenerateView(APIView):
                 status=status.HTTP_422_UNPROCESSABLE_ENTITY,
             )
 
-        # Kick off celery task chain
-        task = (generate.s(code, request.data) | store.s()).apply_async()
+        # Record the job, and kick off celery task chain
+        # The store task is the last in the chain, so its task_id identifies the job
+        with write_lane():
+            job = Job.objects.create(
+                task_id=uuid.uuid4(),
+                project=project,
+                sample_id=sample_id,
+            )
+        task = job_chain(
+            code, request.data, job, replace=existing is not None
+        ).apply_async()
 
-        # Return project code, sample_id and task_id
+        # Return project code, sample_id, task_id and state
         return Response(
             {
                 "project": project.code,
-                "sample_id": request.data.get("sample_id"),
+                "sample_id": sample_id,
                 "task_id": task.id,
+                "state": job.state,
             },
             status=status.HTTP_200_OK,
         )
 
 
+class GenerateBatchView(APIView):
+    def post(self, request, code):
+        """
+        Generate VAFs from a batch of metadata records.
+        """
+        # Get the project
+        try:
+            project = Project.objects.get(code=code)
+        except Project.DoesNotExist:
+            return Response(
+                {"detail": "Project not found."},
+                status=status.HTTP_404_NOT_FOUND,
+            )
+
+        records = request.data
+        if not isinstance(records, list) or not all(
+            isinstance(record, dict) for record in records
+        ):
+            return Response(
+                {"detail": "Expected a list of metadata records."},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        if len(records) > settings.GENERATE_BATCH_MAX_SIZE:
+            return Response(
+                {
+                    "detail": f"Batch cannot contain more than {settings.GENERATE_BATCH_MAX_SIZE} records."
+                },
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        force = is_forced(request)
+
+        # Find sample_ids that already exist in the project (and the fingerprints of their BAMs) with a single query,
+        # and those that are repeated within the batch
+        sample_ids = [record.get("sample_id") for record in records]
+        existing = {
+            x["sample_id"]: x
+            for x in Metadata.objects.filter(
+                project=project, sample_id__in=[x for x in sample_ids if x is not None]
+            ).values("sample_id", *FINGERPRINT_FIELDS)
+        }
+        repeated = {x for x, count in Counter(sample_ids).items() if count > 1}
+
+        # Validate each of the records
+        # Samples already stored from an unchanged BAM are skipped, unless regenerating is forced
+        results = []
+        tasks = []
+        skipped = []
+        for record in records:
+            sample_id = record.get("sample_id")
+            fp = fingerprint(record.get("bam_path"))
+
+            if (
+                sample_id in existing
+                and sample_id not in repeated
+                and not force
+                and matches(existing[sample_id], fp)
+            ):
+                results.append({"sample_id": sample_id})
+                skipped.append(results[-1])
+                continue
+
+            record = dict(record, **(fp or dict.fromkeys(FINGERPRINT_FIELDS)))
+            serializer = MetadataBatchSerializer(data=record)
+
+            if serializer.is_valid():
+                errors = {}
+            else:
+                errors = dict(serializer.errors)
+
+            if sample_id in existing and not force:
+                errors.setdefault("non_field_errors", []).append(
+                    "The fields project, sample_id must make a unique set."
+                )
+            elif sample_id in repeated:
+                errors.setdefault("non_field_errors", []).append(
+                    "The field sample_id was repeated within the batch."
+                )
+
+            if errors:
+                results.append({"sample_id": sample_id, "errors": errors})
+            else:
+                results.append({"sample_id": sample_id})
+                tasks.append((results[-1], dict(record, project=project.id)))
+
+        # Record the jobs, and kick off all the valid celery task chains as a group
+        batch_id = None
+        if tasks or skipped:
+            batch_id = uuid.uuid4()
+            with write_lane():
+                jobs = Job.objects.bulk_create(
+                    [
+                        Job(
+                            task_id=uuid.uuid4(),
+                            batch_id=batch_id,
+                            project=project,
+                            sample_id=record["sample_id"],
+                        )
+                        for _, record in tasks
+                    ]
+                    + [
+                        Job(
+                            task_id=uuid.uuid4(),
+                            batch_id=batch_id,
+                            project=project,
+                            sample_id=result["sample_id"],
+                            state="SKIPPED",
+                        )
+                        for result in skipped
+                    ]
+                )
+            if tasks:
+                group(
+                    job_chain(
+                        code, record, job, replace=record["sample_id"] in existing
+                    )
+                    for (_, record), job in zip(tasks, jobs)
+                ).apply_async()
+
+            for result, job in zip([result for result, _ in tasks] + skipped, jobs):
+                result["task_id"] = job.task_id
+                result["state"] = job.state
+
+        # Return project code, batch_id, and task_id and state, or errors, for each record
+        return Response(
+            {
+                "project": project.code,
+                "batch_id": batch_id,
+                "results": results,
+            },
+            status=(
+                status.HTTP_200_OK
+                if tasks or skipped
+                else status.HTTP_422_UNPROCESSABLE_ENTITY
+            ),
+        )
+
+
 class FilterView(APIView):
+    renderer_classes = api_settings.DEFAULT_RENDERER_CLASSES + [
+        ArrowRenderer,
+        ParquetRenderer,
+    ]
+
     def get(self, request, code):
         """
         Filter VAFs and metadata.
         """
+        # Record the request, so it can be replayed when measuring indexes
+        log_request("filter", code, request)
+
         # Get the project
         try:
             project = Project.objects.get(code=code)
@@ -63,16 +404,38 @@ class FilterView(APIView):
                 status=status.HTTP_404_NOT_FOUND,
             )
 
-        # Prepare paginator
-        paginator = CursorPagination()
-        paginator.ordering = "created"
-        paginator.page_size = settings.CURSOR_PAGINATION_PAGE_SIZE
+        # Prepare paginator, with the page size requested by the client
+        paginator = KeysetPagination()
+        paginator.page_size = paginator.get_page_size(request)
 
-        # Take out the pagination cursor param from the request
+        # Take out the pagination, export and projection params from the request
         with mutable(request.query_params) as query_params:
             cursor = query_params.get(paginator.cursor_query_param)
             if cursor:
                 query_params.pop(paginator.cursor_query_param)
+            query_params.pop(paginator.page_size_query_param, None)
+            export = query_params.get("export")
+            query_params.pop("export", None)
+            query_params.pop(api_settings.URL_FORMAT_OVERRIDE, None)
+            fields = get_list_param(query_params, "fields")
+            exclude = get_list_param(query_params, "exclude")
+
+        # Arrow and Parquet exports can also be requested through the Accept header
+        if export is None and request.accepted_renderer.format in EXPORT_FORMATS:
+            export = request.accepted_renderer.format
+
+        # An export streams every VAF that matches, in one response
+        if export is not None and export not in EXPORT_FORMATS:
+            return Response(
+                {"export": [f"Must be one of: {', '.join(EXPORT_FORMATS)}."]},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        # Results can be restricted to the fields requested by the client
+        try:
+            columns = get_projection(fields, exclude)
+        except ValidationError as e:
+            return Response(e.message_dict, status=status.HTTP_400_BAD_REQUEST)
 
         # Turn the request query params into a series of dictionaries, each that will be passed to a filterset
         filterset_datas = []
@@ -88,12 +451,11 @@ class FilterView(APIView):
         # Dictionary of filterset errors
         errors = {}
 
+        # Cleaned filters, as KeyValues
+        keyvalues = []
+
         # Initial queryset
-        qs = (
-            VAF.objects.select_related("metadata")
-            .filter(metadata__project=project)
-            .all()
-        )
+        qs = VAF.objects.filter(project=project).all()
 
         # A filterset can only take a a query with one of each field at a time
         # So given that the get view only AND's fields together, we can represent this
@@ -120,31 +482,85 @@ class FilterView(APIView):
                 for field, msg in filterset.errors.items():
                     errors[field] = msg
 
+            # Otherwise, keep the cleaned filters in case the project is packed
+            else:
+                for field in filterset_data:
+                    value = filterset.form.cleaned_data.get(field)
+
+                    if field in filterset.filters and value not in EMPTY_VALUES:
+                        key = field
+                        if field.split("__")[0] in filterset.metadata_fields:
+                            key = "metadata__" + field
+
+                        keyvalues.append({field: KeyValue(key, value)})
+
         # Return any errors that cropped up during filtering
         if errors:
             return Response(errors, status=status.HTTP_400_BAD_REQUEST)
 
+        # Packed projects are filtered by unpacking the VAFs of each sample
+        # The cleaned filters are ANDed together, as they are by the filtersets
+        if project.packed:
+            if export:
+                return export_response(
+                    project,
+                    export,
+                    pages=packed_pages(project, {"&": keyvalues}),
+                    columns=columns,
+                )
+
+            return packed_response(
+                request,
+                project,
+                {"&": keyvalues},
+                cursor,
+                paginator.page_size,
+                columns,
+            )
+
+        # Cold VAFs are paged through after those in the VAF table, with their own cursors
+        start = decode_cold_cursor(cursor) if cursor else None
+        if start is not None:
+            return cold_response(
+                request, project, {"&": keyvalues}, start, paginator.page_size, columns
+            )
+
+        # Stream the VAFs in the table, followed by the project's cold VAFs
+        if export:
+            try:
+                cold_vafs = cold_pages(project, {"&": keyvalues})
+            except FieldError as e:
+                return Response(
+                    {"detail": str(e)},
+                    status=status.HTTP_400_BAD_REQUEST,
+                )
+
+            return export_response(
+                project, export, vafs=qs, pages=cold_vafs, columns=columns
+            )
+
         # Add the pagination cursor param back into the request
         if cursor is not None:
             with mutable(request.query_params) as query_params:
                 request.query_params[paginator.cursor_query_param] = cursor
 
-        # Paginate the response
-        vafs = qs.order_by("id")
-        result_page = paginator.paginate_queryset(vafs, request)
-
-        # Serialize the results
-        serialized = VAFSerializer(result_page, many=True)
-
-        # Return paginated response
-        return paginator.get_paginated_response(serialized.data)
+        # Paginate the response, followed by the project's cold VAFs
+        return vaf_response(request, project, paginator, qs, columns)
 
 
 class QueryView(APIView):
+    renderer_classes = api_settings.DEFAULT_RENDERER_CLASSES + [
+        ArrowRenderer,
+        ParquetRenderer,
+    ]
+
     def post(self, request, code):
         """
         Query VAFs and metadata.
         """
+        # Record the request, so it can be replayed when measuring indexes
+        log_request("query", code, request)
+
         # Get the project
         try:
             project = Project.objects.get(code=code)
@@ -154,16 +570,38 @@ class QueryView(APIView):
                 status=status.HTTP_404_NOT_FOUND,
             )
 
-        # Prepare paginator
-        paginator = CursorPagination()
-        paginator.ordering = "created"
-        paginator.page_size = settings.CURSOR_PAGINATION_PAGE_SIZE
+        # Prepare paginator, with the page size requested by the client
+        paginator = KeysetPagination()
+        paginator.page_size = paginator.get_page_size(request)
 
-        # Take out the pagination cursor param from the request
+        # Take out the pagination, export and projection params from the request
         with mutable(request.query_params) as query_params:
             cursor = query_params.get(paginator.cursor_query_param)
             if cursor:
                 query_params.pop(paginator.cursor_query_param)
+            query_params.pop(paginator.page_size_query_param, None)
+            export = query_params.get("export")
+            query_params.pop("export", None)
+            query_params.pop(api_settings.URL_FORMAT_OVERRIDE, None)
+            fields = get_list_param(query_params, "fields")
+            exclude = get_list_param(query_params, "exclude")
+
+        # Arrow and Parquet exports can also be requested through the Accept header
+        if export is None and request.accepted_renderer.format in EXPORT_FORMATS:
+            export = request.accepted_renderer.format
+
+        # An export streams every VAF that matches, in one response
+        if export is not None and export not in EXPORT_FORMATS:
+            return Response(
+                {"export": [f"Must be one of: {', '.join(EXPORT_FORMATS)}."]},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        # Results can be restricted to the fields requested by the client
+        try:
+            columns = get_projection(fields, exclude)
+        except ValidationError as e:
+            return Response(e.message_dict, status=status.HTTP_400_BAD_REQUEST)
 
         # Turn the value of each key-value pair in request.data into a 'KeyValue' object
         # Returns a list of the keyvalues
@@ -222,32 +660,219 @@ class QueryView(APIView):
         if errors:
             return Response(errors, status=status.HTTP_400_BAD_REQUEST)
 
+        # Packed projects are filtered by unpacking the VAFs of each sample
+        if project.packed:
+            if export:
+                return export_response(
+                    project,
+                    export,
+                    pages=packed_pages(project, request.data),
+                    columns=columns,
+                )
+
+            return packed_response(
+                request, project, request.data, cursor, paginator.page_size, columns
+            )
+
+        # Cold VAFs are paged through after those in the VAF table, with their own cursors
+        start = decode_cold_cursor(cursor) if cursor else None
+        if start is not None:
+            return cold_response(
+                request, project, request.data, start, paginator.page_size, columns
+            )
+
+        # Cold VAFs are filtered on the fields as requested, so an export copies the query before they are mapped
+        if export:
+            try:
+                cold_vafs = cold_pages(project, copy.deepcopy(request.data))
+            except FieldError as e:
+                return Response(
+                    {"detail": str(e)},
+                    status=status.HTTP_400_BAD_REQUEST,
+                )
+
+        # Fields stored on a related model are queried on the path to their value
+        for keyvalue in keyvalues:
+            field, _, lookup = keyvalue.key.partition("__")
+            if field in related_fields:
+                keyvalue.key = "__".join(filter(None, [related_fields[field], lookup]))
+
         # The data has been validated so we form the query (a Q object)
         query = get_query(request.data)
 
         # Then filter using the Q object
-        qs = (
-            VAF.objects.select_related("metadata")
-            .filter(metadata__project=project)
-            .filter(query)
-        )
+        qs = VAF.objects.filter(project=project).filter(query)
+
+        # Stream the VAFs in the table, followed by the project's cold VAFs
+        if export:
+            return export_response(
+                project, export, vafs=qs, pages=cold_vafs, columns=columns
+            )
 
         # Add the pagination cursor param back into the request
         if cursor is not None:
             with mutable(request.query_params) as query_params:
                 request.query_params[paginator.cursor_query_param] = cursor
 
+        # Paginate the response, followed by the project's cold VAFs
+        return vaf_response(request, project, paginator, qs, columns)
+
+
+class SummaryView(APIView):
+    def get(self, request, code):
+        """
+        Get the per-position summaries of the VAFs of a project's samples.
+        """
+        # Get the project
+        try:
+            project = Project.objects.get(code=code)
+        except Project.DoesNotExist:
+            return Response(
+                {"detail": "Project not found."},
+                status=status.HTTP_404_NOT_FOUND,
+            )
+
+        # Prepare paginator
+        paginator = KeysetPagination()
+        paginator.ordering = ("position", "insertion", "reference_id")
+        paginator.page_size = paginator.get_page_size(request)
+
+        # Filter the summaries with the request query params, other than the pagination cursor
+        data = request.query_params.copy()
+        data.pop(paginator.cursor_query_param, None)
+        data.pop(paginator.page_size_query_param, None)
+
+        filterset = PositionSummaryFilter(
+            data=data,
+            queryset=PositionSummary.objects.select_related("reference")
+            .defer("reference__sequence")
+            .filter(project=project),
+        )
+
+        errors = {
+            field: ["Unknown field."]
+            for field in data
+            if field not in filterset.filters
+        }
+        if not filterset.is_valid():
+            errors.update(filterset.errors)
+
+        # Return any errors that cropped up during filtering
+        if errors:
+            return Response(errors, status=status.HTTP_400_BAD_REQUEST)
+
         # Paginate the response
-        vafs = qs.order_by("id")
-        result_page = paginator.paginate_queryset(vafs, request)
+        result_page = paginator.paginate_queryset(filterset.qs, request)
 
         # Serialize the results
-        serialized = VAFSerializer(result_page, many=True)
+        serialized = PositionSummarySerializer(result_page, many=True)
 
         # Return paginated response
         return paginator.get_paginated_response(serialized.data)
 
 
+class StatusView(APIView):
+    def get(self, request, code, task_id):
+        """
+        Get the state and stage timings of a task.
+        """
+        # Get the project
+        try:
+            project = Project.objects.get(code=code)
+        except Project.DoesNotExist:
+            return Response(
+                {"detail": "Project not found."},
+                status=status.HTTP_404_NOT_FOUND,
+            )
+
+        try:
+            job = Job.objects.get(project=project, task_id=task_id)
+        except (Job.DoesNotExist, ValidationError):
+            return Response(
+                {"detail": "Task not found."},
+                status=status.HTTP_404_NOT_FOUND,
+            )
+
+        return Response(JobSerializer(job).data, status=status.HTTP_200_OK)
+
+
+class BatchStatusView(APIView):
+    def get(self, request, code, batch_id):
+        """
+        Get the state and stage timings of each task in a batch, and their totals.
+        """
+        # Get the project
+        try:
+            project = Project.objects.get(code=code)
+        except Project.DoesNotExist:
+            return Response(
+                {"detail": "Project not found."},
+                status=status.HTTP_404_NOT_FOUND,
+            )
+
+        try:
+            jobs = list(
+                Job.objects.filter(project=project, batch_id=batch_id).order_by("id")
+            )
+        except ValidationError:
+            jobs = []
+
+        if not jobs:
+            return Response(
+                {"detail": "Batch not found."},
+                status=status.HTTP_404_NOT_FOUND,
+            )
+
+        serialized = JobSerializer(jobs, many=True).data
+
+        # Total up the states, stage durations and row counts across the batch
+        totals = {"states": dict(Counter(job["state"] for job in serialized))}
+        for field in JobSerializer.Meta.totals:
+            totals[field] = sum(job[field] or 0 for job in serialized)
+
+        return Response(
+            {
+                "project": project.code,
+                "batch_id": batch_id,
+                "totals": totals,
+                "tasks": serialized,
+            },
+            status=status.HTTP_200_OK,
+        )
+
+
+class FilterStatusView(APIView):
+    def get(self, request, code):
+        """
+        Get the number of positions removed by each of the project's filters, across all successful tasks.
+        """
+        # Get the project
+        try:
+            project = Project.objects.get(code=code)
+        except Project.DoesNotExist:
+            return Response(
+                {"detail": "Project not found."},
+                status=status.HTTP_404_NOT_FOUND,
+            )
+
+        jobs = Job.objects.filter(project=project, state="SUCCESS")
+        totals = jobs.aggregate(
+            num_tasks=Count("id"),
+            num_positions=Sum("num_positions"),
+            num_vafs=Sum("num_vafs"),
+            **{field: Sum(field) for field in JobSerializer.Meta.filters},
+        )
+
+        return Response(
+            {
+                "project": project.code,
+                "filters": FILTERS,
+                "totals": {field: value or 0 for field, value in totals.items()},
+            },
+            status=status.HTTP_200_OK,
+        )
+
+
 class DeleteView(APIView):
     def delete(self, request, code, sample_id):
         """
@@ -262,9 +887,9 @@ class DeleteView(APIView):
                 status=status.HTTP_404_NOT_FOUND,
             )
 
+        # Get the sample with the provided sample_id
         try:
-            # Attempt to delete object with the provided sample_id
-            Metadata.objects.get(project=project, sample_id=sample_id).delete()
+            metadata = Metadata.objects.get(project=project, sample_id=sample_id)
         except Metadata.DoesNotExist:
             # If the sample_id did not exist, return error
             return Response(
@@ -272,18 +897,104 @@ class DeleteView(APIView):
                 status=status.HTTP_404_NOT_FOUND,
             )
 
-        # Check for the deletion
-        deleted = not Metadata.objects.filter(
-            project=project,
-            sample_id=sample_id,
-        ).exists()
+        # Delete the sample and its VAFs in batches, subtracting them from the project's summaries
+        # If another request deleted the sample first, it has still been deleted
+        delete_sample(metadata)
 
         # Return response indicating successful deletion
         return Response(
             {
                 "project": project.code,
                 "sample_id": sample_id,
-                "deleted": deleted,
+                "deleted": True,
             },
             status=status.HTTP_200_OK,
         )
+
+
+class BulkDeleteView(APIView):
+    def post(self, request, code):
+        """
+        Delete the VAFs and metadata of a list of sample_ids, or of all samples that match a metadata filter.
+        """
+        # Get the project
+        try:
+            project = Project.objects.get(code=code)
+        except Project.DoesNotExist:
+            return Response(
+                {"detail": "Project not found."},
+                status=status.HTTP_404_NOT_FOUND,
+            )
+
+        data = request.data
+        if (
+            not isinstance(data, dict)
+            or ("sample_ids" in data) == ("filter" in data)
+            or not data.get("sample_ids", data.get("filter"))
+        ):
+            return Response(
+                {
+                    "detail": "Expected either a non-empty list of sample_ids, or a non-empty metadata filter."
+                },
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        if "sample_ids" in data:
+            sample_ids = data["sample_ids"]
+            if not isinstance(sample_ids, list) or not all(
+                isinstance(sample_id, str) for sample_id in sample_ids
+            ):
+                return Response(
+                    {"detail": "Expected a list of sample_ids."},
+                    status=status.HTTP_400_BAD_REQUEST,
+                )
+
+            samples = Metadata.objects.filter(project=project, sample_id__in=sample_ids)
+        else:
+            fields = data["filter"]
+            if not isinstance(fields, dict):
+                return Response(
+                    {"detail": "Expected a metadata filter of fields and values."},
+                    status=status.HTTP_400_BAD_REQUEST,
+                )
+
+            # Validate the filter, which can only be on metadata fields
+            filterset = VAFFilter(data=fields, queryset=VAF.objects.none())
+            errors = {}
+            for field in fields:
+                if field not in filterset.filters:
+                    errors[field] = ["Unknown field."]
+                elif field.split("__")[0] not in filterset.metadata_fields:
+                    errors[field] = ["Samples can only be filtered on metadata fields."]
+
+            if not filterset.is_valid():
+                for field, msg in filterset.errors.items():
+                    errors[field] = msg
+
+            # Return any errors that cropped up during validation
+            if errors:
+                return Response(errors, status=status.HTTP_400_BAD_REQUEST)
+
+            samples = Metadata.objects.filter(project=project).filter(
+                Q(**{field: filterset.form.cleaned_data[field] for field in fields})
+            )
+
+        # Each sample is deleted in its own transaction, so the write lane is released between samples
+        deleted = []
+        num_vafs = 0
+        for metadata in samples.order_by("id"):
+            count = delete_sample(metadata)
+            if count is not None:
+                deleted.append(metadata.sample_id)
+                num_vafs += count
+
+        # Return the sample_ids that were deleted, and any of the requested sample_ids that were not found
+        response = {
+            "project": project.code,
+            "deleted": deleted,
+            "num_vafs": num_vafs,
+        }
+        if "sample_ids" in data:
+            response["not_found"] = sorted(set(data["sample_ids"]) - set(deleted))
+
+        return Response(response, status=status.HTTP_200_OK)
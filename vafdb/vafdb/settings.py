@@ -11,6 +11,7 @@ https://docs.djangoproject.com/en/4.0/ref/settings/
 """
 
 from pathlib import Path
+import os
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
@@ -80,19 +81,28 @@ WSGI_APPLICATION = "vafdb.wsgi.application"
 # Database
 # https://docs.djangoproject.com/en/4.0/ref/settings/#databases
 
-DATABASES = {
-    "default": {
-        "ENGINE": "django.db.backends.sqlite3",
-        "NAME": "vafdb.sqlite3",
+# The database is SQLite by default. To use PostgreSQL (where the VAF table is partitioned by project),
+# set VAFDB_DB_ENGINE=postgresql and the VAFDB_DB_* variables for the connection
+# The tests workflow (.github/workflows/tests.yml) runs the tests with both engines
+if os.environ.get("VAFDB_DB_ENGINE", "sqlite") == "postgresql":
+    DATABASES = {
+        "default": {
+            "ENGINE": "django.db.backends.postgresql",
+            "NAME": os.environ.get("VAFDB_DB_NAME", "vafdb"),
+            "USER": os.environ.get("VAFDB_DB_USER", ""),
+            "PASSWORD": os.environ.get("VAFDB_DB_PASSWORD", ""),
+            "HOST": os.environ.get("VAFDB_DB_HOST", ""),
+            "PORT": os.environ.get("VAFDB_DB_PORT", ""),
+            "CONN_MAX_AGE": int(os.environ.get("VAFDB_DB_CONN_MAX_AGE", 60)),
+        }
+    }
+else:
+    DATABASES = {
+        "default": {
+            "ENGINE": "django.db.backends.sqlite3",
+            "NAME": os.environ.get("VAFDB_DB_NAME", "vafdb.sqlite3"),
+        }
     }
-}
-
-# DATABASES = {
-#     "default": {
-#         "ENGINE": "django.db.backends.postgresql",
-#         "NAME": "vafdb",
-#     }
-# }
 
 # Password validation
 # https://docs.djangoproject.com/en/4.0/ref/settings/#auth-password-validators
@@ -151,4 +161,27 @@ LOGGING = {
 
 # Custom settings used in the project
 CURSOR_PAGINATION_PAGE_SIZE = 5000
+CURSOR_PAGINATION_MAX_PAGE_SIZE = 50000
+EXPORT_CHUNK_SIZE = 5000
 FLOATFIELD_DECIMAL_PLACES = 3
+PROJECT_CACHE_SIZE = 32
+REFERENCE_CACHE_SIZE = 32
+VAF_BATCH_SIZE = 5000
+DELETE_BATCH_SIZE = 5000
+SPOOL_DIR = BASE_DIR / "spool"
+# Age (in hours) after which a spool that was never stored is deleted by the prunespools command
+SPOOL_MAX_AGE = 168
+COLD_STORAGE_DIR = BASE_DIR / "cold"
+GENERATE_BATCH_MAX_SIZE = 1000
+BAM_FINGERPRINT_HASH = False
+QUERY_LOG_FILE = None
+# Profile applied to every SQLite connection when it is opened, so that reads are not blocked while VAFs are stored
+SQLITE_PRAGMAS = {
+    "journal_mode": "wal",
+    "busy_timeout": 60000,
+    "synchronous": "normal",
+    "mmap_size": 268435456,
+    "cache_size": -65536,
+}
+# File locked by the SQLite write lane. Default: the database path, with '.lock' appended
+SQLITE_WRITE_LOCK = None